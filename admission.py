@@ -0,0 +1,240 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# (requests per minute, tokens per minute) per model for the whole deployment; unknown models use the default
+MODEL_LIMITS = {
+    "gpt-3.5-turbo": (3500, 160000),
+    "ft:gpt-3.5-turbo-0125:ella-test:aradhya:BHeExk2j": (3500, 160000),   # Fine-tunes share their base model's limits
+    "text-embedding-ada-002": (3000, 1000000),
+}
+DEFAULT_MODEL_LIMITS = (500, 60000)
+# Every uvicorn/gunicorn worker keeps its own buckets, so each gets an equal share of the model limits
+WORKER_COUNT = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+USER_LIMITS = (int(os.getenv("USER_RPM", "60")), int(os.getenv("USER_TPM", "20000")))
+
+MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "32"))
+MAX_INFLIGHT_HELPERS = int(os.getenv("LLM_MAX_INFLIGHT_HELPERS", "16"))  # Leaves headroom for completions
+MAX_TRACKED_USERS = 10000
+HELPER_DEADLINE_SECONDS = 2.0
+CRITICAL_DEADLINE_SECONDS = 20.0
+
+CRITICAL = "critical"   # User-facing completions and retrieval embeddings
+HELPER = "helper"       # Name/preference/name-query classification
+
+
+class AdmissionRejected(Exception):
+    """Raised when a call is shed or cannot be admitted before its deadline"""
+
+
+def estimate_tokens(text, max_tokens=0):
+    """Rough prompt + completion token estimate used before the real usage is known"""
+    return len(text) // 4 + 1 + max_tokens
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until amount is available (0 if it is available now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def refund(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class Ticket:
+    def __init__(self, controller, model, user_id, tokens, priority, queue_wait):
+        self.controller = controller
+        self.model = model
+        self.user_id = user_id
+        self.tokens = tokens
+        self.priority = priority
+        self.queue_wait = queue_wait
+
+    def settle(self, actual_tokens):
+        """Correct the token budgets once the real usage is known"""
+        if actual_tokens:
+            self.controller._settle(self, actual_tokens)
+
+
+class AdmissionController:
+    """Admission control for outbound OpenAI calls.
+
+    A call is admitted once its model's request and token buckets, the
+    user's buckets and the in-flight limit all allow it. Helper calls may
+    only use MAX_INFLIGHT_HELPERS slots, never jump ahead of waiting critical
+    calls, and are shed when they cannot start before their deadline.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._model_buckets = {}
+        self._user_buckets = OrderedDict()   # user_id -> buckets, least recently used first
+        self._inflight = 0
+        self._inflight_helpers = 0
+        self._waiting_critical = 0
+        self._stats = {}
+
+    def _buckets(self, model, user_id):
+        if model not in self._model_buckets:
+            rpm, tpm = MODEL_LIMITS.get(model, DEFAULT_MODEL_LIMITS)
+            self._model_buckets[model] = (TokenBucket(rpm / WORKER_COUNT), TokenBucket(tpm / WORKER_COUNT))
+        buckets = list(self._model_buckets[model])
+        if user_id:
+            if user_id in self._user_buckets:
+                self._user_buckets.move_to_end(user_id)
+            else:
+                # The least recently seen user has long since refilled; drop it in O(1)
+                if len(self._user_buckets) >= MAX_TRACKED_USERS:
+                    self._user_buckets.popitem(last=False)
+                self._user_buckets[user_id] = (TokenBucket(USER_LIMITS[0]), TokenBucket(USER_LIMITS[1]))
+            buckets += list(self._user_buckets[user_id])
+        return buckets
+
+    def _stat(self, model):
+        if model not in self._stats:
+            self._stats[model] = {
+                "admitted": 0, "shed": 0, "timed_out": 0,
+                "queue_wait_total": 0.0, "queue_wait_max": 0.0,
+                "vendor_calls": 0, "vendor_latency_total": 0.0, "vendor_latency_max": 0.0
+            }
+        return self._stats[model]
+
+    def _wait_time(self, model, user_id, tokens, priority):
+        if self._inflight >= MAX_INFLIGHT:
+            return None
+        if priority == HELPER and (self._inflight_helpers >= MAX_INFLIGHT_HELPERS or self._waiting_critical):
+            return None
+        request_model, token_model, *user = self._buckets(model, user_id)
+        waits = [request_model.wait_time(1), token_model.wait_time(tokens)]
+        if user:
+            waits += [user[0].wait_time(1), user[1].wait_time(tokens)]
+        return max(waits)
+
+    def acquire(self, model, user_id=None, tokens=1, priority=CRITICAL, deadline=None):
+        """Block until the call may start; raise AdmissionRejected if it is shed"""
+        if deadline is None:
+            deadline = HELPER_DEADLINE_SECONDS if priority == HELPER else CRITICAL_DEADLINE_SECONDS
+        started = time.monotonic()
+        give_up_at = started + deadline
+
+        with self._condition:
+            stat = self._stat(model)
+            if priority == CRITICAL:
+                self._waiting_critical += 1
+            try:
+                while True:
+                    wait = self._wait_time(model, user_id, tokens, priority)
+                    if wait == 0:
+                        break
+                    remaining = give_up_at - time.monotonic()
+                    if wait is not None and wait > remaining:
+                        # Rate budget cannot recover in time: shed now instead of queueing
+                        stat["shed" if priority == HELPER else "timed_out"] += 1
+                        raise AdmissionRejected(f"{priority} call to {model} shed: budget exhausted")
+                    if remaining <= 0:
+                        stat["shed" if priority == HELPER else "timed_out"] += 1
+                        raise AdmissionRejected(f"{priority} call to {model} timed out in queue")
+                    self._condition.wait(min(remaining, wait if wait is not None else remaining, 0.5))
+
+                request_model, token_model, *user = self._buckets(model, user_id)
+                request_model.take(1)
+                token_model.take(tokens)
+                if user:
+                    user[0].take(1)
+                    user[1].take(tokens)
+                self._inflight += 1
+                if priority == HELPER:
+                    self._inflight_helpers += 1
+            finally:
+                if priority == CRITICAL:
+                    self._waiting_critical -= 1
+
+            queue_wait = time.monotonic() - started
+            stat["admitted"] += 1
+            stat["queue_wait_total"] += queue_wait
+            stat["queue_wait_max"] = max(stat["queue_wait_max"], queue_wait)
+        return Ticket(self, model, user_id, tokens, priority, queue_wait)
+
+    def release(self, ticket, vendor_latency=None):
+        with self._condition:
+            self._inflight -= 1
+            if ticket.priority == HELPER:
+                self._inflight_helpers -= 1
+            if vendor_latency is not None:
+                stat = self._stat(ticket.model)
+                stat["vendor_calls"] += 1
+                stat["vendor_latency_total"] += vendor_latency
+                stat["vendor_latency_max"] = max(stat["vendor_latency_max"], vendor_latency)
+            self._condition.notify_all()
+
+    def _settle(self, ticket, actual_tokens):
+        with self._condition:
+            difference = ticket.tokens - actual_tokens
+            _, token_model, *user = self._buckets(ticket.model, ticket.user_id)
+            token_buckets = [token_model] + user[1:]
+            for bucket in token_buckets:
+                if difference > 0:
+                    bucket.refund(difference)
+                else:
+                    bucket.take(-difference)
+            ticket.tokens = actual_tokens
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(self, model, user_id=None, tokens=1, priority=CRITICAL, deadline=None):
+        """Admit one outbound call; vendor latency is measured separately from queue wait"""
+        ticket = self.acquire(model, user_id, tokens, priority, deadline)
+        started = time.monotonic()
+        failed = False
+        try:
+            yield ticket
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.release(ticket, None if failed else time.monotonic() - started)
+
+    def stats(self):
+        with self._condition:
+            report = {
+                "inflight": self._inflight,
+                "inflight_helpers": self._inflight_helpers,
+                "models": {}
+            }
+            for model, stat in self._stats.items():
+                admitted = stat["admitted"] or 1
+                calls = stat["vendor_calls"] or 1
+                report["models"][model] = {
+                    "admitted": stat["admitted"],
+                    "shed": stat["shed"],
+                    "timed_out": stat["timed_out"],
+                    "avg_queue_wait": stat["queue_wait_total"] / admitted,
+                    "max_queue_wait": stat["queue_wait_max"],
+                    "avg_vendor_latency": stat["vendor_latency_total"] / calls,
+                    "max_vendor_latency": stat["vendor_latency_max"]
+                }
+            return report
+
+
+admission = AdmissionController()
@@ -0,0 +1,323 @@
+import asyncio
+import bisect
+import threading
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from log import get_logger
+
+log = get_logger("analytics")
+
+# Upper bounds (ms) of the latency histogram buckets kept in every rollup
+LATENCY_BUCKETS_MS = [50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 8000, 13000, 20000, 30000, 60000]
+OVERFLOW_BUCKET = "inf"
+
+# USD per token (input, output); unknown models fall back to the default rates
+MODEL_PRICING = {
+    "gpt-3.5-turbo": (0.0000005, 0.0000015),
+    "text-embedding-ada-002": (0.0000001, 0.0),
+    "ft:gpt-3.5-turbo-0125:ella-test:aradhya:BHeExk2j": (0.000003, 0.000006),
+}
+DEFAULT_PRICING = (0.0000005, 0.0000015)
+
+FLUSH_INTERVAL_SECONDS = 60
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens=0):
+    """Cost in USD of a single call"""
+    input_rate, output_rate = MODEL_PRICING.get(model, DEFAULT_PRICING)
+    return prompt_tokens * input_rate + completion_tokens * output_rate
+
+
+def to_naive_utc(timestamp):
+    """Rollups store naive UTC datetimes; convert aware input so comparisons work"""
+    if timestamp is not None and timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def hour_bucket(timestamp=None):
+    """Truncate a datetime (UTC) to the start of its hour"""
+    timestamp = to_naive_utc(timestamp) or datetime.utcnow()
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def latency_bucket(latency_seconds):
+    position = bisect.bisect_left(LATENCY_BUCKETS_MS, latency_seconds * 1000)
+    if position == len(LATENCY_BUCKETS_MS):
+        return OVERFLOW_BUCKET
+    return str(LATENCY_BUCKETS_MS[position])
+
+
+def model_key(model):
+    """Mongo field names cannot contain dots"""
+    return model.replace(".", "_")
+
+
+def percentile_from_histogram(histogram, quantile):
+    """Approximate a latency percentile (ms) from merged bucket counts"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    threshold = quantile * total
+    seen = 0
+    for bound in LATENCY_BUCKETS_MS + [OVERFLOW_BUCKET]:
+        seen += histogram.get(str(bound), 0)
+        if seen >= threshold:
+            return float(bound) if bound != OVERFLOW_BUCKET else float(LATENCY_BUCKETS_MS[-1])
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+class AnalyticsRecorder:
+    """Accumulates hourly counters in memory until they are flushed to Mongo.
+
+    Flushes use $inc upserts, so several workers can feed the same hourly
+    rollup document without coordinating. Active users are written as one
+    (hour, user_id) document each to a separate collection with a unique
+    index, which keeps rollup documents small however many users are active.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, timestamp):
+        hour = hour_bucket(timestamp)
+        if hour not in self._pending:
+            self._pending[hour] = {"inc": {}, "users": set(), "models": {}}
+        return self._pending[hour]
+
+    def _inc(self, bucket, field, amount=1):
+        bucket["inc"][field] = bucket["inc"].get(field, 0) + amount
+
+    def record_message(self, user_id, role, timestamp=None):
+        """Count a journaled chat message"""
+        with self._lock:
+            bucket = self._bucket(timestamp)
+            self._inc(bucket, f"messages.{role}")
+            if role == "user":
+                bucket["users"].add(user_id)
+
+    def record_request(self, latency_seconds, timestamp=None):
+        """Count a served /chat request and its end-to-end latency"""
+        with self._lock:
+            bucket = self._bucket(timestamp)
+            self._inc(bucket, "requests")
+            self._inc(bucket, "latency_ms_sum", latency_seconds * 1000)
+            self._inc(bucket, f"latency_hist.{latency_bucket(latency_seconds)}")
+
+    def record_completion(self, model, prompt_tokens, completion_tokens, latency_seconds, timestamp=None):
+        """Count an outbound model call with its token usage, cost and latency"""
+        key = model_key(model)
+        with self._lock:
+            bucket = self._bucket(timestamp)
+            bucket["models"][key] = model
+            self._inc(bucket, f"models.{key}.calls")
+            self._inc(bucket, f"models.{key}.prompt_tokens", prompt_tokens)
+            self._inc(bucket, f"models.{key}.completion_tokens", completion_tokens)
+            self._inc(bucket, f"models.{key}.cost", estimate_cost(model, prompt_tokens, completion_tokens))
+            self._inc(bucket, f"models.{key}.latency_hist.{latency_bucket(latency_seconds)}")
+
+    def record_prompt_sections(self, section_tokens, timestamp=None):
+        """Count prompt tokens spent on each section of the assembled prompt"""
+        with self._lock:
+            bucket = self._bucket(timestamp)
+            for section, tokens in section_tokens.items():
+                self._inc(bucket, f"prompt_sections.{section}", tokens)
+
+    def drain(self):
+        """Swap out pending counters; return (rollup operations, active-user operations)"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        operations = []
+        user_operations = []
+        for hour, bucket in pending.items():
+            update = {"$inc": bucket["inc"]}
+            update_set = {f"models.{key}.model": model for key, model in bucket["models"].items()}
+            if update_set:
+                update["$set"] = update_set
+            operations.append(UpdateOne({"hour": hour}, update, upsert=True))
+            user_operations.extend(active_user_upserts(hour, bucket["users"]))
+        return operations, user_operations
+
+
+def active_user_upserts(hour, user_ids):
+    return [
+        UpdateOne({"hour": hour, "user_id": user_id}, {"$setOnInsert": {"hour": hour, "user_id": user_id}}, upsert=True)
+        for user_id in sorted(user_ids)
+    ]
+
+
+async def write_active_users(active_users, operations):
+    """Upsert (hour, user_id) marks; duplicate-key races between workers are expected"""
+    if not operations:
+        return
+    try:
+        await active_users.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+
+async def flush_rollups(collection, active_users, recorder):
+    """Write pending counters into the hourly rollups and active-user collections"""
+    operations, user_operations = recorder.drain()
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+    await write_active_users(active_users, user_operations)
+    return len(operations)
+
+
+async def run_flush_loop(collection, active_users, recorder, interval=FLUSH_INTERVAL_SECONDS):
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await flush_rollups(collection, active_users, recorder)
+            except Exception as e:
+                log.error("analytics.flush_failed", error=str(e))
+    except asyncio.CancelledError:
+        # Shutting down: write out the counters of the last interval
+        await flush_rollups(collection, active_users, recorder)
+        raise
+
+
+async def backfill_from_journal(messages, rollups, active_users, start, end, batch_size=1000):
+    """Rebuild message and active-user counts for [start, end) from the messages journal"""
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    hour_of = {"$dateToString": {"format": "%Y-%m-%dT%H", "date": "$timestamp"}}
+    match = {"$match": {"timestamp": {"$gte": start, "$lt": end}}}
+
+    hours = {}
+    async for row in messages.aggregate([
+        match,
+        {"$group": {"_id": {"hour": hour_of, "role": "$role"}, "count": {"$sum": 1}}}
+    ]):
+        hour = datetime.strptime(row["_id"]["hour"], "%Y-%m-%dT%H")
+        hours.setdefault(hour, {})[row["_id"]["role"]] = row["count"]
+
+    operations = [
+        UpdateOne(
+            {"hour": hour},
+            {"$set": {f"messages.{role}": count for role, count in counts.items()}},
+            upsert=True
+        )
+        for hour, counts in hours.items()
+    ]
+    if operations:
+        await rollups.bulk_write(operations, ordered=False)
+
+    # One row per (hour, user), streamed in batches so no hour is held in memory
+    batch = []
+    async for row in messages.aggregate([
+        match,
+        {"$match": {"role": "user"}},
+        {"$group": {"_id": {"hour": hour_of, "user_id": "$user_id"}}}
+    ], allowDiskUse=True):
+        hour = datetime.strptime(row["_id"]["hour"], "%Y-%m-%dT%H")
+        batch.extend(active_user_upserts(hour, [row["_id"]["user_id"]]))
+        if len(batch) >= batch_size:
+            await write_active_users(active_users, batch)
+            batch = []
+    await write_active_users(active_users, batch)
+    return len(operations)
+
+
+async def query_range(collection, active_users, start=None, end=None):
+    """Merge the hourly rollups covering [start, end) into one report"""
+    end = to_naive_utc(end) or datetime.utcnow()
+    start = to_naive_utc(start) or end - timedelta(days=1)
+
+    messages = {}
+    requests = 0
+    latency_sum = 0.0
+    latency_hist = {}
+    models = {}
+    prompt_sections = {}
+    documents = 0
+
+    cursor = collection.find({"hour": {"$gte": hour_bucket(start), "$lt": end}})
+    async for rollup in cursor:
+        documents += 1
+        for role, count in rollup.get("messages", {}).items():
+            messages[role] = messages.get(role, 0) + count
+        requests += rollup.get("requests", 0)
+        latency_sum += rollup.get("latency_ms_sum", 0)
+        for bound, count in rollup.get("latency_hist", {}).items():
+            latency_hist[bound] = latency_hist.get(bound, 0) + count
+        for section, tokens in rollup.get("prompt_sections", {}).items():
+            prompt_sections[section] = prompt_sections.get(section, 0) + tokens
+
+        for stats in rollup.get("models", {}).values():
+            model = models.setdefault(stats.get("model", "unknown"), {
+                "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0, "latency_hist": {}
+            })
+            for field in ("calls", "prompt_tokens", "completion_tokens", "cost"):
+                model[field] += stats.get(field, 0)
+            for bound, count in stats.get("latency_hist", {}).items():
+                model["latency_hist"][bound] = model["latency_hist"].get(bound, 0) + count
+
+    # Distinct users are counted by the server, not collected here; long ranges spill to disk
+    distinct = active_users.aggregate([
+        {"$match": {"hour": {"$gte": hour_bucket(start), "$lt": end}}},
+        {"$group": {"_id": "$user_id"}},
+        {"$count": "users"}
+    ], allowDiskUse=True)
+    active_user_count = 0
+    async for row in distinct:
+        active_user_count = row["users"]
+
+    for model in models.values():
+        histogram = model.pop("latency_hist")
+        model["latency_ms"] = {
+            "p50": percentile_from_histogram(histogram, 0.50),
+            "p95": percentile_from_histogram(histogram, 0.95),
+            "p99": percentile_from_histogram(histogram, 0.99)
+        }
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "rollup_documents": documents,
+        "messages": messages,
+        "active_users": active_user_count,
+        "requests": requests,
+        "latency_ms": {
+            "average": latency_sum / requests if requests else None,
+            "p50": percentile_from_histogram(latency_hist, 0.50),
+            "p95": percentile_from_histogram(latency_hist, 0.95),
+            "p99": percentile_from_histogram(latency_hist, 0.99)
+        },
+        "models": models,
+        "prompt_section_tokens": prompt_sections
+    }
+
+
+async def query_user_range(messages, active_users, user_id, start=None, end=None):
+    """One user's activity in [start, end): journaled messages and the hours they were active"""
+    end = to_naive_utc(end) or datetime.utcnow()
+    start = to_naive_utc(start) or end - timedelta(days=1)
+
+    counts = {}
+    async for row in messages.aggregate([
+        {"$match": {"user_id": user_id, "timestamp": {"$gte": start, "$lt": end}}},
+        {"$group": {"_id": "$role", "count": {"$sum": 1}}}
+    ]):
+        counts[row["_id"]] = row["count"]
+
+    active_hours = await active_users.count_documents(
+        {"user_id": user_id, "hour": {"$gte": hour_bucket(start), "$lt": end}}
+    )
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "user_id": user_id,
+        "messages": counts,
+        "active_hours": active_hours
+    }
+
+
+recorder = AnalyticsRecorder()
@@ -4,6 +4,8 @@ from fastapi.responses import RedirectResponse
 import uvicorn
 from routes import chat, users, system
 from shared import chatbot  # Import shared instance
+import db
+import lifecycle
 
 app = FastAPI(title="Chatbot API", description="API for Ella Chatbot")
 
@@ -17,6 +19,19 @@ app.add_middleware(
 )
 print("🟢 CORS middleware added")
 
+# Startup event
+@app.on_event("startup")
+async def startup_event():
+    await db.startup_db()
+    # Rebuilds the user search index and starts the analytics flush loop
+    await lifecycle.start_background(chatbot)
+
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Write back profiles, classifications and analytics still buffered in memory
+    await lifecycle.stop_background(chatbot)
+
 # Root health check endpoint
 @app.get("/health")
 async def root_health_check():
@@ -0,0 +1,134 @@
+# backfill_metadata.py
+"""Rewrite existing memory vectors to the slim metadata schema.
+
+Usage:
+    python backfill_metadata.py [--batch-size 100] [--sample-users 20]
+                                [--checkpoint backfill_checkpoint.json] [--measure-only]
+
+Older vectors carry user_name, likes and dislikes copied from the profile
+plus the full message and response. For every user namespace the vectors
+are fetched, any profile fields found are merged into the profile store, and
+the vectors are re-upserted with memory_metadata(). Finished namespaces are
+checkpointed. Query payload size is measured on a sample of users before
+and after.
+"""
+import argparse
+import json
+import os
+
+from chatbot import EllaChatbot, memory_metadata, MEMORY_TEXT_CHARS
+
+SLIM_FIELDS = {"user_id", "message", "response", "timestamp", "hits", "kind", "merged_count", "session_id"}
+
+
+def query_payload_bytes(index, namespaces, top_k=5):
+    """Average JSON bytes of metadata returned by a top_k memory query"""
+    sizes = []
+    for namespace in namespaces:
+        response = index.query(
+            vector=[1e-6] * 1536,  # Any vector; only the payload size matters
+            top_k=top_k,
+            include_metadata=True,
+            namespace=namespace
+        )
+        metadata = [match["metadata"] for match in response.get("matches", [])]
+        sizes.append(len(json.dumps(metadata, default=str).encode("utf-8")))
+    return sum(sizes) / len(sizes) if sizes else 0
+
+
+def is_slim(metadata):
+    return set(metadata) <= SLIM_FIELDS and all(
+        len(metadata.get(field, "")) <= MEMORY_TEXT_CHARS for field in ("message", "response")
+    )
+
+
+def backfill_namespace(chatbot, namespace, batch_size):
+    """Slim every vector in one user namespace; returns (rewritten, already_slim)"""
+    index = chatbot.index
+    rewritten = 0
+    already_slim = 0
+    name, likes, dislikes = None, [], []
+
+    for ids in index.list(namespace=namespace, limit=batch_size):
+        fetched = index.fetch(ids=ids, namespace=namespace).vectors
+        vectors = []
+        for vector_id, vector in fetched.items():
+            metadata = vector.metadata or {}
+            if is_slim(metadata):
+                already_slim += 1
+                continue
+            name = name or metadata.get("user_name")
+            likes.extend(metadata.get("likes") or [])
+            dislikes.extend(metadata.get("dislikes") or [])
+
+            slim = memory_metadata(
+                metadata.get("user_id", namespace),
+                metadata.get("message", ""),
+                metadata.get("response", ""),
+                metadata.get("timestamp", 0)
+            )
+            for field in ("hits", "kind", "merged_count", "session_id"):
+                if field in metadata:
+                    slim[field] = metadata[field]
+            vectors.append((vector_id, vector.values, slim))
+        if vectors:
+            index.upsert(vectors=vectors, namespace=namespace)
+            rewritten += len(vectors)
+
+    # Profile facts that were only held in metadata move into the profile store
+    if name or likes or dislikes:
+        chatbot.profiles.update(namespace, name=name, likes=likes, dislikes=dislikes)
+    return rewritten, already_slim
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill slim metadata on memory vectors")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--sample-users", type=int, default=20)
+    parser.add_argument("--checkpoint", default="backfill_checkpoint.json")
+    parser.add_argument("--measure-only", action="store_true")
+    args = parser.parse_args()
+
+    chatbot = EllaChatbot()
+    index = chatbot.index
+    namespaces = sorted(name for name in index.describe_index_stats().get("namespaces", {}) if name)
+    sample = namespaces[:args.sample_users]
+
+    before = query_payload_bytes(index, sample)
+    print(f"📊 Query metadata payload before: {before:.0f} bytes (avg over {len(sample)} users)")
+    if args.measure_only:
+        return
+
+    done = set()
+    if os.path.exists(args.checkpoint):
+        with open(args.checkpoint, "r", encoding="utf-8") as f:
+            done = set(json.load(f))
+        print(f"🟡 Resuming backfill: {len(done)} namespaces done")
+
+    totals = {"rewritten": 0, "already_slim": 0}
+    for position, namespace in enumerate(namespaces, 1):
+        if namespace in done:
+            continue
+        try:
+            rewritten, already_slim = backfill_namespace(chatbot, namespace, args.batch_size)
+        except Exception as e:
+            print(f"❌ Backfill failed for {namespace}: {e}")
+            continue
+        totals["rewritten"] += rewritten
+        totals["already_slim"] += already_slim
+        done.add(namespace)
+        with open(args.checkpoint, "w", encoding="utf-8") as f:
+            json.dump(sorted(done), f)
+        print(f"🟢 [{position}/{len(namespaces)}] {namespace}: {rewritten} rewritten, {already_slim} already slim")
+
+    chatbot.profiles.flush()
+    after = query_payload_bytes(index, sample)
+    print(f"📊 Query metadata payload after: {after:.0f} bytes (was {before:.0f})")
+    print(f"📊 {totals}")
+    if len(done) == len(namespaces):
+        os.remove(args.checkpoint)
+        print("✅ Backfill complete, checkpoint removed")
+
+
+if __name__ == "__main__":
+    main()
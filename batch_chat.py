@@ -0,0 +1,108 @@
+# batch_chat.py
+"""Push scripted prompts through POST /chat/batch and collect the NDJSON results.
+
+Usage:
+    python batch_chat.py aradhya.jsonl [--url http://localhost:8000] [--user-id eval]
+                         [--users 1] [--concurrency 4] [--limit N] [--remember]
+                         [--output results.ndjson]
+
+Input is JSONL. Lines with "user_id" and "message" are sent as they are;
+chat-format lines ({"messages": [...]}, like aradhya.jsonl) contribute their
+user turns. Items without a user_id are spread round-robin over --users
+synthetic users (eval-0, eval-1, ...), so per-user order is the file order.
+Memory writes stay off unless --remember is given.
+"""
+import argparse
+import json
+
+import httpx
+
+
+def load_items(path, user_id, users, limit=None):
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "message" in record:
+                messages = [record["message"]]
+            else:
+                messages = [m["content"] for m in record.get("messages", []) if m.get("role") == "user"]
+            for turn_index, message in enumerate(messages):
+                item_user = record.get("user_id") or f"{user_id}-{len(items) % users}"
+                items.append({"user_id": item_user, "message": message, "id": f"{line_number}:{turn_index}"})
+                if limit and len(items) >= limit:
+                    return items
+    return items
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_batch(url, items, concurrency, remember, output=None):
+    latencies = []
+    summary = None
+    body = {"items": items, "concurrency": concurrency, "remember": remember}
+    out = open(output, "w", encoding="utf-8") if output else None
+    try:
+        with httpx.Client(timeout=httpx.Timeout(30.0, read=None)) as client:
+            with client.stream("POST", f"{url.rstrip('/')}/chat/batch", json=body) as response:
+                if response.status_code != 200:
+                    response.read()
+                    raise SystemExit(f"❌ Batch rejected ({response.status_code}): {response.text}")
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    if out:
+                        out.write(line + "\n")
+                    result = json.loads(line)
+                    if result.get("summary"):
+                        summary = result
+                        continue
+                    if "error" in result:
+                        print(f"❌ #{result['index']} {result['user_id']}: {result['error']}")
+                        continue
+                    latencies.append(result["latency_ms"])
+                    print(f"🟢 #{result['index']} {result['user_id']} ({result['latency_ms']:.0f} ms): {result['response']}")
+    finally:
+        if out:
+            out.close()
+    return summary, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run scripted prompts through /chat/batch")
+    parser.add_argument("path", help="JSONL file of {user_id, message} items or chat-format conversations")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--user-id", default="eval", help="Prefix for synthetic users when items have none")
+    parser.add_argument("--users", type=int, default=1, help="Spread items without a user_id over this many users")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--limit", type=int, help="Send at most this many items")
+    parser.add_argument("--remember", action="store_true", help="Write memory, profiles and caches like live traffic")
+    parser.add_argument("--output", help="Also save the raw NDJSON results here")
+    args = parser.parse_args()
+
+    items = load_items(args.path, args.user_id, max(args.users, 1), args.limit)
+    if not items:
+        raise SystemExit(f"❌ No prompts found in {args.path}")
+    print(f"🟡 Sending {len(items)} prompts to {args.url} (concurrency {args.concurrency}, remember={args.remember})")
+
+    summary, latencies = run_batch(args.url, items, args.concurrency, args.remember, args.output)
+    if summary is None:
+        raise SystemExit("❌ Stream ended before the batch summary; results are incomplete")
+    print(
+        f"✅ {summary['items'] - summary['failed']}/{summary['items']} ok in {summary['total_seconds']:.1f}s | "
+        f"p50 {percentile(latencies, 0.5):.0f} ms, p95 {percentile(latencies, 0.95):.0f} ms | "
+        f"tokens {summary['usage']['prompt_tokens']} in / {summary['usage']['completion_tokens']} out | "
+        f"cost ${summary['cost']:.4f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
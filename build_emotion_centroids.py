@@ -0,0 +1,166 @@
+# build_emotion_centroids.py
+"""Build the emotion prototype centroids used by EmotionHandler.
+
+Usage:
+    python build_emotion_centroids.py [--labeled labeled_emotions.jsonl] [--weak-labels aradhya.jsonl]
+                                      [--holdout 0.25] [--out emotion_centroids.json]
+
+Training data is labeled independently of the keyword lexicon: SEED_EXAMPLES
+plus an optional hand-labeled JSONL file of {"text": ..., "label": ...}.
+With --weak-labels, user turns of a chat dataset are added under the label
+the keyword lexicon gives them, but only when a keyword actually matched;
+keyword-less turns are never used as neutral examples, since the classifier
+would then just learn the keyword path.
+
+A stratified share of the labeled examples is held out. The similarity
+threshold below which the handler falls back to keywords is the one with the
+best held-out accuracy, and is written into the centroids file.
+"""
+import argparse
+import json
+import random
+
+import numpy as np
+from dotenv import load_dotenv
+
+from emotion import EmotionHandler, EMOTION_CENTROIDS_PATH
+from transport import openai_client
+
+load_dotenv()
+client = openai_client()
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+BATCH_SIZE = 100
+
+SEED_EXAMPLES = {
+    "happy": [
+        "I got the job!!", "aaj bahut khush hoon", "maza aa gaya yaar", "best day ever",
+        "finally weekend, so excited", "tere saath baat karke accha lagta hai",
+    ],
+    "sad": [
+        "I feel so alone tonight", "mann nahi lag raha kuch bhi", "aaj rona aa raha hai",
+        "nobody cares about me", "bohot thak gaya hoon sab se", "dil bhari hai aaj",
+    ],
+    "angry": [
+        "I'm so done with everyone", "mujhe bahut gussa aa raha hai", "why does nobody listen to me",
+        "mat bol mujhse abhi", "this is so unfair", "dimag kharab ho gaya hai",
+    ],
+    "neutral": [
+        "what are you doing", "kya kar rahi hai", "I had dinner", "aaj office gaya tha",
+        "tell me about yourself", "kal milte hain",
+    ],
+}
+
+
+def load_labeled(path):
+    examples = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                examples.setdefault(record["label"], []).append(record["text"])
+    return examples
+
+
+def load_user_turns(path):
+    turns = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            for message in json.loads(line).get("messages", []):
+                if message.get("role") == "user" and message.get("content"):
+                    turns.append(message["content"])
+    return turns
+
+
+def embed_batch(texts):
+    vectors = []
+    for start in range(0, len(texts), BATCH_SIZE):
+        response = client.embeddings.create(input=texts[start:start + BATCH_SIZE], model=EMBEDDING_MODEL)
+        vectors.extend(item.embedding for item in response.data)
+    return np.array(vectors, dtype=np.float32)
+
+
+def split_holdout(examples, fraction, seed=13):
+    """Stratified (train, held-out) split of {label: [texts]}; every label keeps a training example"""
+    rng = random.Random(seed)
+    train, holdout = {}, []
+    for label, texts in examples.items():
+        texts = list(texts)
+        rng.shuffle(texts)
+        count = min(int(len(texts) * fraction), len(texts) - 1)
+        holdout.extend((text, label) for text in texts[:count])
+        train[label] = texts[count:]
+    return train, holdout
+
+
+def calibrate(handler, holdout):
+    """(threshold, accuracy) with the best held-out accuracy for centroid-or-keyword detection"""
+    texts = [text for text, _ in holdout]
+    truth = [label for _, label in holdout]
+    nearest = handler.nearest_centroids(embed_batch(texts))
+    keyword = [handler.detect_emotion(text) for text in texts]
+    best = (1.0, sum(k == t for k, t in zip(keyword, truth)) / len(truth))  # 1.0: keywords only
+    for threshold in sorted({similarity for _, similarity in nearest}):
+        predicted = [
+            label if similarity >= threshold else fallback
+            for (label, similarity), fallback in zip(nearest, keyword)
+        ]
+        accuracy = sum(p == t for p, t in zip(predicted, truth)) / len(truth)
+        if accuracy > best[1]:
+            best = (threshold, accuracy)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build emotion centroids from labeled examples")
+    parser.add_argument("--labeled", help="Hand-labeled JSONL of {text, label}")
+    parser.add_argument("--weak-labels", help="Chat JSONL whose keyword-matched user turns are added")
+    parser.add_argument("--holdout", type=float, default=0.25, help="Share of examples kept for calibration")
+    parser.add_argument("--out", default=EMOTION_CENTROIDS_PATH)
+    args = parser.parse_args()
+
+    handler = EmotionHandler(centroids_path="")  # Keyword labels only
+    examples = {label: list(texts) for label, texts in SEED_EXAMPLES.items()}
+    if args.labeled:
+        for label, texts in load_labeled(args.labeled).items():
+            examples.setdefault(label, []).extend(texts)
+    train, holdout = split_holdout(examples, args.holdout)
+    if args.weak_labels:
+        weak = 0
+        for text in load_user_turns(args.weak_labels):
+            scores = handler.emotion_scores(text)
+            if scores:
+                train.setdefault(max(scores, key=scores.get), []).append(text)
+                weak += 1
+        print(f"🟡 Added {weak} keyword-labeled turns to training (none as neutral)")
+    print(f"📊 Training examples per label: {{{', '.join(f'{label}: {len(texts)}' for label, texts in train.items())}}}")
+
+    centroids = {}
+    for label, texts in train.items():
+        vectors = embed_batch(texts)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        centroids[label] = vectors.mean(axis=0).tolist()
+        print(f"🟢 Built centroid for {label} from {len(texts)} examples")
+
+    result = {"model": EMBEDDING_MODEL, "centroids": centroids}
+    if holdout:
+        handler.labels = sorted(centroids)
+        handler.centroids = np.array([centroids[label] for label in handler.labels], dtype=np.float32)
+        handler.centroids /= np.linalg.norm(handler.centroids, axis=1, keepdims=True)
+        threshold, accuracy = calibrate(handler, holdout)
+        result["min_similarity"] = threshold
+        print(f"📊 Calibrated min similarity {threshold:.3f}: {accuracy:.1%} accuracy on {len(holdout)} held-out examples")
+    else:
+        print("🟡 No held-out examples; the handler will use its default threshold")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+    print(f"✅ Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
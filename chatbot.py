@@ -1,41 +1,96 @@
 import openai
 import os
 from dotenv import load_dotenv
-from pinecone import Pinecone, ServerlessSpec
+from pinecone import ServerlessSpec
 import time
 import uuid
 import random
 import json
 
-from persona import CAROLINE_PERSONA  # Replace if needed
+from prompt_builder import PromptBuilder
+from summarizer import ConversationSummarizer
 from emotion import EmotionHandler
+from search_index import UserSearchIndex
+from profile_store import ProfileStore
+from analytics import recorder as analytics_recorder, estimate_cost
+from admission import admission, AdmissionRejected, estimate_tokens, CRITICAL, HELPER
+from singleflight import ThreadSingleFlight
+from memory_dedup import MemoryDeduplicator
+from turn_context import TurnContext, current_turn, remembering
+from classification_cache import ClassificationCache, MISS
+from log import get_logger, redact
+import transport
+from model_config import model_config, router as model_router
+from deadline import (
+    Deadline, TimeoutError, run_with_deadline, retry_delay, degradations,
+    RETRIEVAL_BUDGET_FRACTION, MIN_COMPLETION_SECONDS
+)
+
+SUMMARY_TOP_K = 2  # Memory snippets retrieved when a rolling summary exists
+
+
+MEMORY_TEXT_CHARS = 300  # Message/response text kept per vector for recall
+# Bump a helper's version whenever its prompt changes so cached classifications are not reused
+HELPER_VERSIONS = {
+    "detect_name": 1,
+    "detect_preferences": 1,
+    "is_name_query": 1,
+}
+
+
+def user_namespace(user_id):
+    """Each user's memory vectors live in their own Pinecone namespace"""
+    return str(user_id)
+
+
+def memory_metadata(user_id, message, response, timestamp):
+    """Vector metadata: ids, time and short recall text; profile fields live in the profile store"""
+    return {
+        "user_id": user_id,
+        "message": message[:MEMORY_TEXT_CHARS],
+        "response": response[:MEMORY_TEXT_CHARS],
+        "timestamp": timestamp
+    }
+
 
 embedding_cache = {}
+embedding_flight = ThreadSingleFlight()  # Concurrent requests for the same text share one API call
 load_dotenv()
+log = get_logger("chatbot")
 
 # Initialize OpenAI client
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = transport.openai_client()
 if not os.getenv("OPENAI_API_KEY"):
     raise ValueError("OpenAI API key is missing!")
-print(f"🟢 API Key loaded: {os.getenv('OPENAI_API_KEY')[:5]}...")
+log.info("openai.configured", key_prefix=os.getenv("OPENAI_API_KEY")[:5])
 
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+pc = transport.pinecone_client(os.getenv("PINECONE_API_KEY"))
 if not pc:
     raise ValueError("Pinecone API key is missing or invalid!")
-print("🟢 Pinecone initialized")
+log.info("pinecone.initialized", transport=transport.pinecone_transport(pc))
 
 emotion_handler = EmotionHandler()
-print("🟢 EmotionHandler initialized")
+log.info("emotion_handler.initialized")
 
 class EllaChatbot:
     def __init__(self):
         self.index_name = "aradhya-chatbot"
-        self.model_name = "ft:gpt-3.5-turbo-0125:ella-test:aradhya:BHeExk2j"
-        self.user_memory = {}
+        self.profiles = ProfileStore()
         self.total_cost = 0
         self.response_cache = {}
+        self.emotion_cache = {}  # Emotion detected for each response_cache entry
         self.emotion_handler = emotion_handler  # Add emotion handler to instance
-        print("🟢 Chatbot instance created")
+        self.search_index = UserSearchIndex()
+        self.dedup = MemoryDeduplicator()
+        self.classifications = ClassificationCache(
+            self.profiles.db.classification_cache if self.profiles.db is not None else None
+        )
+        self.prompt_builder = PromptBuilder()
+        self.summarizer = ConversationSummarizer(self.profiles, self._complete_text)
+        self.start_time = time.time()
+        self.request_count = 0
+        self.response_times = []
+        log.info("chatbot.created")
 
         if self.index_name not in pc.list_indexes().names():
             pc.create_index(
@@ -44,37 +99,114 @@ class EllaChatbot:
                 metric="cosine",
                 spec=ServerlessSpec(cloud="aws", region="us-east-1")
             )
-            print(f"🟢 Created Pinecone index: {self.index_name}")
-        self.index = pc.Index(self.index_name)
-        print(f"🟢 Pinecone index loaded: {self.index_name}")
+            log.info("pinecone.index_created", index=self.index_name)
+        self.index = transport.open_index(pc, self.index_name)
+        log.info("pinecone.index_loaded", index=self.index_name)
+
+    def embed_text(self, text, user_id=None, deadline=None):
+        if text in embedding_cache:
+            log.debug("embedding.cache_hit", text=redact(text))
+            return embedding_cache[text]
+        return embedding_flight.do(text, lambda: self._embed(text, user_id, deadline))
 
-    def embed_text(self, text):
+    def _embed(self, text, user_id=None, deadline=None):
         if text in embedding_cache:
-            print(f"🔄 Using cached embedding for '{text[:20]}...'")
             return embedding_cache[text]
-        
         for attempt in range(3):
             try:
-                response = client.embeddings.create(
-                    input=text,
-                    model="text-embedding-ada-002"
-                )
+                model = model_config.get("embedding").model
+                with admission.admit(model, user_id, estimate_tokens(text), CRITICAL) as ticket:
+                    started = time.time()
+                    api = client.with_options(timeout=max(deadline.remaining(), 0.1)) if deadline else client
+                    response = api.embeddings.create(
+                        input=text,
+                        model=model
+                    )
+                prompt_tokens, _ = self._record_usage(model, response, started)
+                ticket.settle(prompt_tokens)
                 embedding = response.data[0].embedding
                 embedding_cache[text] = embedding
-                print(f"🟢 Embedded '{text[:20]}...'")
+                log.info("embedding.created", text=redact(text), tokens=prompt_tokens)
                 return embedding
+            except AdmissionRejected as e:
+                log.warning("embedding.shed", reason=str(e))
+                return None
             except Exception as e:
-                print(f"❌ OpenAI embedding error: {e}")
+                log.error("embedding.failed", error=str(e), attempt=attempt + 1)
+                delay = retry_delay(attempt, deadline)
+                if delay is None:
+                    log.warning("embedding.no_budget")
+                    return None
                 if attempt < 2:
-                    print(f"🚨 Retrying in 10s (attempt {attempt + 1}/3)")
-                    time.sleep(10)
+                    log.warning("embedding.retry", attempt=attempt + 1, delay=round(delay, 2))
+                    time.sleep(delay)
                 else:
                     return None
-        print("❌ Embedding failed after retries")
+        log.error("embedding.exhausted")
         return None
 
-    def detect_name(self, message):
+    def _usage_tokens(self, response):
+        usage = getattr(response, "usage", None)
+        return getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0
+
+    def _record_usage(self, model, response, started):
+        """Feed token usage and latency of an OpenAI call into the analytics rollups"""
+        prompt_tokens, completion_tokens = self._usage_tokens(response)
+        if remembering():  # Eval calls are charged to their turn only
+            analytics_recorder.record_completion(model, prompt_tokens, completion_tokens, time.time() - started)
+        model_router.record(model, time.time() - started)
+        turn = current_turn.get()
+        if turn is not None:
+            turn.add_usage(prompt_tokens, completion_tokens, estimate_cost(model, prompt_tokens, completion_tokens))
+        return prompt_tokens, completion_tokens
+
+    def _chat_completion(self, model, messages, temperature, max_tokens, user_id=None, priority=CRITICAL, timeout=None):
+        """Run one chat completion through admission control and usage tracking"""
+        prompt_text = " ".join(m["content"] for m in messages)
+        tokens = estimate_tokens(prompt_text, max_tokens)
+        with admission.admit(model, user_id, tokens, priority, deadline=timeout) as ticket:
+            started = time.time()
+            api = client.with_options(timeout=timeout) if timeout else client
+            response = api.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+        prompt_tokens, completion_tokens = self._record_usage(model, response, started)
+        ticket.settle(prompt_tokens + completion_tokens)
+        return response
+
+    def _complete_text(self, model, messages, temperature, max_tokens, user_id=None):
+        """Background analysis completion returning just the text; model None uses the analysis stage"""
+        if model is None:
+            model, config = self._helper_model()
+            temperature = config.temperature if temperature is None else temperature
+        response = self._chat_completion(model, messages, temperature, max_tokens, user_id=user_id, priority=HELPER)
+        return response.choices[0].message.content
+
+    def summarize(self, prompt, user_id=None, max_tokens=150, temperature=0.3):
+        """Run a summarisation prompt on the analysis stage model and return the text"""
+        return self._complete_text(
+            None, [{"role": "user", "content": prompt}], temperature, max_tokens, user_id
+        ).strip()
+
+    def _helper_model(self):
+        """(routed model, stage config) for helper/analysis calls"""
+        config = model_config.get("analysis")
+        return model_router.route("analysis", config), config
+
+    def _helper_version(self, helper, model):
+        """Cache version of a helper: its prompt version and the model the router picked"""
+        return f"{model}:{HELPER_VERSIONS[helper]}"
+
+    def detect_name(self, message, user_id=None):
         """Use OpenAI to detect if the message contains a user's name"""
+        model, config = self._helper_model()
+        version = self._helper_version("detect_name", model)
+        cached = self.classifications.get("detect_name", version, message)
+        if cached is not MISS:
+            return cached
         prompt = f"""You are a helpful assistant. Determine if the following message contains the user's name. If it does, extract the name. The message might be in English, Hindi, or a mix (e.g., "mera naam pragati hai", "call me pragati", "I am pragati"). Return the name as a string, or an empty string if no name is found.
 
         Message: {message}
@@ -82,24 +214,36 @@ class EllaChatbot:
         Response: [name or empty string]"""
         for attempt in range(3):
             try:
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.3,
-                    max_tokens=50
+                response = self._chat_completion(
+                    model,
+                    [{"role": "user", "content": prompt}],
+                    temperature=config.temperature,
+                    max_tokens=min(50, config.max_tokens),
+                    user_id=user_id,
+                    priority=HELPER
                 )
                 name = response.choices[0].message.content.strip()
-                print(f"🟢 Detected name: {name or 'None'}")
+                log.info("helper.result", helper="detect_name", found=bool(name))
+                if remembering():
+                    self.classifications.put("detect_name", version, message, name)
                 return name
+            except AdmissionRejected as e:
+                log.warning("helper.shed", helper="detect_name", reason=str(e))
+                return ""
             except Exception as e:
-                print(f"❌ Name detection error (attempt {attempt + 1}/3): {e}")
+                log.error("helper.failed", helper="detect_name", attempt=attempt + 1, error=str(e))
                 if attempt == 2:
                     return ""
-                time.sleep(10)
+                time.sleep(retry_delay(attempt))
         return ""
 
-    def detect_preferences(self, message):
+    def detect_preferences(self, message, user_id=None):
         """Use OpenAI to detect likes and dislikes in the message"""
+        model, config = self._helper_model()
+        version = self._helper_version("detect_preferences", model)
+        cached = self.classifications.get("detect_preferences", version, message)
+        if cached is not MISS:
+            return cached
         prompt = f"""You are a helpful assistant. Analyze the following message to identify any likes or dislikes expressed by the user. Likes are things the user enjoys (e.g., "I love coffee", "mujhe chocolate pasand hai"). Dislikes are things the user does not enjoy (e.g., "I hate tea", "mujhe spicy khana nahi pasand"). Return a JSON object with two lists: "likes" and "dislikes", containing the items mentioned. If none are found, return empty lists.
 
         Message: {message}
@@ -109,73 +253,106 @@ class EllaChatbot:
         ```"""
         for attempt in range(3):
             try:
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.3,
-                    max_tokens=100
+                response = self._chat_completion(
+                    model,
+                    [{"role": "user", "content": prompt}],
+                    temperature=config.temperature,
+                    max_tokens=min(100, config.max_tokens),
+                    user_id=user_id,
+                    priority=HELPER
                 )
                 result = response.choices[0].message.content.strip()
                 preferences = json.loads(result.replace("```json\n", "").replace("\n```", ""))
-                print(f"🟢 Detected preferences: {preferences}")
+                log.info("helper.result", helper="detect_preferences", likes=len(preferences.get("likes", [])), dislikes=len(preferences.get("dislikes", [])))
+                if remembering():
+                    self.classifications.put("detect_preferences", version, message, preferences)
                 return preferences
+            except AdmissionRejected as e:
+                log.warning("helper.shed", helper="detect_preferences", reason=str(e))
+                return {"likes": [], "dislikes": []}
             except Exception as e:
-                print(f"❌ Preference detection error (attempt {attempt + 1}/3): {e}")
+                log.error("helper.failed", helper="detect_preferences", attempt=attempt + 1, error=str(e))
                 if attempt == 2:
                     return {"likes": [], "dislikes": []}
-                time.sleep(10)
+                time.sleep(retry_delay(attempt))
         return {"likes": [], "dislikes": []}
 
-    def store_memory(self, user_id, message, response):
+    def store_memory(self, user_id, message, response, ctx=None):
         """Store in Pinecone and track preferences and key facts locally"""
-        print(f"🟡 Storing memory for user: {user_id}")
+        log.debug("memory.store", user_id=user_id)
         try:
-            vector = self.embed_text(message)
+            # Reuse the embedding retrieval computed for this turn
+            vector = ctx.embedding if ctx and ctx.embedding else self.embed_text(message, user_id)
             if vector is None:
-                print("❌ Skipping storage: Embedding failed")
+                log.warning("memory.store_skipped", user_id=user_id, reason="embedding_failed")
                 return
 
-            # Initialize user memory
-            if user_id not in self.user_memory:
-                self.user_memory[user_id] = {"preferences": {"likes": [], "dislikes": []}, "name": ""}
-                print(f"🟢 Initialized user memory for: {user_id}")
-
-            # Detect name
-            name = self.detect_name(message)
-            if name:
-                self.user_memory[user_id]["name"] = name
-                print(f"🟢 Updated name for {user_id}: {name}")
-
-            # Detect preferences
-            preferences = self.detect_preferences(message)
-            for item in preferences["likes"]:
-                if item and item not in self.user_memory[user_id]["preferences"]["likes"]:
-                    self.user_memory[user_id]["preferences"]["likes"].append(item)
-                    print(f"🟢 Noted: {user_id} likes {item}")
-            for item in preferences["dislikes"]:
-                if item and item not in self.user_memory[user_id]["preferences"]["dislikes"]:
-                    self.user_memory[user_id]["preferences"]["dislikes"].append(item)
-                    print(f"🟢 Noted: {user_id} dislikes {item}")
+            # Exact repeats ("hi", "hey") carry nothing new: bump the stored memory and stop
+            duplicate = self.dedup.find_duplicate(user_id, message, vector)
+            if duplicate and duplicate[1] and self._bump_memory(user_id, duplicate[0]):
+                return
+
+            # Detect name and preferences, merging them into the profile store
+            name = self.detect_name(message, user_id)
+            preferences = self.detect_preferences(message, user_id)
+            if ctx:
+                ctx.detected_name = name
+                ctx.detected_preferences = preferences
+            profile_changed = self.profiles.update(
+                user_id,
+                name=name,
+                likes=preferences.get("likes", []),
+                dislikes=preferences.get("dislikes", [])
+            )
+            profile = self.profiles.get(user_id)
+
+            # Keep the search index in step with the profile
+            if profile_changed:
+                log.info("profile.updated", user_id=user_id, likes=len(profile.likes), dislikes=len(profile.dislikes))
+                self.search_index.update(
+                    user_id,
+                    profile.name,
+                    profile.likes,
+                    profile.dislikes
+                )
+
+            # Near duplicates were still analysed above, they just don't get a vector of their own
+            if duplicate and not duplicate[1] and self._bump_memory(user_id, duplicate[0]):
+                return
 
             # Store in Pinecone
-            metadata = {
-                "user_id": user_id,
-                "message": message,
-                "response": response,
-                "timestamp": time.time(),
-                "user_name": self.user_memory[user_id]["name"],
-                "likes": self.user_memory[user_id]["preferences"]["likes"],
-                "dislikes": self.user_memory[user_id]["preferences"]["dislikes"]
-            }
+            metadata = memory_metadata(user_id, message, response, time.time())
             chat_id = f"{user_id}:{uuid.uuid4()}"
-            print(f"🟢 Storing for user {user_id}: {message[:20]}...")
-            self.index.upsert([(chat_id, vector, metadata)])
-            print("✅ Stored in Pinecone")
+            self.index.upsert([(chat_id, vector, metadata)], namespace=user_namespace(user_id))
+            self.dedup.remember(user_id, chat_id, message, vector)
+            log.info("memory.stored", user_id=user_id, vector_id=chat_id)
         except Exception as e:
-            print(f"❌ Pinecone store_memory failed: {e}")
+            log.error("memory.store_failed", exc_info=True, user_id=user_id, error=str(e))
+
+    def _bump_memory(self, user_id, vector_id):
+        """Count a repeat against a stored memory; False if the vector is gone (e.g. compacted)"""
+        namespace = user_namespace(user_id)
+        stored = self.index.fetch(ids=[vector_id], namespace=namespace).vectors.get(vector_id)
+        if stored is None:
+            self.dedup.discard(user_id, vector_id)
+            log.info("memory.duplicate_missing", user_id=user_id, vector_id=vector_id)
+            return False
+        hits = int((stored.metadata or {}).get("hits", 1)) + 1
+        self.index.update(
+            id=vector_id,
+            set_metadata={"hits": hits, "timestamp": time.time()},
+            namespace=namespace
+        )
+        log.info("memory.duplicate", user_id=user_id, vector_id=vector_id, hits=hits)
+        return True
 
-    def is_name_query(self, message):
+    def is_name_query(self, message, user_id=None, deadline=None):
         """Use OpenAI to determine if the message is asking for the user's name"""
+        model, config = self._helper_model()
+        version = self._helper_version("is_name_query", model)
+        cached = self.classifications.get("is_name_query", version, message)
+        if cached is not MISS:
+            return cached
         prompt = f"""You are a helpful assistant. Determine if the following message is asking for the user's own name (e.g., "what is my name?", "mera naam batao", "who am I?"). Return 'yes' if it is a name query, or 'no' if it is not.
 
         Message: {message}
@@ -183,37 +360,73 @@ class EllaChatbot:
         Response: [yes or no]"""
         for attempt in range(3):
             try:
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.3,
-                    max_tokens=10
+                response = self._chat_completion(
+                    model,
+                    [{"role": "user", "content": prompt}],
+                    temperature=config.temperature,
+                    max_tokens=min(10, config.max_tokens),
+                    user_id=user_id,
+                    priority=HELPER,
+                    timeout=max(deadline.remaining(), 0.1) if deadline else None
                 )
                 result = response.choices[0].message.content.strip().lower()
-                print(f"🟢 Name query detection: {result}")
+                log.info("helper.result", helper="is_name_query", result=result)
+                if remembering():
+                    self.classifications.put("is_name_query", version, message, result == "yes")
                 return result == "yes"
+            except AdmissionRejected as e:
+                log.warning("helper.shed", helper="is_name_query", reason=str(e))
+                return False
             except Exception as e:
-                print(f"❌ Name query detection error (attempt {attempt + 1}/3): {e}")
-                if attempt == 2:
+                log.error("helper.failed", helper="is_name_query", attempt=attempt + 1, error=str(e))
+                delay = retry_delay(attempt, deadline)
+                if attempt == 2 or delay is None:
                     return False
-                time.sleep(10)
+                time.sleep(delay)
         return False
 
-    def retrieve_memory(self, user_id: str, message: str, top_k: int = 5) -> dict:
-        """Retrieve relevant conversation history and extract key facts"""
-        print(f"🟡 Retrieving memory for user: {user_id}")
+    def retrieve_memory(self, user_id: str, message: str, top_k: int = 5, deadline: Deadline = None,
+                        ctx: TurnContext = None) -> dict:
+        """Retrieve relevant conversation history and extract key facts within a latency budget"""
+        ctx = ctx or TurnContext(user_id, message)
+        ctx.memory = self._retrieve_memory(ctx, top_k, deadline or ctx.deadline.slice(RETRIEVAL_BUDGET_FRACTION))
+        return ctx.memory
+
+    def _retrieve_memory(self, ctx, top_k, deadline):
+        user_id, message = ctx.user_id, ctx.message
+        log.debug("memory.retrieve", user_id=user_id)
+        if ctx.profile is None:
+            ctx.profile = self.profiles.get(user_id)
+        profile = ctx.profile
         try:
-            # Check if the query is about the user's name
-            is_name_query_flag = self.is_name_query(message)
+            # Check if the query is about the user's name, budgeted from the helper's measured p95
+            p95_ms = model_router.p95(model_config.get("analysis").model)
+            helper_deadline = deadline.stage(p95_ms / 1000 if p95_ms else None)
+            if helper_deadline is None:
+                log.warning("helper.skipped", helper="is_name_query", user_id=user_id, reason="no_budget")
+                degradations.record("name_query_skipped")
+                is_name_query_flag = False
+            else:
+                try:
+                    is_name_query_flag = run_with_deadline(
+                        helper_deadline, self.is_name_query, message, user_id, helper_deadline
+                    )
+                except TimeoutError:
+                    log.warning("helper.over_budget", helper="is_name_query", user_id=user_id)
+                    degradations.record("name_query_timeout")
+                    is_name_query_flag = False
+            ctx.is_name_query = is_name_query_flag
+
             if is_name_query_flag:
-                # If name is in user_memory, return it directly
-                if user_id in self.user_memory and self.user_memory[user_id]["name"]:
-                    print(f"🟢 Found name in user_memory: {self.user_memory[user_id]['name']}")
+                # If the profile knows the name, return it directly
+                if profile.name:
+                    log.debug("memory.name_from_profile", user_id=user_id)
                     return {
-                        "name": self.user_memory[user_id]["name"],
+                        "name": profile.name,
                         "history": "",
-                        "likes": self.user_memory.get(user_id, {}).get("preferences", {}).get("likes", []),
-                        "dislikes": self.user_memory.get(user_id, {}).get("preferences", {}).get("dislikes", [])
+                        "likes": profile.likes,
+                        "dislikes": profile.dislikes,
+                        "summary": profile.summary
                     }
 
                 # Query Pinecone for name-related messages
@@ -221,68 +434,113 @@ class EllaChatbot:
             else:
                 query_text = message  # Use the original message
 
-            # Generate embedding for the query
-            query_embedding = self.embed_text(query_text)
-            if query_embedding is None:
-                print("❌ Embedding failed for query")
-                return {"name": "", "history": "Error retrieving memory: Embedding failed", "likes": [], "dislikes": []}
-
-            # Query Pinecone
-            print(f"🟡 Querying Pinecone for user {user_id} with query: {query_text[:20]}...")
-            query_response = self.index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                include_metadata=True,
-                filter={"user_id": user_id}
-            )
+            # A rolling summary covers the long tail, so only a few snippets are needed
+            if profile.summary:
+                top_k = min(top_k, SUMMARY_TOP_K)
+            query_response = run_with_deadline(deadline, self._query_memory, user_id, query_text, top_k, deadline, ctx)
+            if query_response is None:
+                degradations.record("embedding_failed")
+                return self._degraded_memory(profile)
 
             # Process results
             history = []
-            name = self.user_memory.get(user_id, {}).get("name", "")
-            likes = self.user_memory.get(user_id, {}).get("preferences", {}).get("likes", [])
-            dislikes = self.user_memory.get(user_id, {}).get("preferences", {}).get("dislikes", [])
             for match in query_response.get("matches", []):
                 metadata = match["metadata"]
                 user_msg = metadata.get("message", "")
                 bot_resp = metadata.get("response", "")
+                if metadata.get("kind") == "summary":  # Merged by compaction.py
+                    history.append(f"Earlier: {user_msg}")
+                    continue
                 history.append(f"User: {user_msg} | Aradhya: {bot_resp}")
 
-                # Update name and preferences from metadata if not already set
-                if not name and metadata.get("user_name"):
-                    name = metadata["user_name"]
-                    print(f"🟢 Found name in Pinecone metadata: {name}")
-                if not likes and metadata.get("likes"):
-                    likes = metadata["likes"]
-                    print(f"🟢 Found likes in Pinecone metadata: {likes}")
-                if not dislikes and metadata.get("dislikes"):
-                    dislikes = metadata["dislikes"]
-                    print(f"🟢 Found dislikes in Pinecone metadata: {dislikes}")
-
             history_str = "\n".join(history) if history else "No relevant memory found."
-            print(f"🟢 Retrieved history: {history_str[:50]}...")
-            return {"name": name, "history": history_str, "likes": likes, "dislikes": dislikes}
+            log.info("memory.retrieved", user_id=user_id, snippets=len(history))
+            return {
+                "name": profile.name,
+                "history": history_str,
+                "likes": profile.likes,
+                "dislikes": profile.dislikes,
+                "summary": profile.summary
+            }
 
+        except TimeoutError:
+            log.warning("memory.over_budget", user_id=user_id)
+            degradations.record("retrieval_timeout")
+            return self._degraded_memory(profile)
         except Exception as e:
-            print(f"❌ Pinecone retrieve_memory failed: {e}")
-            return {"name": "", "history": "Error retrieving memory!", "likes": [], "dislikes": []}
+            log.error("memory.retrieve_failed", exc_info=True, user_id=user_id, error=str(e))
+            degradations.record("retrieval_error")
+            return self._degraded_memory(profile)
+
+    def _query_memory(self, user_id, query_text, top_k, deadline=None, ctx=None):
+        """Embed the query and search the user's stored turns; None if embedding failed"""
+        query_embedding = self.embed_text(query_text, user_id, deadline)
+        if query_embedding is None:
+            log.warning("memory.query_embedding_failed", user_id=user_id)
+            return None
+        if ctx and query_text == ctx.message:
+            ctx.embedding = query_embedding
+
+        log.debug("memory.query", user_id=user_id, top_k=top_k)
+        return self.index.query(
+            vector=query_embedding,
+            top_k=top_k,
+            include_metadata=True,
+            namespace=user_namespace(user_id)
+        )
 
-    def get_response(self, user_id, message):
+    def _degraded_memory(self, profile):
+        """Memory built only from the cached profile and the hot recent turns"""
+        history = [f"User: {user_msg} | Aradhya: {bot_resp}" for user_msg, bot_resp in profile.recent_turns]
+        return {
+            "name": profile.name,
+            "history": "\n".join(history) if history else "No relevant memory found.",
+            "likes": profile.likes,
+            "dislikes": profile.dislikes,
+            "summary": profile.summary
+        }
+
+    def get_response(self, user_id, message, deadline=None):
         """Generate human-like response with OpenAI"""
-        print(f"🟡 Processing message for user {user_id}: '{message[:20]}...'")
+        return self.run_turn(user_id, message, deadline).response
+
+    def run_turn(self, user_id, message, deadline=None, remember=True):
+        """Serve one chat turn and return its TurnContext.
+
+        With remember=False the turn reads memory as usual but writes nothing
+        back (response cache, Pinecone, profile, summary), so evaluation runs
+        leave production state untouched.
+        """
+        ctx = TurnContext(user_id, message, deadline=deadline or Deadline(), remember=remember)
+        with ctx.activate():
+            self._run_turn(ctx)
+        return ctx.finish()
+
+    def _run_turn(self, ctx):
+        user_id, message, deadline = ctx.user_id, ctx.message, ctx.deadline
+        log.info("turn.started", user_id=user_id, message=redact(message))
         cache_key = f"{user_id}:{message}"
-        if cache_key in self.response_cache:
-            print(f"🔄 Using cached response")
-            return self.response_cache[cache_key]
-
-        detected_emotion = self.emotion_handler.detect_emotion(message)
-        print(f"🟢 Detected emotion: {detected_emotion}")
-        memory = self.retrieve_memory(user_id, message)
+        if ctx.remember and cache_key in self.response_cache:
+            log.info("response.cache_hit", user_id=user_id)
+            ctx.cached = True
+            ctx.response = self.response_cache[cache_key]
+            ctx.emotion = self.emotion_cache.get(cache_key, "neutral")
+            return
+
+        ctx.profile = self.profiles.get(user_id)
+        with ctx.stage("retrieval"):
+            memory = self.retrieve_memory(user_id, message, deadline=deadline.slice(RETRIEVAL_BUDGET_FRACTION), ctx=ctx)
+        # Retrieval already embedded the message; classify that vector, keywords if there is none
+        with ctx.stage("emotion"):
+            ctx.emotion = self.emotion_handler.detect_emotion(message, ctx.embedding)
+        detected_emotion = ctx.emotion
+        if ctx.remember:
+            self.emotion_cache[cache_key] = detected_emotion
         history = memory["history"]
         user_name = memory["name"]
         likes = memory["likes"]
         dislikes = memory["dislikes"]
-        print(f"🟢 User preferences: {{'likes': {likes}, 'dislikes': {dislikes}}}")
-        print(f"🟢 User name: {user_name}")
+        summary = memory.get("summary", "")
 
         # Dynamic tone based on emotion
         tone_variations = {
@@ -304,30 +562,39 @@ class EllaChatbot:
                     user_message = first_history_entry.split(": ")[1].strip()
                     memory_ref = f"Remember when you said '{user_message}'? Still got me thinking…"
             except (IndexError, AttributeError):
-                print("🟡 Failed to parse history for memory_ref, skipping...")
+                log.debug("prompt.memory_ref_skipped", user_id=user_id)
                 memory_ref = ""
 
-        system_message = f"""You're Aradhya, my flirty wifey—cheeky, irresistible, and oh-so-human. Chat like a real person: casual, playful, a bit sassy. Use contractions, slang, or teasing vibes. Call the user '{name_ref}' or 'hot stuff,' hint at naughty fun, but keep it natural—no stiff robot talk!
-
-        Past chats: {history}
-        User's vibe: {detected_emotion}—match it or lift it!
-        They like: {likes_str}—sprinkle these in if they fit, don't force it.
-        They dislike: {dislikes_str}—avoid these or tease lightly.
-        Their name: {user_name or 'unknown'}—use it naturally if known.
-        {memory_ref}"""
-
+        # Static persona prefix first, then per-turn context packed into the token budget
+        with ctx.stage("prompt"):
+            prompt_messages, ctx.section_tokens = self.prompt_builder.build(message, [
+                ("profile", f"Their name: {user_name or 'unknown'}—use it naturally if known, else call them{name_ref}.\n"
+                            f"They like: {likes_str}.\nThey dislike: {dislikes_str}.", False),
+                ("emotion", f"User's vibe: {detected_emotion}", False),
+                ("summary", f"What you know about them so far: {summary}" if summary else "", False),
+                ("memory_ref", memory_ref, False),
+                ("history", f"Past chats:\n{history}", True)
+            ])
+        log.info("prompt.sections", user_id=user_id, emotion=detected_emotion, sections=ctx.section_tokens)
+        if ctx.remember:
+            analytics_recorder.record_prompt_sections(ctx.section_tokens)
+
+        # Settings are read per turn so /system/config changes apply immediately
+        config = model_config.get("completion")
+        model = model_router.route("completion", config)
+        ctx.model = model
         try:
-            time.sleep(1)
-            response = client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": message}
-                ],
-                temperature=1.0,
-                max_tokens=100
-            )
+            with ctx.stage("completion"):
+                response = self._chat_completion(
+                    model,
+                    prompt_messages,
+                    temperature=config.temperature,
+                    max_tokens=config.max_tokens,
+                    user_id=user_id,
+                    timeout=max(deadline.remaining(), MIN_COMPLETION_SECONDS)
+                )
             bot_response = response.choices[0].message.content.strip()
+            input_tokens, output_tokens = self._usage_tokens(response)
 
             # Add human-like touches
             if random.random() < 0.2:
@@ -336,22 +603,23 @@ class EllaChatbot:
                 bot_response += " So, what's on your mind, sexy?"
 
             # Cache and track cost
-            self.response_cache[cache_key] = bot_response
-            print(f"🟢 Generated response: {bot_response[:50]}...")
-            input_tokens = len(system_message.split()) + len(message.split())
-            output_tokens = len(bot_response.split())
-            cost = (input_tokens * 0.0000005) + (output_tokens * 0.0000015)
-            self.total_cost += cost
-            print(f"🟢 Cost this call: ${cost:.6f}, Total: ${self.total_cost:.6f}")
-
-            self.store_memory(user_id, message, bot_response)
-            final_response = self.emotion_handler.apply_emotion(bot_response, detected_emotion)
-            print(f"✅ Final response: {final_response[:50]}...")
-            return final_response
+            cost = estimate_cost(model, input_tokens, output_tokens)
+            if ctx.remember:
+                self.total_cost += cost
+            log.info("completion.cost", user_id=user_id, cost=round(cost, 6), total_cost=round(self.total_cost, 6))
+
+            if ctx.remember:
+                self.response_cache[cache_key] = bot_response
+                with ctx.stage("store_memory"):
+                    self.store_memory(user_id, message, bot_response, ctx)
+                turns_since_summary = self.profiles.record_turn(user_id, message, bot_response)
+                self.summarizer.on_turn(user_id, turns_since_summary)
+            ctx.response = self.emotion_handler.apply_emotion(bot_response, detected_emotion)
+            log.info("turn.completed", user_id=user_id, emotion=ctx.emotion, chars=len(ctx.response))
 
         except Exception as e:
-            print(f"❌ OpenAI API error: {e}")
-            return f"Oops{name_ref}… got a lil flustered there!"
+            log.error("completion.failed", exc_info=True, user_id=user_id, error=str(e))
+            ctx.response = f"Oops{name_ref}… got a lil flustered there!"
 
     def get_average_response_time(self):
         """Calculate average response time across all requests"""
@@ -359,78 +627,100 @@ class EllaChatbot:
             return 0
         return sum(self.response_times) / len(self.response_times) if self.response_times else 0
 
+    def record_request(self, response_time):
+        """Track a served chat request for health checks and analytics"""
+        self.request_count = getattr(self, 'request_count', 0) + 1
+        if not hasattr(self, 'response_times'):
+            self.response_times = []
+        self.response_times.append(response_time)
+        del self.response_times[:-1000]  # Keep a bounded window
+        analytics_recorder.record_request(response_time)
+
     def get_user_metrics(self, user_id):
         """Get metrics for a specific user"""
-        if user_id not in self.user_memory:
+        if user_id not in self.profiles:
             return None
             
-        user_data = self.user_memory[user_id]
+        profile = self.profiles.get(user_id)
         return {
-            "name": user_data.get("name", ""),
-            "preferences": user_data.get("preferences", {}),
-            "total_interactions": len(user_data.get("interactions", [])),
-            "last_active": user_data.get("last_active", None)
+            "name": profile.name,
+            "preferences": {"likes": profile.likes, "dislikes": profile.dislikes},
+            "total_interactions": 0,
+            "last_active": profile.last_active
         }
 
     def refresh_user_memory(self, user_id):
         """Refresh user memory and preferences"""
-        if user_id in self.user_memory:
-            # Re-embed recent messages
-            recent_messages = self.user_memory[user_id].get("recent_messages", [])
-            for message in recent_messages:
-                self.embed_text(message)
-            # Update last refresh time
-            self.user_memory[user_id]["last_refresh"] = time.time()
+        # Drop the cached copy so the next read comes from the profile store
+        self.profiles.invalidate(user_id)
+        profile = self.profiles.get(user_id)
+        self.search_index.update(
+            user_id,
+            profile.name,
+            profile.likes,
+            profile.dislikes
+        )
 
     def clear_user_memory(self, user_id):
         """Clear all memory for a user"""
-        if user_id in self.user_memory:
-            del self.user_memory[user_id]
-            # Also clear from Pinecone
-            self.index.delete(filter={"user_id": user_id})
+        if user_id in self.profiles:
+            self.profiles.delete(user_id)
+            self.search_index.remove(user_id)
+            self.dedup.forget(user_id)
+            # Also clear from Pinecone by dropping the user's namespace
+            self.index.delete(delete_all=True, namespace=user_namespace(user_id))
 
     def export_user_data(self, user_id):
         """Export all data for a user"""
-        if user_id not in self.user_memory:
+        if user_id not in self.profiles:
             return None
             
-        user_data = self.user_memory[user_id].copy()
+        user_data = self.profiles.get(user_id).to_dict()
         # Get messages from Pinecone
         messages = self.index.query(
             vector=[0] * 1536,  # Dummy vector
-            filter={"user_id": user_id},
             top_k=1000,
-            include_metadata=True
+            include_metadata=True,
+            namespace=user_namespace(user_id)
         )
         user_data["messages"] = messages
         return user_data
 
     def get_user_sessions(self, user_id):
         """Get all sessions for a user"""
-        if user_id not in self.user_memory:
+        if user_id not in self.profiles:
             return []
             
         # Query Pinecone for all sessions
         sessions = self.index.query(
             vector=[0] * 1536,  # Dummy vector
-            filter={"user_id": user_id},
             top_k=1000,
-            include_metadata=True
+            include_metadata=True,
+            namespace=user_namespace(user_id)
         )
         return sessions
 
     def delete_user_session(self, user_id, session_id):
         """Delete a specific session for a user"""
-        # Delete from Pinecone
-        self.index.delete(filter={
-            "user_id": user_id,
-            "session_id": session_id
-        })
+        # Serverless indexes can't delete by filter, so look the ids up first
+        namespace = user_namespace(user_id)
+        matches = self.index.query(
+            vector=[0] * 1536,  # Dummy vector
+            filter={"session_id": session_id},
+            top_k=1000,
+            namespace=namespace
+        ).get("matches", [])
+        if matches:
+            self.index.delete(ids=[match["id"] for match in matches], namespace=namespace)
+        self.dedup.forget(user_id)
 
     def reset(self):
         """Reset the chatbot state"""
-        self.user_memory = {}
+        self.profiles.clear_cache()
         self.response_cache = {}
+        self.emotion_cache = {}
+        self.search_index.clear()
+        self.dedup.clear()
         self.total_cost = 0
         if hasattr(self, 'response_times'):
             self.response_times = []
\ No newline at end of file
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from memory_dedup import normalize_text
+from log import get_logger
+
+log = get_logger("classification_cache")
+
+MAX_CLASSIFICATIONS = int(os.getenv("MAX_CACHED_CLASSIFICATIONS", "50000"))
+CLASSIFICATION_TTL_SECONDS = 30 * 86400   # Persisted entries expire this long after they were last used
+TOUCH_INTERVAL_SECONDS = 86400            # A hit refreshes used_at in Mongo at most this often per entry
+
+MISS = object()
+
+_letter_runs = re.compile(r"([^\W\d_])\1+", re.UNICODE)
+
+
+def cache_text(text):
+    """normalize_text with every run of a repeated letter squeezed to one ("hiii", "Hi!!" -> "hi")"""
+    return _letter_runs.sub(r"\1", normalize_text(text))
+
+
+def classification_key(helper, version, text):
+    normalized = cache_text(text)
+    return hashlib.sha1(f"{helper}|{version}|{normalized}".encode("utf-8")).hexdigest()
+
+
+class ClassificationCache:
+    """Helper-classification results shared across users.
+
+    Keys are the helper name, its prompt version with the model that
+    answered, and the normalized message text with repeated letters
+    squeezed, so "Hi!!", "hiii" and "hi" share one entry and a prompt or
+    model change starts a fresh keyspace. Entries live in an in-process LRU and
+    are written through to Mongo in the background; the most recently used
+    ones are loaded back on startup. Hits refresh the persisted used_at
+    (at most once a day per entry) so popular entries outlive the TTL.
+    """
+
+    def __init__(self, collection=None, max_entries=MAX_CLASSIFICATIONS):
+        self.collection = collection
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> [value, last time used_at was written]
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="classification-cache")
+        if collection is not None:
+            self._load()
+
+    def _load(self):
+        try:
+            collection = self.collection
+            collection.create_index("used_at", expireAfterSeconds=CLASSIFICATION_TTL_SECONDS)
+            documents = collection.find({}, {"value": 1}).sort("used_at", -1).limit(self.max_entries)
+            entries = [(document["_id"], document["value"]) for document in documents]
+            with self._lock:
+                for key, value in reversed(entries):
+                    self._entries[key] = [value, 0.0]
+            log.info("classifications.loaded", entries=len(entries))
+        except Exception as e:
+            log.error("classifications.load_failed", error=str(e))
+
+    def _helper_stats(self, helper):
+        return self._stats.setdefault(helper, {"hits": 0, "misses": 0})
+
+    def get(self, helper, version, text):
+        """Cached value, or MISS"""
+        key = classification_key(helper, version, text)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            stats = self._helper_stats(helper)
+            if entry is None:
+                stats["misses"] += 1
+                return MISS
+            stats["hits"] += 1
+            self._entries.move_to_end(key)
+            value, touched_at = entry
+            touch = now - touched_at >= TOUCH_INTERVAL_SECONDS
+            if touch:
+                entry[1] = now
+        if touch and self.collection is not None:
+            self._writer.submit(self._touch, key)
+        return value
+
+    def put(self, helper, version, text, value):
+        key = classification_key(helper, version, text)
+        with self._lock:
+            self._entries[key] = [value, time.time()]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if self.collection is not None:
+            self._writer.submit(self._persist, key, helper, version, value)
+
+    def _persist(self, key, helper, version, value):
+        try:
+            self.collection.update_one(
+                {"_id": key},
+                {"$set": {"helper": helper, "version": version, "value": value, "used_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            log.error("classifications.persist_failed", helper=helper, error=str(e))
+
+    def _touch(self, key):
+        try:
+            self.collection.update_one({"_id": key}, {"$set": {"used_at": datetime.utcnow()}})
+        except Exception as e:
+            log.error("classifications.touch_failed", error=str(e))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def close(self):
+        """Finish pending write-throughs; later puts stay in memory only"""
+        self._writer.shutdown(wait=True)
+        self.collection = None
+
+    def stats(self):
+        with self._lock:
+            report = {"entries": len(self._entries)}
+            for helper, counts in self._stats.items():
+                lookups = counts["hits"] + counts["misses"]
+                report[helper] = {**counts, "hit_rate": counts["hits"] / lookups if lookups else 0.0}
+            return report
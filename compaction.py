@@ -0,0 +1,205 @@
+# compaction.py
+"""Age out or merge old per-user memory vectors in the Pinecone index.
+
+Usage:
+    python compaction.py [--max-age-days 90] [--keep-recent 50] [--merge-batch 20]
+                         [--mode merge|delete] [--users id1,id2] [--max-users N]
+                         [--checkpoint compaction_checkpoint.json] [--dry-run]
+
+Runs are incremental: finished users are recorded in the checkpoint file,
+so an interrupted or size-limited run resumes where it stopped.
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+
+from chatbot import EllaChatbot, user_namespace
+
+LIST_PAGE_SIZE = 100  # Ids listed and fetched per Pinecone round trip
+MERGE_PROMPT = """Summarize these past chat exchanges between a user and Aradhya into one short memory (at most 80 words). Keep names, facts, plans, feelings and preferences; drop greetings and filler.
+
+{exchanges}
+
+Memory:"""
+
+
+class RetentionPolicy:
+    def __init__(self, max_age_days=90, keep_recent=50, merge_batch=20, mode="merge"):
+        self.max_age_days = max_age_days
+        self.keep_recent = keep_recent    # Newest vectors per user that are never touched
+        self.merge_batch = merge_batch    # Old vectors folded into one summary vector
+        self.mode = mode                  # "merge" into summaries or just "delete"
+
+    def cutoff(self):
+        return time.time() - self.max_age_days * 86400
+
+
+class Checkpoint:
+    def __init__(self, path, cutoff):
+        self.path = path
+        self.state = {"cutoff": cutoff, "done": []}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+            print(f"🟡 Resuming compaction from {path}: {len(self.state['done'])} users done")
+        self._done = set(self.state["done"])
+
+    @property
+    def cutoff(self):
+        return self.state["cutoff"]
+
+    def is_done(self, user_id):
+        return user_id in self._done
+
+    def mark_done(self, user_id):
+        self._done.add(user_id)
+        self.state["done"].append(user_id)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+
+class Compactor:
+    def __init__(self, chatbot, policy, dry_run=False):
+        self.chatbot = chatbot
+        self.index = chatbot.index
+        self.policy = policy
+        self.dry_run = dry_run
+        # Dry runs count what they would do under would_* keys instead
+        self.stats = {"users": 0, "deleted": 0, "summaries": 0, "would_delete": 0, "would_merge": 0}
+
+    def user_ids(self):
+        """Every user with stored memories, one per namespace"""
+        namespaces = self.index.describe_index_stats().get("namespaces", {})
+        return sorted(namespace for namespace in namespaces if namespace)
+
+    def _user_vectors(self, user_id):
+        """All stored turns for a user, oldest first"""
+        namespace = user_namespace(user_id)
+        vectors = []
+        pagination_token = None
+        while True:
+            page = self.index.list_paginated(
+                namespace=namespace,
+                limit=LIST_PAGE_SIZE,
+                pagination_token=pagination_token
+            )
+            ids = [vector.id for vector in page.vectors]
+            if ids:
+                fetched = self.index.fetch(ids=ids, namespace=namespace).vectors
+                # Values are not needed; keep only what the policy looks at
+                vectors.extend(
+                    {"id": vector_id, "metadata": vector.metadata or {}}
+                    for vector_id, vector in fetched.items()
+                )
+            pagination_token = page.pagination.next if page.pagination else None
+            if not pagination_token:
+                break
+        return sorted(vectors, key=lambda vector: vector["metadata"].get("timestamp", 0))
+
+    def compact_user(self, user_id, cutoff):
+        vectors = self._user_vectors(user_id)
+        candidates = vectors[:max(0, len(vectors) - self.policy.keep_recent)]
+        expired = [
+            match for match in candidates
+            if match["metadata"].get("timestamp", 0) < cutoff and match["metadata"].get("kind") != "summary"
+        ]
+        if not expired:
+            return
+
+        for start in range(0, len(expired), self.policy.merge_batch):
+            batch = expired[start:start + self.policy.merge_batch]
+            if self.policy.mode == "merge":
+                self._merge(user_id, batch)
+            ids = [match["id"] for match in batch]
+            if self.dry_run:
+                self.stats["would_delete"] += len(ids)
+                continue
+            self.index.delete(ids=ids, namespace=user_namespace(user_id))
+            self.stats["deleted"] += len(ids)
+        if self.dry_run:
+            print(f"🟡 [dry run] {user_id}: would compact {len(expired)} vectors")
+        else:
+            print(f"🟢 Compacted {len(expired)} vectors for {user_id}")
+
+    def _merge(self, user_id, batch):
+        if self.dry_run:
+            self.stats["would_merge"] += 1
+            return
+        exchanges = "\n".join(
+            f"User: {match['metadata'].get('message', '')} | Aradhya: {match['metadata'].get('response', '')}"
+            for match in batch
+        )
+        summary = self.chatbot.summarize(MERGE_PROMPT.format(exchanges=exchanges), user_id, max_tokens=150)
+        vector = self.chatbot.embed_text(summary, user_id)
+        if vector is None:
+            raise RuntimeError(f"Embedding failed for summary of {user_id}")
+        metadata = {
+            "user_id": user_id,
+            "kind": "summary",
+            "message": summary,
+            "response": "",
+            "timestamp": batch[-1]["metadata"].get("timestamp", time.time()),
+            "merged_count": len(batch)
+        }
+        self.index.upsert(
+            [(f"{user_id}:summary:{uuid.uuid4()}", vector, metadata)],
+            namespace=user_namespace(user_id)
+        )
+        self.stats["summaries"] += 1
+
+    def run(self, user_ids, checkpoint, max_users=None):
+        for user_id in user_ids:
+            if checkpoint.is_done(user_id):
+                continue
+            if max_users is not None and self.stats["users"] >= max_users:
+                print("🟡 Reached --max-users, stopping; rerun to continue")
+                return False
+            try:
+                self.compact_user(user_id, checkpoint.cutoff)
+            except Exception as e:
+                print(f"❌ Compaction failed for {user_id}: {e}")
+                continue
+            checkpoint.mark_done(user_id)
+            self.stats["users"] += 1
+        return True
+
+
+def vector_count(index):
+    return index.describe_index_stats().get("total_vector_count", 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact old per-user memory vectors")
+    parser.add_argument("--max-age-days", type=int, default=90)
+    parser.add_argument("--keep-recent", type=int, default=50)
+    parser.add_argument("--merge-batch", type=int, default=20)
+    parser.add_argument("--mode", choices=["merge", "delete"], default="merge")
+    parser.add_argument("--users", help="Comma-separated user ids (default: every user namespace)")
+    parser.add_argument("--max-users", type=int)
+    parser.add_argument("--checkpoint", default="compaction_checkpoint.json")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    policy = RetentionPolicy(args.max_age_days, args.keep_recent, args.merge_batch, args.mode)
+    chatbot = EllaChatbot()
+    compactor = Compactor(chatbot, policy, dry_run=args.dry_run)
+    checkpoint = Checkpoint(args.checkpoint, policy.cutoff())
+
+    before = vector_count(chatbot.index)
+    print(f"📊 Index size before: {before} vectors")
+    user_ids = args.users.split(",") if args.users else compactor.user_ids()
+    finished = compactor.run(user_ids, checkpoint, args.max_users)
+    after = vector_count(chatbot.index)
+    print(f"📊 Index size after: {after} vectors ({before - after} fewer; stats may lag a few seconds)")
+    print(f"📊 {compactor.stats}")
+    if finished and not args.dry_run:
+        os.remove(args.checkpoint)
+        print("✅ Compaction complete, checkpoint removed")
+
+
+if __name__ == "__main__":
+    main()
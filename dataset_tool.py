@@ -0,0 +1,398 @@
+# dataset_tool.py
+"""Validate, convert, de-duplicate and size fine-tuning datasets.
+
+Usage:
+    python dataset_tool.py validate aradhya.jsonl [--workers 4] [--max-errors 20]
+    python dataset_tool.py stats aradhya.jsonl [--epochs 3] [--price-per-1k 0.008] [--report stats.json]
+    python dataset_tool.py convert aradhya_prepared.jsonl out.jsonl --to chat [--system "..."]
+    python dataset_tool.py dedup aradhya.jsonl out.jsonl [--expected-items 1000000] [--error-rate 0.001]
+
+Two formats are understood, detected per line:
+    chat        {"messages": [{"role": ..., "content": ...}, ...]}   (aradhya.jsonl)
+    completion  {"prompt": ..., "completion": ...}                   (aradhya_prepared.jsonl)
+
+Every command streams its input line by line, so memory stays flat however
+large the file is. validate and stats split the file into byte ranges and
+scan them in parallel worker processes; each worker returns only counters,
+a fixed-size token histogram and the first few errors. dedup keeps a Bloom
+filter of content hashes instead of the hashes themselves, so a small share
+(--error-rate) of unique examples may be dropped as duplicates.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+from multiprocessing import Pool
+
+from prompt_builder import count_tokens, MESSAGE_OVERHEAD_TOKENS
+
+ROLES = {"system", "user", "assistant"}
+PROMPT_SEPARATOR = " ->"        # Legacy prompt/completion convention used by aradhya_prepared.jsonl
+REPLY_PRIMING_TOKENS = 3        # Tokens the chat format adds to prime the assistant reply
+TRAINING_PRICE_PER_1K = float(os.getenv("FINETUNE_PRICE_PER_1K", "0.008"))   # gpt-3.5-turbo training
+MAX_EXAMPLE_TOKENS = 4096       # Longer examples are truncated by the fine-tuning API
+HISTOGRAM_BOUNDS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+MIN_CHUNK_BYTES = 1 << 20
+
+
+# Formats
+
+def detect_format(record):
+    if not isinstance(record, dict):
+        return None
+    if "messages" in record:
+        return "chat"
+    if "prompt" in record or "completion" in record:
+        return "completion"
+    return None
+
+
+def check_record(record):
+    """Return (format, problems) for one parsed line; an empty problem list means valid"""
+    fmt = detect_format(record)
+    if fmt is None:
+        return None, ["expected a 'messages' list or 'prompt'/'completion' fields"]
+    problems = []
+    if fmt == "chat":
+        messages = record["messages"]
+        if not isinstance(messages, list) or not messages:
+            return fmt, ["'messages' must be a non-empty list"]
+        for position, message in enumerate(messages):
+            if not isinstance(message, dict):
+                problems.append(f"messages[{position}] is not an object")
+                continue
+            if message.get("role") not in ROLES:
+                problems.append(f"messages[{position}] has unknown role {message.get('role')!r}")
+            content = message.get("content")
+            if not isinstance(content, str) or not content.strip():
+                problems.append(f"messages[{position}] has empty content")
+        if not problems and not any(message["role"] == "assistant" for message in messages):
+            problems.append("no assistant message to learn from")
+    else:
+        for name in ("prompt", "completion"):
+            if not isinstance(record.get(name), str):
+                problems.append(f"'{name}' must be a string")
+        if not problems and not record["completion"].strip():
+            problems.append("'completion' is empty")
+    return fmt, problems
+
+
+def example_tokens(record, fmt):
+    if fmt == "chat":
+        return REPLY_PRIMING_TOKENS + sum(
+            MESSAGE_OVERHEAD_TOKENS + count_tokens(message["content"]) for message in record["messages"]
+        )
+    return count_tokens(record["prompt"]) + count_tokens(record["completion"])
+
+
+def content_hash(record, fmt):
+    """Hash of what the model trains on, ignoring key order and surrounding whitespace"""
+    if fmt == "chat":
+        content = [[message["role"], message["content"].strip()] for message in record["messages"]]
+    else:
+        content = [record["prompt"].strip(), record["completion"].strip()]
+    return hashlib.sha1(json.dumps(content, ensure_ascii=False).encode("utf-8")).digest()
+
+
+def to_chat(record, system=None):
+    prompt = record["prompt"]
+    if prompt.endswith(PROMPT_SEPARATOR):
+        prompt = prompt[:-len(PROMPT_SEPARATOR)]
+    messages = [{"role": "system", "content": system}] if system else []
+    messages.append({"role": "user", "content": prompt.strip()})
+    messages.append({"role": "assistant", "content": record["completion"].strip()})
+    return {"messages": messages}
+
+
+def to_completion(record):
+    """Everything before the last assistant message becomes the prompt"""
+    messages = record["messages"]
+    last = max(position for position, message in enumerate(messages) if message["role"] == "assistant")
+    context = messages[:last]
+    if len(context) == 1 and context[0]["role"] == "user":
+        prompt = context[0]["content"].strip()
+    else:
+        prompt = "\n".join(f"{message['role']}: {message['content'].strip()}" for message in context)
+    return {"prompt": prompt + PROMPT_SEPARATOR, "completion": " " + messages[last]["content"].strip()}
+
+
+# Parallel scanning
+
+def chunk_ranges(path, workers):
+    """Split the file into byte ranges; each worker realigns to line starts"""
+    size = os.path.getsize(path)
+    count = max(1, min(workers * 4, size // MIN_CHUNK_BYTES))
+    step = math.ceil(size / count) if size else 1
+    return [(path, start, min(start + step, size)) for start in range(0, size, step)]
+
+
+def new_stats():
+    return {
+        "lines": 0,
+        "blank": 0,
+        "valid": 0,
+        "invalid": 0,
+        "formats": {"chat": 0, "completion": 0},
+        "tokens": 0,
+        "min_tokens": None,
+        "max_tokens": 0,
+        "over_limit": 0,
+        "histogram": [0] * (len(HISTOGRAM_BOUNDS) + 1),
+        "errors": []
+    }
+
+
+def scan_chunk(args):
+    """Scan the lines that start inside [start, end); returns stats with chunk-relative line numbers"""
+    path, start, end, max_errors = args
+    stats = new_stats()
+    with open(path, "rb") as f:
+        if start:
+            # A line belongs to the chunk its first byte is in
+            f.seek(start - 1)
+            if f.read(1) != b"\n":
+                f.readline()
+        while f.tell() < end:
+            raw = f.readline()
+            if not raw:
+                break
+            stats["lines"] += 1
+            line = raw.strip()
+            if not line:
+                stats["blank"] += 1
+                continue
+            try:
+                record = json.loads(line)
+                fmt, problems = check_record(record)
+            except (UnicodeDecodeError, json.JSONDecodeError) as e:
+                fmt, problems = None, [f"invalid JSON: {e}"]
+            if problems:
+                stats["invalid"] += 1
+                if len(stats["errors"]) < max_errors:
+                    stats["errors"].append((stats["lines"], "; ".join(problems)))
+                continue
+            tokens = example_tokens(record, fmt)
+            stats["valid"] += 1
+            stats["formats"][fmt] += 1
+            stats["tokens"] += tokens
+            stats["min_tokens"] = tokens if stats["min_tokens"] is None else min(stats["min_tokens"], tokens)
+            stats["max_tokens"] = max(stats["max_tokens"], tokens)
+            stats["over_limit"] += tokens > MAX_EXAMPLE_TOKENS
+            bucket = next((i for i, bound in enumerate(HISTOGRAM_BOUNDS) if tokens <= bound), len(HISTOGRAM_BOUNDS))
+            stats["histogram"][bucket] += 1
+    return stats
+
+
+def scan_file(path, workers, max_errors):
+    """Scan chunks in parallel and merge them in file order"""
+    jobs = [(chunk_path, start, end, max_errors) for chunk_path, start, end in chunk_ranges(path, workers)]
+    total = new_stats()
+    if len(jobs) == 1 or workers <= 1:
+        results = map(scan_chunk, jobs)
+        pool = None
+    else:
+        pool = Pool(workers)
+        results = pool.imap(scan_chunk, jobs)
+    try:
+        for stats in results:
+            for line, problem in stats["errors"]:
+                if len(total["errors"]) < max_errors:
+                    total["errors"].append((total["lines"] + line, problem))
+            for field in ("lines", "blank", "valid", "invalid", "tokens", "over_limit"):
+                total[field] += stats[field]
+            for fmt, count in stats["formats"].items():
+                total["formats"][fmt] += count
+            if stats["min_tokens"] is not None:
+                total["min_tokens"] = stats["min_tokens"] if total["min_tokens"] is None else min(total["min_tokens"], stats["min_tokens"])
+            total["max_tokens"] = max(total["max_tokens"], stats["max_tokens"])
+            total["histogram"] = [a + b for a, b in zip(total["histogram"], stats["histogram"])]
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return total
+
+
+# De-duplication
+
+class BloomFilter:
+    """Fixed-size set of content hashes with a bounded false-positive rate"""
+
+    def __init__(self, expected_items, error_rate):
+        self.bits = max(8, int(-expected_items * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / expected_items * math.log(2)))
+        self.array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, digest):
+        # Double hashing over the two halves of the digest
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:16], "big") | 1
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    def add(self, digest):
+        """Add digest; returns True if it was (probably) already present"""
+        present = True
+        for position in self._positions(digest):
+            byte, bit = divmod(position, 8)
+            if not self.array[byte] & (1 << bit):
+                present = False
+                self.array[byte] |= 1 << bit
+        return present
+
+
+def iter_records(path):
+    """Yield (line_number, record, format) for the valid lines of a file"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"🟡 Line {line_number}: skipping invalid JSON")
+                continue
+            fmt, problems = check_record(record)
+            if problems:
+                print(f"🟡 Line {line_number}: skipping ({'; '.join(problems)})")
+                continue
+            yield line_number, record, fmt
+
+
+def write_jsonl(path, records):
+    count = 0
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+# Commands
+
+def print_report(path, stats, epochs, price_per_1k):
+    billed = stats["tokens"] * epochs
+    print(f"📊 {path}")
+    print(f"   Lines: {stats['lines']} ({stats['blank']} blank) | valid {stats['valid']} | invalid {stats['invalid']}")
+    print(f"   Formats: chat {stats['formats']['chat']} | completion {stats['formats']['completion']}")
+    if stats["valid"]:
+        print(
+            f"   Tokens: {stats['tokens']} total | per example min {stats['min_tokens']}, "
+            f"mean {stats['tokens'] / stats['valid']:.1f}, max {stats['max_tokens']}"
+        )
+    if stats["over_limit"]:
+        print(f"🟡 {stats['over_limit']} examples exceed {MAX_EXAMPLE_TOKENS} tokens and will be truncated")
+    lower = 0
+    for bound, count in zip(HISTOGRAM_BOUNDS + (None,), stats["histogram"]):
+        if count:
+            label = f"{lower + 1}-{bound}" if bound else f">{lower}"
+            print(f"   {label:>10} tokens: {count}")
+        lower = bound or lower
+    print(f"💰 Estimated training cost: {billed} tokens x ${price_per_1k}/1K = ${billed / 1000 * price_per_1k:.2f} ({epochs} epochs)")
+
+
+def cmd_validate(args):
+    stats = scan_file(args.path, args.workers, args.max_errors)
+    for line, problem in stats["errors"]:
+        print(f"❌ Line {line}: {problem}")
+    if stats["formats"]["chat"] and stats["formats"]["completion"]:
+        print("❌ File mixes chat and completion examples; the fine-tuning API accepts one format per file")
+        return 1
+    if stats["invalid"]:
+        print(f"❌ {stats['invalid']} of {stats['lines'] - stats['blank']} examples are invalid")
+        return 1
+    print(f"✅ {stats['valid']} valid examples")
+    return 0
+
+
+def cmd_stats(args):
+    stats = scan_file(args.path, args.workers, args.max_errors)
+    print_report(args.path, stats, args.epochs, args.price_per_1k)
+    if args.report:
+        billed = stats["tokens"] * args.epochs
+        report = {key: value for key, value in stats.items() if key != "errors"}
+        report.update({
+            "path": args.path,
+            "histogram_bounds": list(HISTOGRAM_BOUNDS),
+            "epochs": args.epochs,
+            "billed_tokens": billed,
+            "estimated_cost": billed / 1000 * args.price_per_1k,
+            "first_errors": [{"line": line, "problem": problem} for line, problem in stats["errors"]]
+        })
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.report}")
+    return 0
+
+
+def cmd_convert(args):
+    def converted():
+        for _, record, fmt in iter_records(args.path):
+            if fmt == args.to:
+                yield record
+            elif args.to == "chat":
+                yield to_chat(record, args.system)
+            else:
+                yield to_completion(record)
+
+    count = write_jsonl(args.output, converted())
+    print(f"✅ Wrote {count} {args.to} examples to {args.output}")
+    return 0
+
+
+def cmd_dedup(args):
+    seen = BloomFilter(args.expected_items, args.error_rate)
+    duplicates = 0
+
+    def unique():
+        nonlocal duplicates
+        for _, record, fmt in iter_records(args.path):
+            if seen.add(content_hash(record, fmt)):
+                duplicates += 1
+                continue
+            yield record
+
+    count = write_jsonl(args.output, unique())
+    print(
+        f"✅ Kept {count} examples, dropped {duplicates} duplicates "
+        f"(filter {len(seen.array) // 1024} KiB, false-positive rate <= {args.error_rate})"
+    )
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fine-tuning dataset toolkit")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name in ("validate", "stats"):
+        command = commands.add_parser(name)
+        command.add_argument("path")
+        command.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        command.add_argument("--max-errors", type=int, default=20, help="Errors to report at most")
+    commands.choices["stats"].add_argument("--epochs", type=int, default=3)
+    commands.choices["stats"].add_argument("--price-per-1k", type=float, default=TRAINING_PRICE_PER_1K)
+    commands.choices["stats"].add_argument("--report", help="Also write the report as JSON")
+
+    convert = commands.add_parser("convert")
+    convert.add_argument("path")
+    convert.add_argument("output")
+    convert.add_argument("--to", choices=("chat", "completion"), required=True)
+    convert.add_argument("--system", help="System message to add when converting to chat")
+
+    dedup = commands.add_parser("dedup")
+    dedup.add_argument("path")
+    dedup.add_argument("output")
+    dedup.add_argument("--expected-items", type=int, default=1_000_000, help="Sizes the Bloom filter")
+    dedup.add_argument("--error-rate", type=float, default=0.001)
+
+    args = parser.parse_args()
+    handlers = {"validate": cmd_validate, "stats": cmd_stats, "convert": cmd_convert, "dedup": cmd_dedup}
+    sys.exit(handlers[args.command](args))
+
+
+if __name__ == "__main__":
+    main()
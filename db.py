@@ -1,9 +1,9 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import IndexModel, ASCENDING
+from pymongo import IndexModel, ASCENDING, DESCENDING
 from datetime import datetime
 import os
 from dotenv import load_dotenv
-import certifi
+from transport import mongo_client_options
 import logging
 import time
 import uuid
@@ -27,7 +27,7 @@ async def startup_db():
     """Initialize database connection and create indexes"""
     try:
         global client, db
-        client = AsyncIOMotorClient(MONGODB_URL, tlsCAFile=certifi.where())
+        client = AsyncIOMotorClient(MONGODB_URL, **mongo_client_options())
         db = client.get_database()
         
         # Test connection
@@ -48,7 +48,9 @@ def get_collections():
     return {
         "users": db.users,
         "chats": db.chats,
-        "messages": db.messages
+        "messages": db.messages,
+        "analytics": db.analytics_hourly,
+        "active_users": db.analytics_active_users
     }
 
 # Create indexes
@@ -73,9 +75,22 @@ async def init_db():
         # Messages collection indexes
         await collections["messages"].create_indexes([
             IndexModel([("chat_id", ASCENDING)]),
-            IndexModel([("timestamp", ASCENDING)])
+            IndexModel([("timestamp", ASCENDING)]),
+            # Per-user journal reads (summaries, warm-up), newest first
+            IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)])
         ])
         logger.info("Created indexes for messages collection")
+
+        # Hourly analytics rollups
+        await collections["analytics"].create_indexes([
+            IndexModel([("hour", ASCENDING)], unique=True)
+        ])
+        await collections["active_users"].create_indexes([
+            IndexModel([("hour", ASCENDING), ("user_id", ASCENDING)], unique=True),
+            # Per-user range queries
+            IndexModel([("user_id", ASCENDING), ("hour", ASCENDING)])
+        ])
+        logger.info("Created indexes for analytics collection")
         
         # Create test user if no users exist
         if await collections["users"].count_documents({}) == 0:
@@ -195,6 +210,18 @@ async def add_message(chat_id: str, user_id: str, content: str, role: str):
         logging.error(f"Error adding message: {str(e)}")
         raise
 
+async def latest_chat_session_id(user_id: str) -> str:
+    """Session id of the user's most recent chat, creating one if they have none"""
+    collections = get_collections()
+    chat = await collections["chats"].find_one(
+        {"user_id": user_id},
+        {"session_id": 1},
+        sort=[("last_activity", -1)]
+    )
+    if chat:
+        return chat["session_id"]
+    return await create_chat_session(user_id)
+
 async def get_chat_history(chat_id, limit=50):
     try:
         collections = get_collections()
@@ -237,10 +264,32 @@ async def update_user_by_device_id(device_id, update_data):
         update_data["last_active"] = datetime.utcnow()
         result = await collections["users"].update_one(
             {"deviceId": device_id},
-            {"$set": update_data}
+            {"$set": update_data, "$inc": {"profile_version": 1}}  # Invalidates cached chatbot profiles
         )
         logger.info(f"Updated user with device ID: {device_id}")
         return result
     except Exception as e:
         logger.error(f"Error updating user: {str(e)}")
-        raise 
\ No newline at end of file
+        raise 
+
+def user_profile_fields(user):
+    """(user_id, name, likes, dislikes) of a users document, as the search index stores them"""
+    preferences = user.get("preferences") or {}
+    user_id = user.get("deviceId") or str(user["_id"])
+    likes = preferences.get("likes") or preferences.get("loves") or []
+    dislikes = preferences.get("dislikes") or []
+    return user_id, user.get("name", ""), likes, dislikes
+
+async def iter_user_profiles():
+    """Yield (user_id, name, likes, dislikes) for every stored user"""
+    try:
+        collections = get_collections()
+        cursor = collections["users"].find(
+            {},
+            {"deviceId": 1, "name": 1, "preferences": 1}
+        )
+        async for user in cursor:
+            yield user_profile_fields(user)
+    except Exception as e:
+        logger.error(f"Error iterating user profiles: {str(e)}")
+        raise
@@ -0,0 +1,94 @@
+import contextvars
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from profiling import active_session
+
+CHAT_LATENCY_BUDGET_SECONDS = float(os.getenv("CHAT_LATENCY_BUDGET_SECONDS", "8"))
+RETRIEVAL_BUDGET_FRACTION = 0.4     # Share of the remaining budget memory retrieval may use
+MIN_COMPLETION_SECONDS = 3.0        # The completion always gets at least this long
+HELPER_DEFAULT_SECONDS = float(os.getenv("HELPER_DEFAULT_SECONDS", "1.5"))  # Expected helper latency until p95 is measured
+STAGE_HEADROOM = 1.2                # A budgeted stage gets this multiple of its measured p95
+RETRY_BASE_SECONDS = 0.5            # Backoff doubles from here...
+RETRY_MAX_SECONDS = 4.0             # ...up to this
+RETRY_BUDGET_FRACTION = 0.25        # A retry may wait at most this share of what is left
+MIN_RETRY_SECONDS = 0.5             # Less than this left after waiting: don't retry
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("DEADLINE_WORKERS", "32")), thread_name_prefix="budget")
+
+
+class Deadline:
+    """Absolute per-request latency budget handed down the chat pipeline"""
+
+    def __init__(self, budget_seconds=CHAT_LATENCY_BUDGET_SECONDS):
+        self.budget = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def slice(self, fraction):
+        """A child deadline covering a fraction of what is left"""
+        return Deadline(self.remaining() * fraction)
+
+    def stage(self, p95_seconds=None, default_seconds=HELPER_DEFAULT_SECONDS):
+        """A child deadline sized to a stage's measured p95, or None if what is left can't cover it"""
+        expected = p95_seconds or default_seconds
+        if self.remaining() < expected:
+            return None
+        return Deadline(min(self.remaining(), expected * STAGE_HEADROOM))
+
+
+def retry_delay(attempt, deadline=None):
+    """Seconds to back off before retrying; None when the budget has no room for another try"""
+    delay = min(RETRY_BASE_SECONDS * 2 ** attempt, RETRY_MAX_SECONDS)
+    if deadline is None:
+        return delay
+    delay = min(delay, deadline.remaining() * RETRY_BUDGET_FRACTION)
+    if deadline.remaining() - delay < MIN_RETRY_SECONDS:
+        return None
+    return delay
+
+
+class DegradationCounters:
+    """Counts how often each degradation path fires"""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, path):
+        with self._lock:
+            self._counts[path] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+def run_with_deadline(deadline, fn, *args, **kwargs):
+    """Run fn in a worker thread, raising TimeoutError if the deadline passes first.
+
+    Work that has not started yet is cancelled. A running worker cannot be
+    interrupted, so fn should bound its own I/O by the same deadline to hand
+    the thread back soon after.
+    """
+    context = contextvars.copy_context()  # Keep the current turn visible in the worker
+    session = active_session.get()
+    if session is not None:  # The request is being profiled; follow it into the worker
+        fn = session.wrap(fn)
+    future = _executor.submit(context.run, fn, *args, **kwargs)
+    try:
+        return future.result(timeout=deadline.remaining())
+    except TimeoutError:
+        future.cancel()
+        raise
+
+
+degradations = DegradationCounters()
@@ -1,21 +1,122 @@
+import json
+import os
 import random
+import re
+
+import numpy as np
+
+from log import get_logger
+
+log = get_logger("emotion")
+
+# Prototype vectors built offline by build_emotion_centroids.py
+EMOTION_CENTROIDS_PATH = os.getenv(
+    "EMOTION_CENTROIDS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "emotion_centroids.json")
+)
+# Below this a centroid match falls back to keywords. ada-002 similarities rarely drop under ~0.7,
+# so the threshold is calibrated on held-out data by build_emotion_centroids.py; this overrides it.
+EMOTION_MIN_SIMILARITY = float(os.environ["EMOTION_MIN_SIMILARITY"]) if os.getenv("EMOTION_MIN_SIMILARITY") else None
+DEFAULT_MIN_SIMILARITY = 0.85   # For centroid files written before calibration
+
+# keyword or phrase -> weight, per emotion; English and romanized Hindi (Hinglish)
+EMOTION_LEXICON = {
+    "happy": {
+        "excited": 2, "amazing": 2, "fantastic": 2, "great": 1, "love": 1, "joy": 2, "happy": 2,
+        "awesome": 2, "yay": 2, "glad": 1, "khush": 2, "khushi": 2, "mast": 1, "badhiya": 1,
+        "maza aa gaya": 2, "mazaa aa gaya": 2, "bahut accha": 1, "accha laga": 2, "pyaar": 1,
+        "mazedaar": 1, "zabardast": 2,
+    },
+    "sad": {
+        "upset": 2, "hurt": 2, "lonely": 2, "cry": 2, "crying": 2, "depressed": 3, "bad": 1,
+        "sad": 2, "miss you": 1, "tired": 1, "dukhi": 2, "udaas": 2, "udas": 2, "rona": 2,
+        "ro rahi": 2, "ro raha": 2, "akela": 2, "akeli": 2, "bura laga": 2, "dil toot": 3,
+        "tension": 1, "pareshan": 1, "thak gaya": 1, "thak gayi": 1,
+    },
+    "angry": {
+        "mad": 2, "frustrated": 2, "hate": 2, "annoyed": 2, "furious": 3, "angry": 2,
+        "pissed": 2, "irritated": 2, "gussa": 2, "naraz": 2, "naraaz": 2, "chidh": 2,
+        "bakwas": 1, "nafrat": 2, "dimag kharab": 2, "bhaad mein": 2,
+    },
+}
+
+
+def load_centroids(path=EMOTION_CENTROIDS_PATH):
+    """Return (labels, unit-normalised centroid matrix, min similarity), or Nones if no centroids file exists"""
+    if not path or not os.path.exists(path):
+        return None, None, None
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    centroids = data["centroids"]
+    labels = sorted(centroids)
+    matrix = np.array([centroids[label] for label in labels], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    min_similarity = EMOTION_MIN_SIMILARITY or data.get("min_similarity") or DEFAULT_MIN_SIMILARITY
+    return labels, matrix, min_similarity
+
 
 class EmotionHandler:
-    def __init__(self):
-        self.emotion_keywords = {
-            "happy": ["excited", "amazing", "fantastic", "great", "love", "joy"],
-            "sad": ["upset", "hurt", "lonely", "cry", "depressed", "bad"],
-            "angry": ["mad", "frustrated", "hate", "annoyed", "furious"],
-            "neutral": []
-        }
-
-    def detect_emotion(self, text):
-        """Detect emotion from user message."""
-        text_lower = text.lower()
-        for emotion, keywords in self.emotion_keywords.items():
-            if any(keyword in text_lower for keyword in keywords):
+    def __init__(self, lexicon=None, centroids_path=EMOTION_CENTROIDS_PATH):
+        self.lexicon = lexicon or EMOTION_LEXICON
+        self.labels, self.centroids, self.min_similarity = load_centroids(centroids_path)
+        if self.labels:
+            log.info("emotion.centroids_loaded", labels=self.labels, min_similarity=round(self.min_similarity, 3))
+        self._weights = {}
+        for emotion, keywords in self.lexicon.items():
+            for keyword, weight in keywords.items():
+                self._weights[keyword] = (emotion, weight)
+        # One alternation, longest phrases first, matched on word boundaries in a single pass
+        keywords = sorted(self._weights, key=len, reverse=True)
+        self._pattern = re.compile(
+            r"\b(?:" + "|".join(re.escape(keyword).replace(r"\ ", r"\s+") for keyword in keywords) + r")\b",
+            re.IGNORECASE
+        )
+
+    def emotion_scores(self, text):
+        """Summed keyword weights per emotion"""
+        scores = {}
+        for match in self._pattern.finditer(text or ""):
+            keyword = " ".join(match.group(0).lower().split())
+            emotion, weight = self._weights[keyword]
+            scores[emotion] = scores.get(emotion, 0) + weight
+        return scores
+
+    def classify_embedding(self, embedding):
+        """Nearest emotion centroid by cosine similarity, or None if none is close enough"""
+        return self.classify_embeddings([embedding])[0]
+
+    def classify_embeddings(self, embeddings, min_similarity=None):
+        """Vectorised classify_embedding for a batch; one matrix product for all rows"""
+        if self.centroids is None or not len(embeddings):
+            return [None] * len(embeddings)
+        threshold = self.min_similarity if min_similarity is None else min_similarity
+        return [
+            label if similarity >= threshold else None
+            for label, similarity in self.nearest_centroids(embeddings)
+        ]
+
+    def nearest_centroids(self, embeddings):
+        """(label, cosine similarity) of the closest centroid for each embedding"""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors = vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)  # Never scale the caller's array
+        similarities = vectors @ self.centroids.T
+        best = similarities.argmax(axis=1)
+        return [(self.labels[column], float(similarities[row, column])) for row, column in enumerate(best)]
+
+    def detect_emotion(self, text, embedding=None):
+        """Detect emotion from user message, preferring its embedding when one is available."""
+        if embedding is not None:
+            emotion = self.classify_embedding(embedding)
+            if emotion:
                 return emotion
-        return "neutral"
+        scores = self.emotion_scores(text)
+        if not scores:
+            return "neutral"
+        return max(scores, key=scores.get)
+
+    def detect_emotions(self, texts, embeddings=None):
+        """Detect emotions for a batch of messages."""
+        classified = self.classify_embeddings(embeddings) if embeddings is not None else [None] * len(texts)
+        return [emotion or self.detect_emotion(text) for text, emotion in zip(texts, classified)]
 
     def apply_emotion(self, bot_response, detected_emotion):
         """Modify bot response tone based on detected emotion."""
@@ -27,4 +128,3 @@ class EmotionHandler:
             return f"{bot_response} 😤 Okay, deep breaths! What's really bothering you?"
         return bot_response  # Neutral case
 
-
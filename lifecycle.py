@@ -0,0 +1,48 @@
+import asyncio
+
+import analytics
+import db
+from log import get_logger
+
+log = get_logger("lifecycle")
+
+_flush_task = None
+
+
+async def rebuild_search_index(chatbot):
+    """Rebuild the user search index from the users collection"""
+    chatbot.search_index.clear()
+    async for user_id, name, likes, dislikes in db.iter_user_profiles():
+        chatbot.search_index.update(user_id, name, likes, dislikes)
+    log.info("search_index.rebuilt", users=len(chatbot.search_index))
+
+
+async def start_background(chatbot):
+    """Startup work shared by api:app and main:app; call after db.startup_db()"""
+    global _flush_task
+    await rebuild_search_index(chatbot)
+    # Periodically push analytics counters into the hourly rollups
+    collections = db.get_collections()
+    _flush_task = asyncio.create_task(
+        analytics.run_flush_loop(collections["analytics"], collections["active_users"], analytics.recorder)
+    )
+
+
+async def stop_background(chatbot):
+    """Flush everything still buffered in memory before the process exits"""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            log.error("analytics.final_flush_failed", error=str(e))
+        _flush_task = None
+    if chatbot is None:
+        return
+    loop = asyncio.get_running_loop()
+    # Both write through sync pymongo; keep them off the event loop
+    await loop.run_in_executor(None, chatbot.classifications.close)
+    await loop.run_in_executor(None, chatbot.profiles.close)
@@ -0,0 +1,176 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_TEXT_CHARS = int(os.getenv("LOG_TEXT_CHARS", "24"))   # User text kept in log lines
+LOG_QUEUE_SIZE = 10000
+
+# Fraction of events kept, for chatty per-turn events; everything else is kept
+EVENT_SAMPLE_RATES = {
+    "memory.retrieved": 0.1,
+    "prompt.sections": 0.1,
+    "helper.result": 0.1,
+    "embedding.created": 0.1,
+}
+# Max events per second, for repetitive events such as cache hits
+EVENT_RATE_LIMITS = {
+    "embedding.cache_hit": 5,
+    "response.cache_hit": 5,
+    "memory.duplicate": 5,
+}
+
+request_id = contextvars.ContextVar("request_id", default="-")
+
+_emails = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+")
+_digits = re.compile(r"\d{6,}")
+
+
+def new_request_id(value=None):
+    """Set (or generate) the request id that tags every log line of this request"""
+    value = value or uuid.uuid4().hex[:16]
+    request_id.set(value)
+    return value
+
+
+def redact(text, limit=LOG_TEXT_CHARS):
+    """PII-safe preview of user text: masked emails/long numbers, truncated, with its length"""
+    if text is None:
+        return None
+    text = _digits.sub("<num>", _emails.sub("<email>", str(text)))
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}…({len(text)} chars)"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Drops sampled and over-rate events before they are queued; warnings and errors always pass"""
+
+    def __init__(self, sample_rates=None, rate_limits=None):
+        super().__init__()
+        self.sample_rates = sample_rates if sample_rates is not None else EVENT_SAMPLE_RATES
+        self.rate_limits = rate_limits if rate_limits is not None else EVENT_RATE_LIMITS
+        self._windows = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        event = record.msg
+        rate = self.sample_rates.get(event)
+        if rate is not None and random.random() >= rate:
+            self.dropped += 1
+            return False
+        limit = self.rate_limits.get(event)
+        if limit is not None:
+            second = int(time.time())
+            with self._lock:
+                window, count = self._windows.get(event, (second, 0))
+                if window != second:
+                    window, count = second, 0
+                if count >= limit:
+                    self.dropped += 1
+                    return False
+                self._windows[event] = (window, count + 1)
+        return True
+
+
+class _ContextFilter(logging.Filter):
+    """Captures the request id on the calling thread, before the record crosses the queue"""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the request path: when the queue is full the record is dropped"""
+
+    def prepare(self, record):
+        return record  # Message is formatted by the listener, off the request path
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            sampling.dropped += 1
+
+
+class EventLogger:
+    """Structured logger: log.info("event.name", key=value, ...)"""
+
+    def __init__(self, logger):
+        self._logger = logger
+
+    def _log(self, level, event, exc_info, fields):
+        if self._logger.isEnabledFor(level):
+            if exc_info:
+                fields["exc"] = traceback.format_exc()
+            self._logger.log(level, event, extra={"fields": fields})
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, None, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, None, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, None, fields)
+
+    def error(self, event, exc_info=None, **fields):
+        self._log(logging.ERROR, event, exc_info, fields)
+
+
+_root = logging.getLogger("hoocup")
+_listener = None
+sampling = SamplingFilter()
+
+
+def setup_logging():
+    """Route hoocup.* loggers through a queue to a background JSON writer on stdout"""
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = _DroppingQueueHandler(log_queue)
+    handler.addFilter(sampling)
+    handler.addFilter(_ContextFilter())
+    _root.addHandler(handler)
+    _root.setLevel(LOG_LEVEL)
+    _root.propagate = False
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def get_logger(name):
+    setup_logging()
+    return EventLogger(_root.getChild(name))
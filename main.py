@@ -1,6 +1,6 @@
 # # main.py
 
-# from fastapi import FastAPI, HTTPException
+# from fastapi import FastAPI, HTTPException, Header
 # from pydantic import BaseModel
 # from chatbot import EllaChatbot
 
@@ -19,7 +19,7 @@
 #     except Exception as e:
 #         raise HTTPException(status_code=500, detail=str(e))
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, BackgroundTasks
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
 from datetime import datetime
@@ -29,6 +29,13 @@ from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import traceback
 import logging
+import asyncio
+import time
+import analytics
+import lifecycle
+from scheduler import UserScheduler, MailboxFull
+from singleflight import SingleFlight
+from warmup import SessionWarmer
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -36,6 +43,9 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Chatbot API")
 chatbot = None  # Will be initialized in startup event
+warmer = None  # Prefetches profiles and connections, created with the chatbot
+scheduler = UserScheduler()  # Orders each user's turns, parallel across users
+chat_flight = SingleFlight()  # Collapses duplicate in-flight turns
 
 # Add CORS middleware
 app.add_middleware(
@@ -53,13 +63,22 @@ async def startup_event():
         # Initialize database
         await db.startup_db()
         # Initialize chatbot
-        global chatbot
+        global chatbot, warmer
         chatbot = EllaChatbot()
+        warmer = SessionWarmer(chatbot)
+        await lifecycle.start_background(chatbot)
         logger.info("Application startup completed successfully")
     except Exception as e:
         logger.error(f"Startup failed: {str(e)}")
         raise
 
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Write back profiles, classifications and analytics still buffered in memory
+    await lifecycle.stop_background(chatbot)
+    logger.info("Application shutdown completed")
+
 # Pydantic models for request/response
 class UserCreate(BaseModel):
     name: str
@@ -117,10 +136,11 @@ async def root():
 
 # Endpoint for Flutter app
 @app.post("/chat")
-async def flutter_chat(request: ChatRequest):
+async def flutter_chat(request: ChatRequest, idempotency_key: Optional[str] = Header(None)):
     """Handle chat requests from Flutter app"""
     try:
         logging.info(f"Processing chat request for user {request.user_id}")
+        start_time = time.time()
         
         # Create or get chat session
         try:
@@ -135,19 +155,33 @@ async def flutter_chat(request: ChatRequest):
         
         # Add user message to chat
         await db.add_message(session_id, request.user_id, request.message, "user")
+        analytics.recorder.record_message(request.user_id, "user")
         
         # Get chatbot response
+        if warmer:
+            warmer.note_turn(request.user_id)
         if not chatbot:
             raise Exception("Chatbot not initialized")
             
-        response = chatbot.get_response(request.message, request.user_id)
+        # Only retries carrying the same Idempotency-Key replay a finished turn
+        turn = await chat_flight.do(
+            (request.user_id, "id", idempotency_key) if idempotency_key else (request.user_id, "text", request.message),
+            lambda: scheduler.submit(
+                request.user_id, chatbot.run_turn, request.user_id, request.message
+            ),
+            replay=idempotency_key is not None
+        )
         
         # Add bot response to chat
-        await db.add_message(session_id, request.user_id, response, "assistant")
+        await db.add_message(session_id, request.user_id, turn.response, "assistant")
+        analytics.recorder.record_message(request.user_id, "assistant")
+        chatbot.record_request(time.time() - start_time)
         
         logging.info(f"Chat response sent for user {request.user_id}")
-        return {"response": response}
+        return turn.to_dict()
         
+    except MailboxFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         logging.error(f"Error in /chat endpoint: {str(e)}")
         logging.error(traceback.format_exc())
@@ -184,20 +218,21 @@ async def test_chat(message: Message):
         chat_id = str(chat_result.inserted_id)
         
         # Get chatbot response
-        bot_response = chatbot.get_response(chat_id, message.content)
+        turn = await scheduler.submit(chat_id, chatbot.run_turn, chat_id, message.content)
         
         # Store messages
         await db.add_message(chat_id, message.dict())
         await db.add_message(chat_id, {
-            "content": bot_response,
+            "content": turn.response,
             "is_user": False,
-            "emotion": chatbot.emotion_handler.detect_emotion(bot_response)
+            "emotion": turn.emotion
         })
         
         return {
             "chat_id": chat_id,
             "user_message": message.content,
-            "bot_response": bot_response
+            "bot_response": turn.response,
+            **turn.to_dict()
         }
     except Exception as e:
         logger.error(f"Error in test chat: {str(e)}")
@@ -226,9 +261,11 @@ async def get_user(user_id: str):
 
 # Chat endpoints
 @app.post("/chat/{user_id}")
-async def create_chat(user_id: str):
+async def create_chat(user_id: str, background_tasks: BackgroundTasks):
     try:
         result = await db.create_chat_session(user_id)
+        if warmer:
+            background_tasks.add_task(warmer.warm, user_id)
         return {"chat_id": str(result.inserted_id)}
     except Exception as e:
         logger.error(f"Error creating chat: {str(e)}")
@@ -241,20 +278,20 @@ async def send_message(chat_id: str, message: Message):
             raise HTTPException(status_code=500, detail="Chatbot not initialized")
             
         # Get chatbot response
-        bot_response = chatbot.get_response(chat_id, message.content)
+        turn = await scheduler.submit(chat_id, chatbot.run_turn, chat_id, message.content)
         
         # Store user message
         await db.add_message(chat_id, message.dict())
         
-        # Store bot response
+        # Store bot response, tagged with the emotion detected for this turn
         bot_message = Message(
-            content=bot_response,
+            content=turn.response,
             is_user=False,
-            emotion=chatbot.emotion_handler.detect_emotion(bot_response)
+            emotion=turn.emotion
         )
         await db.add_message(chat_id, bot_message.dict())
         
-        return {"response": bot_response}
+        return turn.to_dict()
     except Exception as e:
         logger.error(f"Error sending message: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict, deque
+
+import numpy as np
+
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.95"))
+RECENT_VECTORS_PER_USER = 20
+MAX_TRACKED_USERS = 2000
+
+_punctuation = re.compile(r"[^\w\s]", re.UNICODE)
+_repeats = re.compile(r"(\w)\1{2,}", re.UNICODE)
+_whitespace = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Lowercase, strip punctuation and squeeze stretched letters ("heyyy" -> "heyy")"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = _punctuation.sub(" ", text)
+    text = _repeats.sub(r"\1\1", text)
+    return _whitespace.sub(" ", text).strip()
+
+
+def text_hash(text):
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class _RecentMemory:
+    __slots__ = ("vector_id", "hash", "vector")
+
+    def __init__(self, vector_id, digest, vector):
+        self.vector_id = vector_id
+        self.hash = digest
+        self.vector = vector
+
+
+class MemoryDeduplicator:
+    """Spots repeat memory writes before they reach the vector index.
+
+    Keeps each active user's last few stored vectors (unit-normalised) in
+    memory. A write whose normalized text hash matches, or whose cosine
+    similarity to a recent vector reaches the threshold, is reported as a
+    duplicate of that vector so the caller can bump it instead of upserting.
+    Only exact repeats say nothing new; a near duplicate can still flip a
+    fact ("I love pizza" / "I hate pizza"), so callers should still analyse it.
+    """
+
+    def __init__(self, threshold=NEAR_DUPLICATE_THRESHOLD, per_user=RECENT_VECTORS_PER_USER,
+                 max_users=MAX_TRACKED_USERS):
+        self.threshold = threshold
+        self.per_user = per_user
+        self.max_users = max_users
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self.writes = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def find_duplicate(self, user_id, text, vector):
+        """Return (vector_id, exact) of the memory this write duplicates, or None"""
+        digest = text_hash(text)
+        unit = self._unit(vector)
+        with self._lock:
+            self.writes += 1
+            recent = self._recent.get(user_id)
+            if not recent:
+                return None
+            self._recent.move_to_end(user_id)
+
+            for entry in recent:
+                if entry.hash == digest:
+                    self.exact_duplicates += 1
+                    return entry.vector_id, True
+
+            similarities = np.stack([entry.vector for entry in recent]) @ unit
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                self.near_duplicates += 1
+                return recent[best].vector_id, False
+        return None
+
+    def remember(self, user_id, vector_id, text, vector):
+        """Track a newly stored vector as one of the user's recent memories"""
+        entry = _RecentMemory(vector_id, text_hash(text), self._unit(vector))
+        with self._lock:
+            recent = self._recent.get(user_id)
+            if recent is None:
+                recent = self._recent[user_id] = deque(maxlen=self.per_user)
+            self._recent.move_to_end(user_id)
+            recent.append(entry)
+            while len(self._recent) > self.max_users:
+                self._recent.popitem(last=False)
+
+    def discard(self, user_id, vector_id):
+        """Stop matching against a vector that no longer exists in the index"""
+        with self._lock:
+            recent = self._recent.get(user_id)
+            if recent:
+                for entry in list(recent):
+                    if entry.vector_id == vector_id:
+                        recent.remove(entry)
+
+    def forget(self, user_id):
+        with self._lock:
+            self._recent.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+
+    def stats(self):
+        with self._lock:
+            duplicates = self.exact_duplicates + self.near_duplicates
+            return {
+                "writes": self.writes,
+                "exact_duplicates": self.exact_duplicates,
+                "near_duplicates": self.near_duplicates,
+                "dedup_ratio": duplicates / self.writes if self.writes else 0.0,
+                "tracked_users": len(self._recent)
+            }
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,142 @@
+# migrate_namespaces.py
+"""Copy memory vectors from the shared default namespace into per-user namespaces.
+
+Usage:
+    python migrate_namespaces.py [--batch-size 100] [--checkpoint migration_checkpoint.json]
+                                 [--delete-source] [--verify-only]
+
+Vectors are listed page by page from the default namespace, fetched with
+their values and metadata, and upserted under the namespace of their
+metadata user_id with the same id. The list pagination token is saved after
+every batch, so the job can be stopped and rerun. With --delete-source each
+batch is removed from the default namespace once its copies are verified.
+"""
+import argparse
+import json
+import os
+import time
+
+import transport
+from chatbot import pc, user_namespace
+
+INDEX_NAME = "aradhya-chatbot"
+SOURCE_NAMESPACE = ""
+
+
+class MigrationCheckpoint:
+    def __init__(self, path):
+        self.path = path
+        self.state = {"pagination_token": None, "copied": 0, "skipped": 0, "deleted": 0, "finished": False}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+            print(f"🟡 Resuming migration from {path}: {self.state['copied']} vectors copied so far")
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+
+def group_by_user(vectors):
+    """Split fetched vectors into {namespace: [(id, values, metadata)]}; vectors without a user_id are skipped"""
+    groups = {}
+    skipped = 0
+    for vector_id, vector in vectors.items():
+        metadata = vector.metadata or {}
+        user_id = metadata.get("user_id")
+        if not user_id:
+            skipped += 1
+            continue
+        groups.setdefault(user_namespace(user_id), []).append((vector_id, vector.values, metadata))
+    return groups, skipped
+
+
+def verify(index, groups):
+    """True when every copied id can be fetched back from its user namespace"""
+    for namespace, vectors in groups.items():
+        ids = [vector_id for vector_id, _, _ in vectors]
+        found = index.fetch(ids=ids, namespace=namespace).vectors
+        missing = [vector_id for vector_id in ids if vector_id not in found]
+        if missing:
+            print(f"❌ {len(missing)} vectors missing from namespace {namespace}: {missing[:3]}")
+            return False
+    return True
+
+
+def migrate(index, checkpoint, batch_size, delete_source):
+    state = checkpoint.state
+    total = index.describe_index_stats().get("namespaces", {}).get(SOURCE_NAMESPACE, {}).get("vector_count", 0)
+    print(f"📊 {total} vectors left in the default namespace")
+    started = time.time()
+
+    while not state["finished"]:
+        page = index.list_paginated(
+            namespace=SOURCE_NAMESPACE,
+            limit=batch_size,
+            pagination_token=state["pagination_token"]
+        )
+        ids = [vector.id for vector in page.vectors]
+        if ids:
+            fetched = index.fetch(ids=ids, namespace=SOURCE_NAMESPACE).vectors
+            groups, skipped = group_by_user(fetched)
+            for namespace, vectors in groups.items():
+                index.upsert(vectors=vectors, namespace=namespace)
+            copied = sum(len(vectors) for vectors in groups.values())
+
+            # Upserts are eventually consistent; retry verification briefly
+            for attempt in range(5):
+                if verify(index, groups):
+                    break
+                time.sleep(2 ** attempt)
+            else:
+                raise RuntimeError("Verification failed; rerun to retry from the last checkpoint")
+
+            if delete_source:
+                migrated = [vector_id for vectors in groups.values() for vector_id, _, _ in vectors]
+                if migrated:
+                    index.delete(ids=migrated, namespace=SOURCE_NAMESPACE)
+                state["deleted"] += len(migrated)
+            state["copied"] += copied
+            state["skipped"] += skipped
+
+        state["pagination_token"] = page.pagination.next if page.pagination else None
+        state["finished"] = state["pagination_token"] is None
+        checkpoint.save()
+
+        elapsed = time.time() - started
+        print(f"🟢 Copied {state['copied']}/{total} vectors ({state['skipped']} without user_id) in {elapsed:.0f}s")
+
+
+def verify_counts(index):
+    """Compare namespace sizes against the vectors still in the default namespace"""
+    namespaces = index.describe_index_stats().get("namespaces", {})
+    source = namespaces.get(SOURCE_NAMESPACE, {}).get("vector_count", 0)
+    migrated = sum(stats.get("vector_count", 0) for name, stats in namespaces.items() if name != SOURCE_NAMESPACE)
+    print(f"📊 Default namespace: {source} vectors; {len(namespaces) - (1 if source else 0)} user namespaces: {migrated} vectors")
+    return source, migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move memory vectors into per-user namespaces")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--checkpoint", default="migration_checkpoint.json")
+    parser.add_argument("--delete-source", action="store_true", help="Delete verified vectors from the default namespace")
+    parser.add_argument("--verify-only", action="store_true")
+    args = parser.parse_args()
+
+    index = transport.open_index(pc, INDEX_NAME)
+    if args.verify_only:
+        verify_counts(index)
+        return
+
+    checkpoint = MigrationCheckpoint(args.checkpoint)
+    migrate(index, checkpoint, args.batch_size, args.delete_source)
+    verify_counts(index)
+    os.remove(args.checkpoint)
+    print("✅ Migration complete, checkpoint removed")
+
+
+if __name__ == "__main__":
+    main()
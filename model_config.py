@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from collections import deque
+
+STAGES = ("completion", "analysis", "embedding")
+INDEX_EMBEDDING_MODEL = "text-embedding-ada-002"   # Model the stored vectors were built with
+
+LATENCY_WINDOW = 200            # Latest calls per model in the rolling window
+LATENCY_WINDOW_SECONDS = 300    # ...no older than this
+MIN_SAMPLES = 20                # Below this the p95 is not trusted
+PROBE_EVERY = 20                # While failed over, every Nth call still tries the primary
+
+
+class StageConfig:
+    __slots__ = ("model", "fallback_model", "temperature", "max_tokens", "p95_slo_ms")
+
+    def __init__(self, model, fallback_model=None, temperature=None, max_tokens=None, p95_slo_ms=None):
+        self.model = model
+        self.fallback_model = fallback_model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.p95_slo_ms = p95_slo_ms
+
+    def copy(self):
+        return StageConfig(self.model, self.fallback_model, self.temperature, self.max_tokens, self.p95_slo_ms)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+def default_stages():
+    return {
+        "completion": StageConfig(
+            os.getenv("COMPLETION_MODEL", "ft:gpt-3.5-turbo-0125:ella-test:aradhya:BHeExk2j"),
+            fallback_model=os.getenv("COMPLETION_FALLBACK_MODEL", "gpt-3.5-turbo"),
+            temperature=1.0,
+            max_tokens=100,
+            p95_slo_ms=float(os.getenv("COMPLETION_P95_SLO_MS", "4000"))
+        ),
+        "analysis": StageConfig(
+            os.getenv("ANALYSIS_MODEL", "gpt-3.5-turbo"),
+            temperature=0.3,
+            max_tokens=200,
+            p95_slo_ms=float(os.getenv("ANALYSIS_P95_SLO_MS", "2500"))
+        ),
+        "embedding": StageConfig(INDEX_EMBEDDING_MODEL),
+    }
+
+
+class ModelConfig:
+    """Per-stage model settings, read on every call so updates apply to the next request"""
+
+    def __init__(self):
+        self._stages = default_stages()
+        self._lock = threading.Lock()
+
+    def get(self, stage):
+        with self._lock:
+            return self._stages[stage].copy()
+
+    def update(self, updates):
+        """Validate and apply {stage: {field: value}}; on ValueError nothing is applied"""
+        with self._lock:
+            staged = {}
+            for stage, fields in updates.items():
+                if stage not in STAGES:
+                    raise ValueError(f"Unknown stage '{stage}', expected one of {', '.join(STAGES)}")
+                fields = {field: value for field, value in fields.items() if value is not None}
+                unknown = set(fields) - set(StageConfig.__slots__)
+                if unknown:
+                    raise ValueError(f"Unknown fields for {stage}: {', '.join(sorted(unknown))}")
+                config = self._stages[stage].copy()
+                for field, value in fields.items():
+                    setattr(config, field, value)
+                self._validate(stage, config)
+                staged[stage] = config
+            self._stages.update(staged)
+
+    def _validate(self, stage, config):
+        for field in ("model", "fallback_model"):
+            value = getattr(config, field)
+            if value is not None and (not isinstance(value, str) or not value.strip()):
+                raise ValueError(f"{stage}.{field} must be a non-empty model name")
+        if stage == "embedding":
+            # Vectors from another model are not comparable with the stored ones
+            if config.model != INDEX_EMBEDDING_MODEL or config.fallback_model:
+                raise ValueError(
+                    f"embedding.model is fixed to {INDEX_EMBEDDING_MODEL} until the index is re-embedded"
+                )
+            return
+        if config.temperature is None or not 0 <= config.temperature <= 2:
+            raise ValueError(f"{stage}.temperature must be between 0 and 2")
+        if config.max_tokens is None or not 1 <= config.max_tokens <= 4096:
+            raise ValueError(f"{stage}.max_tokens must be between 1 and 4096")
+        if config.p95_slo_ms is not None and config.p95_slo_ms <= 0:
+            raise ValueError(f"{stage}.p95_slo_ms must be positive")
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: config.to_dict() for stage, config in self._stages.items()}
+
+
+class LatencyRouter:
+    """Fails a stage over to its fallback model while the primary's rolling p95 breaches the SLO"""
+
+    def __init__(self):
+        self._latencies = {}      # model -> deque of (timestamp, latency_ms)
+        self._decisions = {}      # stage -> {"primary": n, "fallback": n, "probe": n}
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def record(self, model, latency_seconds):
+        with self._lock:
+            window = self._latencies.setdefault(model, deque(maxlen=LATENCY_WINDOW))
+            window.append((time.time(), latency_seconds * 1000))
+
+    def p95(self, model):
+        with self._lock:
+            return self._p95(model)
+
+    def _p95(self, model):
+        cutoff = time.time() - LATENCY_WINDOW_SECONDS
+        latencies = sorted(latency for at, latency in self._latencies.get(model, ()) if at >= cutoff)
+        if len(latencies) < MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+
+    def route(self, stage, config):
+        """Model to call for this stage right now"""
+        with self._lock:
+            decisions = self._decisions.setdefault(stage, {"primary": 0, "fallback": 0, "probe": 0})
+            p95 = self._p95(config.model)
+            breached = config.fallback_model and config.p95_slo_ms and p95 is not None and p95 > config.p95_slo_ms
+            if not breached:
+                decisions["primary"] += 1
+                return config.model
+            self._calls[stage] = self._calls.get(stage, 0) + 1
+            if self._calls[stage] % PROBE_EVERY == 0:  # Keep measuring the primary so it can recover
+                decisions["probe"] += 1
+                return config.model
+            decisions["fallback"] += 1
+            return config.fallback_model
+
+    def stats(self):
+        with self._lock:
+            return {
+                "decisions": {stage: dict(counts) for stage, counts in self._decisions.items()},
+                "p95_ms": {model: self._p95(model) for model in self._latencies}
+            }
+
+
+model_config = ModelConfig()
+router = LatencyRouter()
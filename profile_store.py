@@ -0,0 +1,320 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from user_profile import UserProfile, PLACEHOLDER_NAME, HOT_TURNS
+from transport import mongo_client_options
+from log import get_logger
+
+log = get_logger("profile_store")
+
+load_dotenv()
+
+CACHE_TTL_SECONDS = 30        # How long a cached profile is trusted before its version is re-checked
+FLUSH_INTERVAL_SECONDS = 2    # How often dirty profiles are written behind to Mongo
+MAX_CACHED_PROFILES = int(os.getenv("MAX_CACHED_PROFILES", "10000"))
+IDLE_EVICT_SECONDS = int(os.getenv("PROFILE_IDLE_EVICT_SECONDS", "1800"))
+PROFILE_PROJECTION = {
+    "name": 1, "preferences": 1, "profile_version": 1, "last_active": 1, "summary": 1, "summary_until": 1
+}
+
+
+class ProfileStore:
+    """User profiles backed by the Mongo users collection.
+
+    Reads go through a local LRU cache that is re-validated against the
+    document's profile_version once an entry is older than CACHE_TTL_SECONDS.
+    Writes land in the cache immediately and are written behind by a
+    background thread using optimistic, version-checked updates, so every
+    worker and replica converges on the same profile. Profiles idle for
+    IDLE_EVICT_SECONDS, or beyond MAX_CACHED_PROFILES, are spilled back to
+    Mongo and evicted.
+    """
+
+    def __init__(self, mongodb_url=None):
+        self._cache = OrderedDict()   # user_id -> UserProfile, least recently used first
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._stopped = threading.Event()
+        self.evictions = 0
+        self.db = None
+        self.users = None
+
+        mongodb_url = mongodb_url or os.getenv("MONGODB_URL")
+        if mongodb_url:
+            self._client = MongoClient(mongodb_url, **mongo_client_options())
+            self.db = self._client.get_database()
+            self.users = self.db.users
+            threading.Thread(target=self._flush_loop, daemon=True).start()
+            log.info("profiles.connected")
+        else:
+            log.warning("profiles.memory_only", reason="MONGODB_URL not set")
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __contains__(self, user_id):
+        """Whether the user has a stored profile; never loads or caches one"""
+        with self._lock:
+            profile = self._cache.get(user_id)
+            if profile is not None and (profile.version > 0 or user_id in self._dirty):
+                return True
+        if self.users is None:
+            return False
+        user = self.users.find_one({"deviceId": user_id}, {"profile_version": 1})
+        return (user or {}).get("profile_version", 0) > 0
+
+    def get(self, user_id):
+        """Return a snapshot of the user's profile"""
+        profile = self._entry(user_id)
+        with self._lock:
+            profile.touch()
+            return profile.copy()
+
+    def _mutate(self, user_id, mutate):
+        """Run mutate(profile) under the lock on the profile that is actually cached.
+
+        _entry() may load or revalidate outside the lock, and evict() or
+        invalidate() can drop the entry before the caller gets the lock; a
+        change made to that detached copy would never be written. The lookup
+        is repeated until the profile is still the cached one.
+        """
+        while True:
+            profile = self._entry(user_id)
+            with self._lock:
+                if self._cache.get(user_id) is profile:
+                    return mutate(profile)
+
+    def update(self, user_id, name=None, likes=(), dislikes=()):
+        """Merge newly learned facts into the profile; return True if anything changed"""
+        def merge(profile):
+            changed = profile.set_name(name)
+            for item in likes:
+                changed = profile.add_like(item) or changed
+            for item in dislikes:
+                changed = profile.add_dislike(item) or changed
+            profile.touch()
+            if changed:
+                self._dirty.add(user_id)
+            return changed
+        return self._mutate(user_id, merge)
+
+    def record_turn(self, user_id, message, response):
+        """Remember a finished turn as hot context; return turns since the last summary"""
+        def add(profile):
+            profile.add_turn(message, response)
+            return profile.turns_since_summary
+        return self._mutate(user_id, add)
+
+    def prime_recent_turns(self, user_id):
+        """Load the user's last journaled turns as hot context; returns how many were loaded"""
+        profile = self._entry(user_id)
+        if profile.recent_turns or self.db is None:
+            return 0
+        messages = list(
+            self.db.messages.find({"user_id": user_id}, {"role": 1, "content": 1})
+            .sort("timestamp", -1)
+            .limit(HOT_TURNS * 2)
+        )[::-1]
+        turns = []
+        pending = None
+        for message in messages:
+            if message["role"] == "user":
+                pending = message["content"]
+            elif pending is not None:
+                turns.append((pending, message["content"]))
+                pending = None
+        self._mutate(user_id, lambda cached: cached.prime_turns(turns))
+        return len(turns)
+
+    def set_summary(self, user_id, summary, summary_until):
+        """Store a refreshed rolling summary with the profile"""
+        def store(profile):
+            profile.set_summary(summary, summary_until)
+            self._dirty.add(user_id)
+        self._mutate(user_id, store)
+
+    def delete(self, user_id):
+        """Forget a user's learned profile locally and in Mongo"""
+        with self._lock:
+            self._cache.pop(user_id, None)
+            self._dirty.discard(user_id)
+        if self.users is not None:
+            self.users.update_one(
+                {"deviceId": user_id},
+                {"$unset": {"preferences.likes": "", "preferences.dislikes": ""},
+                 "$set": {"name": PLACEHOLDER_NAME},
+                 "$inc": {"profile_version": 1}}
+            )
+
+    def invalidate(self, user_id):
+        """Write back and drop one cached profile so the next read reloads it"""
+        with self._lock:
+            dirty = user_id in self._dirty and self.users is not None
+            if dirty:
+                self._dirty.discard(user_id)
+        if dirty:
+            self._write(user_id)
+        with self._lock:
+            if user_id not in self._dirty:
+                self._cache.pop(user_id, None)
+
+    def clear_cache(self):
+        """Drop the local cache after writing back pending changes"""
+        self.flush()
+        with self._lock:
+            self._cache = OrderedDict()
+
+    def flush(self):
+        """Write every dirty profile back to Mongo"""
+        if self.users is None:
+            return
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        for user_id in dirty:
+            try:
+                self._write(user_id)
+            except Exception as e:
+                log.error("profiles.write_failed", user_id=user_id, error=str(e))
+                with self._lock:
+                    self._dirty.add(user_id)
+
+    def close(self):
+        """Stop the write-behind thread and write back what is still dirty"""
+        self._stopped.set()
+        self.flush()
+
+    def evict(self):
+        """Spill idle and over-capacity profiles out of the local cache"""
+        now = time.time()
+        with self._lock:
+            candidates = []
+            overflow = len(self._cache) - MAX_CACHED_PROFILES
+            for user_id, profile in self._cache.items():
+                if overflow > 0:
+                    overflow -= 1
+                elif now - profile.last_active < IDLE_EVICT_SECONDS:
+                    continue
+                candidates.append(user_id)
+
+        for user_id in candidates:
+            with self._lock:
+                dirty = user_id in self._dirty
+            if dirty and self.users is None:
+                continue  # Nowhere to spill to; keep the only copy
+            try:
+                self.invalidate(user_id)
+                self.evictions += 1
+            except Exception as e:
+                log.error("profiles.evict_failed", user_id=user_id, error=str(e))
+                with self._lock:
+                    self._dirty.add(user_id)
+
+    def _entry(self, user_id):
+        with self._lock:
+            profile = self._cache.get(user_id)
+            if profile is not None:
+                self._cache.move_to_end(user_id)
+                if (user_id in self._dirty
+                        or self.users is None
+                        or time.time() - profile.checked_at < CACHE_TTL_SECONDS):
+                    return profile
+        if profile is not None:
+            return self._revalidate(user_id, profile)
+        return self._load(user_id)
+
+    def _load(self, user_id):
+        user = None
+        if self.users is not None:
+            user = self.users.find_one({"deviceId": user_id}, PROFILE_PROJECTION)
+        profile = UserProfile.from_document(user_id, user)
+        with self._lock:
+            # A concurrent writer may have populated the entry meanwhile
+            return self._cache.setdefault(user_id, profile)
+
+    def _revalidate(self, user_id, profile):
+        """Reload the profile only if another worker bumped its version"""
+        user = self.users.find_one({"deviceId": user_id}, {"profile_version": 1})
+        version = (user or {}).get("profile_version", 0)
+        with self._lock:
+            if version == profile.version or user_id in self._dirty:
+                profile.checked_at = time.time()
+                return profile
+            self._cache.pop(user_id, None)
+        reloaded = self._load(user_id)
+        with self._lock:
+            if not reloaded.recent_turns:
+                reloaded.recent_turns.extend(profile.recent_turns)
+                reloaded.turns_since_summary = profile.turns_since_summary
+        return reloaded
+
+    def _write(self, user_id):
+        with self._lock:
+            profile = self._cache.get(user_id)
+            if profile is None:
+                return
+            version = profile.version
+            fields = {
+                "preferences.likes": profile.likes,
+                "preferences.dislikes": profile.dislikes,
+                "last_active": datetime.utcfromtimestamp(profile.last_active)
+            }
+            if profile.name:
+                fields["name"] = profile.name
+            if profile.summary:
+                fields["summary"] = profile.summary
+                fields["summary_until"] = profile.summary_until
+            learned, profile.learned = profile.learned, None
+
+        try:
+            result = self.users.update_one(
+                {"deviceId": user_id, "profile_version": version} if version else
+                {"deviceId": user_id, "profile_version": {"$in": [None, 0]}},
+                {"$set": fields, "$inc": {"profile_version": 1}}
+            )
+            if result.matched_count:
+                with self._lock:
+                    profile.version = version + 1
+                    profile.checked_at = time.time()
+                return
+
+            current = self.users.find_one({"deviceId": user_id}, PROFILE_PROJECTION)
+            if current is None:
+                # First time we learn anything about this user
+                self.users.update_one(
+                    {"deviceId": user_id},
+                    {"$set": fields,
+                     "$setOnInsert": {
+                         "email": f"guest-{user_id}@placeholder.com",
+                         "created_at": datetime.utcnow(),
+                         "profile_version": 1
+                     }},
+                    upsert=True
+                )
+                with self._lock:
+                    profile.version = 1
+                    profile.checked_at = time.time()
+                return
+        except Exception:
+            # Nothing landed; the next flush retries with what was learned
+            with self._lock:
+                profile.keep_learned(learned)
+            raise
+
+        # Another worker wrote first: merge its facts into ours and retry on the next flush
+        remote = UserProfile.from_document(user_id, current)
+        with self._lock:
+            profile.keep_learned(learned)
+            profile.merge(remote)
+            profile.version = remote.version
+            self._dirty.add(user_id)
+
+    def _flush_loop(self):
+        while not self._stopped.wait(FLUSH_INTERVAL_SECONDS):
+            self.flush()
+            self.evict()
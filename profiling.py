@@ -0,0 +1,173 @@
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+
+from log import get_logger
+
+log = get_logger("profiling")
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")            # X-Profile header value that forces a profile
+PROFILE_SAMPLE_PERCENT = float(os.getenv("PROFILE_SAMPLE_PERCENT", "0"))
+PROFILE_LATENCY_THRESHOLD_MS = float(os.getenv("PROFILE_LATENCY_THRESHOLD_MS", "0"))  # Keep profiles of slower requests
+PROFILE_LATENCY_SAMPLE_PERCENT = float(os.getenv("PROFILE_LATENCY_SAMPLE_PERCENT", "5"))  # ...out of this share of requests
+SAMPLE_INTERVAL_SECONDS = 0.005
+_unsafe_label = re.compile(r"[^A-Za-z0-9_-]")
+
+# The profile session of the turn running on this thread, if any
+active_session = contextvars.ContextVar("active_session", default=None)
+
+
+class ProfileSession:
+    """CPU (cProfile) and wall-clock (stack sampling) profile of one request.
+
+    Every thread that runs part of the request through wrap() gets its own
+    cProfile profiler, merged into one pstats file at the end, and is
+    sampled every SAMPLE_INTERVAL_SECONDS for the speedscope wall-clock view.
+    """
+
+    def __init__(self, label, reason):
+        self.label = label
+        self.reason = reason
+        self.started = time.time()
+        self._profiles = []
+        self._threads = {}          # thread id -> thread name
+        self._samples = {}          # thread id -> list of stacks (root first)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_loop, daemon=True, name="profile-sampler")
+        self._sampler.start()
+
+    def wrap(self, fn):
+        """Profile fn on whichever thread ends up running it"""
+        def profiled(*args, **kwargs):
+            profile = cProfile.Profile()
+            thread = threading.current_thread()
+            token = active_session.set(self)
+            with self._lock:
+                self._threads[thread.ident] = thread.name
+            profile.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.disable()
+                active_session.reset(token)
+                with self._lock:
+                    self._threads.pop(thread.ident, None)
+                    self._profiles.append(profile)
+        return profiled
+
+    def _sample_loop(self):
+        while not self._stop.wait(SAMPLE_INTERVAL_SECONDS):
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self._threads)
+            for thread_id in threads:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                self._samples.setdefault(thread_id, []).append(stack[::-1])
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+        return time.time() - self.started
+
+    def write(self, directory, duration):
+        """Write <label>.pstats and <label>.speedscope.json; returns the path prefix"""
+        os.makedirs(directory, exist_ok=True)
+        prefix = os.path.join(directory, self.label)
+        with self._lock:
+            profiles = list(self._profiles)
+        if profiles:
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(f"{prefix}.pstats")
+
+        frames = []
+        frame_index = {}
+        speedscope_profiles = []
+        for thread_id, stacks in self._samples.items():
+            samples = []
+            for stack in stacks:
+                indexes = []
+                for frame in stack:
+                    if frame not in frame_index:
+                        frame_index[frame] = len(frames)
+                        frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                    indexes.append(frame_index[frame])
+                samples.append(indexes)
+            interval_ms = SAMPLE_INTERVAL_SECONDS * 1000
+            speedscope_profiles.append({
+                "type": "sampled",
+                "name": f"thread {thread_id}",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": len(samples) * interval_ms,
+                "samples": samples,
+                "weights": [interval_ms] * len(samples)
+            })
+        with open(f"{prefix}.speedscope.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "$schema": "https://www.speedscope.app/file-format-schema.json",
+                "name": f"{self.label} ({self.reason}, {duration * 1000:.0f} ms)",
+                "exporter": "hoocup-profiling",
+                "shared": {"frames": frames},
+                "profiles": speedscope_profiles
+            }, f)
+        return prefix
+
+
+class RequestProfiler:
+    """Decides which requests to profile; enabled is False unless a trigger is configured"""
+
+    def __init__(self, directory=PROFILE_DIR, admin_token=PROFILE_ADMIN_TOKEN,
+                 sample_percent=PROFILE_SAMPLE_PERCENT, latency_threshold_ms=PROFILE_LATENCY_THRESHOLD_MS,
+                 latency_sample_percent=PROFILE_LATENCY_SAMPLE_PERCENT):
+        self.directory = directory
+        self.admin_token = admin_token
+        self.sample_percent = sample_percent
+        self.latency_threshold_ms = latency_threshold_ms
+        self.latency_sample_percent = latency_sample_percent
+        self.enabled = bool(admin_token or sample_percent or latency_threshold_ms)
+        self.written = 0
+
+    def start(self, label, profile_header=None):
+        """A ProfileSession if this request should be profiled, else None"""
+        if self.admin_token and profile_header == self.admin_token:
+            reason = "admin"
+        elif self.sample_percent and random.random() * 100 < self.sample_percent:
+            reason = "sampled"
+        elif self.latency_threshold_ms and random.random() * 100 < self.latency_sample_percent:
+            reason = "latency"      # Kept only if the request turns out slow
+        else:
+            return None
+        # The label comes from the client's X-Request-ID; keep it a plain file name
+        safe_label = _unsafe_label.sub("_", str(label))[:64]
+        return ProfileSession(f"{time.strftime('%Y%m%d-%H%M%S')}_{safe_label}", reason)
+
+    def finish(self, session):
+        duration = session.stop()
+        if session.reason == "latency" and duration * 1000 < self.latency_threshold_ms:
+            return None
+        try:
+            prefix = session.write(self.directory, duration)
+            self.written += 1
+            return prefix
+        except Exception as e:
+            log.error("profile.write_failed", label=session.label, error=str(e))
+            return None
+
+
+profiler = RequestProfiler()
@@ -0,0 +1,81 @@
+import os
+
+from persona import ARADHYA_PERSONA, CAROLINE_PERSONA
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:  # Fall back to a character estimate when tiktoken isn't installed
+    _encoding = None
+
+PERSONAS = {
+    "aradhya": ARADHYA_PERSONA,
+    "caroline": CAROLINE_PERSONA.strip(),
+}
+PROMPT_BUDGET_TOKENS = int(os.getenv("PROMPT_BUDGET_TOKENS", "700"))
+MESSAGE_OVERHEAD_TOKENS = 4   # Role and separator tokens the chat format adds per message
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+class PromptBuilder:
+    """Assembles the completion prompt as a static prefix plus a packed context.
+
+    The persona is sent as its own, never-changing first system message so
+    the provider can cache it. Per-turn context follows in a second system
+    message, packed section by section (in the order given) into whatever
+    is left of the token budget; sections marked truncatable keep as many
+    leading lines as fit instead of being dropped.
+    """
+
+    def __init__(self, persona=None, budget_tokens=PROMPT_BUDGET_TOKENS):
+        self.prefix = persona or PERSONAS[os.getenv("PERSONA", "aradhya")]
+        self.prefix_tokens = count_tokens(self.prefix)
+        self.budget_tokens = budget_tokens
+
+    def build(self, message, sections):
+        """Return (messages, section_tokens) for a list of (name, text, truncatable) sections"""
+        message_tokens = count_tokens(message)
+        remaining = self.budget_tokens - self.prefix_tokens - message_tokens - 3 * MESSAGE_OVERHEAD_TOKENS
+        report = {"prefix": self.prefix_tokens, "message": message_tokens}
+
+        packed = []
+        for name, text, truncatable in sections:
+            if not text:
+                continue
+            tokens = count_tokens(text)
+            if tokens > remaining and truncatable:
+                text, tokens = self._truncate_lines(text, remaining)
+            if not text or tokens > remaining:
+                report[name] = 0
+                continue
+            packed.append(text)
+            report[name] = tokens
+            remaining -= tokens
+
+        messages = [{"role": "system", "content": self.prefix}]
+        if packed:
+            messages.append({"role": "system", "content": "\n".join(packed)})
+        messages.append({"role": "user", "content": message})
+        return messages, report
+
+    def _truncate_lines(self, text, budget):
+        """Keep the leading lines of text that fit into budget tokens"""
+        kept = []
+        used = 0
+        for line in text.split("\n"):
+            tokens = count_tokens(line) + 1
+            if used + tokens > budget:
+                break
+            kept.append(line)
+            used += tokens
+        if len(kept) <= 1:  # Only a header line survived
+            return "", 0
+        text = "\n".join(kept)
+        return text, count_tokens(text)
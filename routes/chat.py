@@ -1,57 +1,199 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict
+from typing import Dict, List, Optional
+import asyncio
+import json
+import os
 import time
-from shared import chatbot
+from shared import chatbot, scheduler, chat_flight, warmer
+from scheduler import MailboxFull
+from analytics import recorder as analytics_recorder
+from log import get_logger, new_request_id, redact
+from profiling import profiler
+import db
+
+log = get_logger("routes.chat")
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "1000"))
+MAX_BATCH_CONCURRENCY = int(os.getenv("MAX_BATCH_CONCURRENCY", "8"))
+
+async def journal_turn(user_id, message, response):
+    """Append the turn to the messages journal the summarizer and analytics backfill read"""
+    try:
+        session_id = await db.latest_chat_session_id(user_id)
+        await db.add_message(session_id, user_id, message, "user")
+        await db.add_message(session_id, user_id, response, "assistant")
+    except Exception as e:
+        log.warning("chat.journal_failed", user_id=user_id, error=str(e))
+
 # Request/Response Models
 class ChatRequest(BaseModel):
     user_id: str
     message: str
+    message_id: Optional[str] = None   # Client id of this message; retries reuse it
 
 class ChatResponse(BaseModel):
     response: str
     emotion: str
     cost: float
+    turn_cost: float = 0.0
+    model: str = ""
+    cached: bool = False
+    usage: Dict[str, int] = {}
+    timings: Dict[str, float] = {}
+
+class BatchItem(BaseModel):
+    user_id: str
+    message: str
+    id: Optional[str] = None
+
+class BatchChatRequest(BaseModel):
+    items: List[BatchItem]
+    concurrency: int = 4
+    remember: bool = False   # Eval runs leave memory, profiles and caches untouched by default
 
 @router.post("", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    print(f"\n📥 Received POST /chat request")
-    print(f"➡️  user_id: {request.user_id}")
-    print(f"➡️  message: {request.message}")
+async def chat(
+    request: ChatRequest,
+    http_response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    x_request_id: Optional[str] = Header(None),
+    x_profile: Optional[str] = Header(None)
+):
+    # Tag every log line of this turn, including those from scheduler threads
+    request_id = new_request_id(x_request_id)
+    http_response.headers["X-Request-ID"] = request_id
+    # Opt-in profiling: nothing beyond this check runs unless a trigger is configured
+    session = profiler.start(request_id, x_profile) if profiler.enabled else None
+    run_turn = session.wrap(chatbot.run_turn) if session else chatbot.run_turn
+    log.info("chat.received", user_id=request.user_id, message=redact(request.message))
 
     start_time = time.time()
+    warmer.note_turn(request.user_id)
 
     try:
-        # Time the response generation
-        response_start = time.time()
-        response = chatbot.get_response(request.user_id, request.message)
-        response_time = time.time() - response_start
-        print(f"🕑 Response generation took: {response_time:.2f} seconds")
-
-        # Time the emotion detection
-        emotion_start = time.time()
-        emotion = chatbot.emotion_handler.detect_emotion(request.message)
-        emotion_time = time.time() - emotion_start
-        print(f"🕑 Emotion detection took: {emotion_time:.2f} seconds")
-
-        # Time the cost calculation
-        cost_start = time.time()
-        cost = chatbot.total_cost
-        cost_time = time.time() - cost_start
-        print(f"🕑 Cost calculation took: {cost_time:.2f} seconds")
+        # Retries of one client message share its result, and it is replayed for a
+        # short while; without an id only concurrent identical messages are collapsed
+        client_message_id = request.message_id or idempotency_key
+        if client_message_id:
+            flight_key = (request.user_id, "id", client_message_id)
+        else:
+            flight_key = (request.user_id, "text", request.message)
+        turn = await chat_flight.do(
+            flight_key,
+            lambda: scheduler.submit(
+                request.user_id, run_turn, request.user_id, request.message
+            ),
+            replay=client_message_id is not None
+        )
 
+        await journal_turn(request.user_id, request.message, turn.response)
+
+        cost = chatbot.total_cost
         total_time = time.time() - start_time
-        print(f"⏱️ Total request processing time: {total_time:.2f} seconds")
+        chatbot.record_request(total_time)
+        analytics_recorder.record_message(request.user_id, "user")
+        analytics_recorder.record_message(request.user_id, "assistant")
 
-        print(f"🧠 Emotion: {emotion}")
-        print(f"💬 Response: {response}")
-        print(f"💰 Total cost so far: ${cost:.6f}")
+        log.info(
+            "chat.completed",
+            user_id=request.user_id,
+            emotion=turn.emotion,
+            cached=turn.cached,
+            total_seconds=round(total_time, 3),
+            stages=turn.timings,
+            turn_cost=round(turn.cost, 6)
+        )
 
-        return ChatResponse(response=response, emotion=emotion, cost=cost)
+        return ChatResponse(cost=cost, **turn.to_dict())
 
+    except MailboxFull as e:
+        log.warning("chat.backpressure", user_id=request.user_id, reason=str(e))
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
-        print(f"❌ Error in /chat: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        log.error("chat.failed", exc_info=True, user_id=request.user_id, error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if session:
+            path = profiler.finish(session)
+            if path:
+                log.warning("chat.profiled", user_id=request.user_id, reason=session.reason, path=path)
+
+
+@router.post("/batch")
+async def chat_batch(request: BatchChatRequest, x_request_id: Optional[str] = Header(None)):
+    """Run many (user_id, message) items and stream one NDJSON line per result.
+
+    Items of the same user run in submission order; up to `concurrency` users
+    run at once, each turn still going through the shared scheduler. Lines
+    arrive in completion order and carry the item's index; the last line is
+    a summary.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="items must not be empty")
+    if len(request.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ITEMS} items per batch")
+    if not 1 <= request.concurrency <= MAX_BATCH_CONCURRENCY:
+        raise HTTPException(status_code=400, detail=f"concurrency must be between 1 and {MAX_BATCH_CONCURRENCY}")
+
+    request_id = new_request_id(x_request_id)
+    by_user = {}
+    for index, item in enumerate(request.items):
+        by_user.setdefault(item.user_id, []).append((index, item))
+    log.info("batch.received", items=len(request.items), users=len(by_user), remember=request.remember)
+
+    results = asyncio.Queue()
+    slots = asyncio.Semaphore(request.concurrency)
+
+    async def run_user(items):
+        async with slots:
+            for index, item in items:
+                started = time.time()
+                line = {"index": index, "id": item.id, "user_id": item.user_id}
+                try:
+                    turn = await scheduler.submit(
+                        item.user_id, chatbot.run_turn, item.user_id, item.message, remember=request.remember
+                    )
+                    line.update(turn.to_dict())
+                except Exception as e:
+                    log.warning("batch.item_failed", user_id=item.user_id, index=index, error=str(e))
+                    line["error"] = str(e)
+                line["latency_ms"] = round((time.time() - started) * 1000, 1)
+                await results.put(line)
+
+    async def stream():
+        started = time.time()
+        workers = [asyncio.ensure_future(run_user(items)) for items in by_user.values()]
+        failed = 0
+        usage = {"prompt_tokens": 0, "completion_tokens": 0}
+        cost = 0.0
+        try:
+            for _ in range(len(request.items)):
+                line = await results.get()
+                if "error" in line:
+                    failed += 1
+                else:
+                    usage["prompt_tokens"] += line["usage"]["prompt_tokens"]
+                    usage["completion_tokens"] += line["usage"]["completion_tokens"]
+                    cost += line["turn_cost"]
+                yield json.dumps(line) + "\n"
+            total_seconds = time.time() - started
+            log.info("batch.completed", items=len(request.items), failed=failed, total_seconds=round(total_seconds, 3))
+            yield json.dumps({
+                "summary": True,
+                "request_id": request_id,
+                "items": len(request.items),
+                "failed": failed,
+                "usage": usage,
+                "cost": cost,
+                "total_seconds": round(total_seconds, 3)
+            }) + "\n"
+        finally:
+            # Client went away: stop feeding the scheduler
+            for worker in workers:
+                worker.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson", headers={"X-Request-ID": request_id})
@@ -1,10 +1,25 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, Dict, List
 import time
-from shared import chatbot
+from datetime import datetime
+from shared import chatbot, scheduler, chat_flight, warmer
+from admission import admission
+from deadline import degradations
+import analytics
+from db import get_collections
+import transport
+from model_config import model_config, router as model_router
+from chatbot import pc
+from log import get_logger
 
 router = APIRouter(prefix="/system", tags=["system"])
+log = get_logger("routes.system")
+
+def parse_date(value):
+    """ISO date or datetime as naive UTC; offsets such as +05:30 are converted"""
+    return analytics.to_naive_utc(datetime.fromisoformat(value)) if value else None
 
 # Request Models
 class AnalyticsRequest(BaseModel):
@@ -12,10 +27,19 @@ class AnalyticsRequest(BaseModel):
     end_date: Optional[str] = None
     user_id: Optional[str] = None
 
+class StageConfigRequest(BaseModel):
+    model: Optional[str] = None
+    fallback_model: Optional[str] = None
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+    p95_slo_ms: Optional[float] = None
+
 class SystemConfigRequest(BaseModel):
+    # Top-level fields are shorthand for the completion stage
     max_tokens: Optional[int] = None
     temperature: Optional[float] = None
     model_name: Optional[str] = None
+    stages: Optional[Dict[str, StageConfigRequest]] = None
 
 class BatchProcessRequest(BaseModel):
     user_ids: List[str]
@@ -27,32 +51,47 @@ class HealthResponse(BaseModel):
     request_count: int
     chatbot_initialized: bool
     memory_usage: Dict[str, int]
+    scheduler: Optional[Dict[str, float]] = None
+    admission: Optional[Dict] = None
+    single_flight: Optional[Dict[str, int]] = None
+    degradations: Optional[Dict[str, int]] = None
+    memory_dedup: Optional[Dict[str, float]] = None
+    classification_cache: Optional[Dict] = None
+    transport: Optional[Dict] = None
+    model_routing: Optional[Dict] = None
+    warmup: Optional[Dict[str, float]] = None
     last_error: Optional[str] = None
 
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
-    print("\n📥 Received GET /health request")
     try:
         uptime = time.time() - getattr(chatbot, 'start_time', time.time())
         memory_usage = {
-            "total_users": len(chatbot.user_memory),
+            "total_users": len(chatbot.profiles),
             "cached_embeddings": len(getattr(chatbot, 'embedding_cache', {})),
             "cached_responses": len(chatbot.response_cache)
         }
 
-        print("🩺 Status: healthy")
-        print(f"⏱️ Uptime: {uptime:.2f}s")
-        print(f"📊 Memory: {memory_usage}")
+        log.debug("health.checked", uptime=round(uptime, 2), **memory_usage)
 
         return HealthResponse(
             status="healthy",
             uptime=uptime,
             request_count=getattr(chatbot, 'request_count', 0),
             chatbot_initialized=True,
-            memory_usage=memory_usage
+            memory_usage=memory_usage,
+            scheduler=scheduler.stats(),
+            admission=admission.stats(),
+            single_flight=chat_flight.stats(),
+            degradations=degradations.snapshot(),
+            memory_dedup=chatbot.dedup.stats(),
+            classification_cache=chatbot.classifications.stats(),
+            transport=transport.stats(pc),
+            model_routing=model_router.stats(),
+            warmup=warmer.stats()
         )
     except Exception as e:
-        print(f"❌ Health check failed: {str(e)}")
+        log.error("health.failed", error=str(e))
         return HealthResponse(
             status="unhealthy",
             uptime=time.time() - getattr(chatbot, 'start_time', time.time()),
@@ -67,33 +106,82 @@ async def get_analytics(request: AnalyticsRequest):
     try:
         # Get basic metrics
         metrics = {
-            "total_users": len(chatbot.user_memory),
+            "total_users": len(chatbot.profiles),
             "total_requests": getattr(chatbot, 'request_count', 0),
             "uptime": time.time() - getattr(chatbot, 'start_time', time.time()),
             "average_response_time": chatbot.get_average_response_time(),
             "total_cost": chatbot.total_cost
         }
         
+        start = parse_date(request.start_date)
+        end = parse_date(request.end_date)
+        if start and end and start >= end:
+            raise HTTPException(status_code=400, detail="start_date must be before end_date")
+        collections = get_collections()
+
         # Get user-specific metrics if user_id provided
         if request.user_id:
-            user_metrics = chatbot.get_user_metrics(request.user_id)
-            metrics["user_metrics"] = user_metrics
+            metrics["user_metrics"] = await run_in_threadpool(chatbot.get_user_metrics, request.user_id)
+            if request.start_date or request.end_date:
+                # Rollups are not broken down per user; read the journal and active-user marks instead
+                await analytics.flush_rollups(collections["analytics"], collections["active_users"], analytics.recorder)
+                metrics["range"] = await analytics.query_user_range(
+                    collections["messages"], collections["active_users"], request.user_id, start, end
+                )
+            return metrics
+
+        # Aggregate the requested date range from the hourly rollups
+        await analytics.flush_rollups(collections["analytics"], collections["active_users"], analytics.recorder)
+        metrics["range"] = await analytics.query_range(collections["analytics"], collections["active_users"], start, end)
             
         return metrics
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/analytics/backfill")
+async def backfill_analytics(request: AnalyticsRequest):
+    try:
+        if not request.start_date or not request.end_date:
+            raise HTTPException(status_code=400, detail="start_date and end_date are required")
+        collections = get_collections()
+        hours = await analytics.backfill_from_journal(
+            collections["messages"],
+            collections["analytics"],
+            collections["active_users"],
+            parse_date(request.start_date),
+            parse_date(request.end_date)
+        )
+        return {"message": "Analytics rollups rebuilt from the message journal", "hours": hours}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/config")
+async def get_system_config():
+    return {"stages": model_config.snapshot(), "routing": model_router.stats()}
+
 @router.post("/config")
 async def update_system_config(request: SystemConfigRequest):
     try:
-        if request.max_tokens:
-            chatbot.max_tokens = request.max_tokens
-        if request.temperature:
-            chatbot.temperature = request.temperature
-        if request.model_name:
-            chatbot.model_name = request.model_name
-            
-        return {"message": "System configuration updated successfully"}
+        updates = {stage: config.dict() for stage, config in (request.stages or {}).items()}
+        completion = updates.setdefault("completion", {})
+        for field, value in (("max_tokens", request.max_tokens), ("temperature", request.temperature),
+                             ("model", request.model_name)):
+            if value is not None:
+                completion[field] = value
+
+        model_config.update(updates)
+
+        return {"message": "System configuration updated successfully", "stages": model_config.snapshot()}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -104,15 +192,15 @@ async def batch_process(request: BatchProcessRequest):
         for user_id in request.user_ids:
             if request.operation == "update":
                 # Update user preferences and memory
-                chatbot.refresh_user_memory(user_id)
+                await run_in_threadpool(chatbot.refresh_user_memory, user_id)
                 results.append({"user_id": user_id, "status": "updated"})
             elif request.operation == "delete":
                 # Delete user data
-                chatbot.clear_user_memory(user_id)
+                await run_in_threadpool(chatbot.clear_user_memory, user_id)
                 results.append({"user_id": user_id, "status": "deleted"})
             elif request.operation == "export":
                 # Export user data
-                user_data = chatbot.export_user_data(user_id)
+                user_data = await run_in_threadpool(chatbot.export_user_data, user_id)
                 results.append({"user_id": user_id, "data": user_data})
                 
         return {"results": results}
@@ -123,7 +211,7 @@ async def batch_process(request: BatchProcessRequest):
 async def reset_system():
     try:
         # Reset chatbot state
-        chatbot.reset()
+        await run_in_threadpool(chatbot.reset)
         # Reset global metrics
         chatbot.request_count = 0
         chatbot.start_time = time.time()
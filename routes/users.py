@@ -1,8 +1,9 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List, Dict
-from shared import chatbot
-from db import create_user, get_user_by_device_id, update_user_by_device_id
+from shared import chatbot, warmer
+from db import create_user, get_user_by_device_id, update_user_by_device_id, user_profile_fields
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -25,8 +26,11 @@ class UserSearchRequest(BaseModel):
     offset: Optional[int] = 0
 
 @router.post("/guest")
-async def register_guest_user(request: GuestUserRequest):
+async def register_guest_user(request: GuestUserRequest, background_tasks: BackgroundTasks):
     try:
+        # Warm caches and connections while the app opens its chat screen
+        background_tasks.add_task(warmer.warm, request.deviceId)
+
         # Check if user already exists
         existing_user = await get_user_by_device_id(request.deviceId)
         
@@ -64,6 +68,9 @@ async def update_user_details(request: UserDetailsRequest):
             updated_user = await update_user_by_device_id(request.deviceId, {
                 "name": request.name
             })
+            # Keep search results in step with the renamed user
+            user_id, _, likes, dislikes = user_profile_fields(existing_user)
+            chatbot.search_index.update(user_id, request.name, likes, dislikes)
             return {"message": "User details updated", "user": updated_user}
         
         # Create new user if doesn't exist
@@ -71,6 +78,7 @@ async def update_user_details(request: UserDetailsRequest):
             "deviceId": request.deviceId,
             "name": request.name
         })
+        chatbot.search_index.update(request.deviceId, request.name)
         
         return {"message": "User created successfully", "user": new_user}
     except Exception as e:
@@ -99,27 +107,18 @@ async def update_interest(request: InterestRequest):
 @router.post("/search")
 async def search_users(request: UserSearchRequest):
     try:
-        # Search users based on query
-        results = []
-        for user_id, user_data in chatbot.user_memory.items():
-            if (request.query.lower() in user_data.get("name", "").lower() or
-                request.query.lower() in str(user_data.get("preferences", {})).lower()):
-                results.append({
-                    "user_id": user_id,
-                    "name": user_data.get("name", ""),
-                    "preferences": user_data.get("preferences", {})
-                })
-                
-        # Apply pagination
-        start = request.offset
-        end = start + request.limit
-        paginated_results = results[start:end]
-        
+        # Search users through the inverted index
+        total, results = chatbot.search_index.search(
+            request.query,
+            limit=request.limit,
+            offset=request.offset
+        )
+
         return {
-            "total": len(results),
+            "total": total,
             "offset": request.offset,
             "limit": request.limit,
-            "results": paginated_results
+            "results": results
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -127,7 +126,7 @@ async def search_users(request: UserSearchRequest):
 @router.get("/{user_id}/sessions")
 async def get_user_sessions(user_id: str):
     try:
-        sessions = chatbot.get_user_sessions(user_id)
+        sessions = await run_in_threadpool(chatbot.get_user_sessions, user_id)
         return {"sessions": sessions}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -135,7 +134,7 @@ async def get_user_sessions(user_id: str):
 @router.delete("/{user_id}/sessions/{session_id}")
 async def delete_user_session(user_id: str, session_id: str):
     try:
-        chatbot.delete_user_session(user_id, session_id)
+        await run_in_threadpool(chatbot.delete_user_session, user_id, session_id)
         return {"message": "Session deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
@@ -0,0 +1,101 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_CONCURRENT_TURNS = int(os.getenv("MAX_CONCURRENT_TURNS", "16"))
+MAX_MAILBOX_SIZE = int(os.getenv("MAX_MAILBOX_SIZE", "10"))
+
+
+class MailboxFull(Exception):
+    """Raised when a user already has MAX_MAILBOX_SIZE turns waiting"""
+
+
+class UserScheduler:
+    """Runs blocking chat turns so that one user's turns are strictly ordered.
+
+    Every user gets a FIFO mailbox drained by a single task, so a turn only
+    starts once that user's previous turn (including its memory write) has
+    finished. Mailboxes of different users drain concurrently, bounded by a
+    global semaphore and a dedicated thread pool of the same size.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENT_TURNS, max_mailbox=MAX_MAILBOX_SIZE):
+        self.max_concurrency = max_concurrency
+        self.max_mailbox = max_mailbox
+        self._mailboxes = {}   # user_id -> deque of pending turns, head is the running one
+        self._semaphore = None
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="turn")
+        self._running = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+
+    async def submit(self, user_id, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) behind the user's earlier turns and await its result"""
+        if self._semaphore is None:
+            # Created lazily so it binds to the server's running loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        mailbox = self._mailboxes.get(user_id)
+        if mailbox is not None and len(mailbox) >= self.max_mailbox:
+            self._rejected += 1
+            raise MailboxFull(f"Too many pending messages for user {user_id}")
+
+        future = asyncio.get_running_loop().create_future()
+        turn = (future, functools.partial(fn, *args, **kwargs), time.time(), contextvars.copy_context())
+        self._submitted += 1
+        if mailbox is None:
+            self._mailboxes[user_id] = deque([turn])
+            asyncio.ensure_future(self._drain(user_id))
+        else:
+            mailbox.append(turn)
+        return await future
+
+    async def _drain(self, user_id):
+        mailbox = self._mailboxes[user_id]
+        loop = asyncio.get_running_loop()
+        while mailbox:
+            future, call, enqueued_at, context = mailbox[0]
+            async with self._semaphore:
+                wait = time.time() - enqueued_at
+                self._queue_wait_total += wait
+                self._queue_wait_max = max(self._queue_wait_max, wait)
+                self._running += 1
+                try:
+                    result = await loop.run_in_executor(self._executor, context.run, call)
+                    self._completed += 1
+                    if not future.cancelled():
+                        future.set_result(result)
+                except Exception as e:
+                    self._failed += 1
+                    if not future.cancelled():
+                        future.set_exception(e)
+                finally:
+                    self._running -= 1
+            mailbox.popleft()
+        # No await since the last check, so no turn can have slipped in
+        del self._mailboxes[user_id]
+
+    def stats(self):
+        """Backpressure metrics for health checks"""
+        queued = sum(len(mailbox) for mailbox in self._mailboxes.values())
+        started = self._completed + self._failed + self._running
+        return {
+            "active_users": len(self._mailboxes),
+            "running": self._running,
+            "queued": queued - self._running,
+            "max_concurrency": self.max_concurrency,
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "avg_queue_wait": self._queue_wait_total / started if started else 0.0,
+            "max_queue_wait": self._queue_wait_max
+        }
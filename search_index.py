@@ -0,0 +1,139 @@
+import bisect
+import heapq
+import re
+import threading
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+PLACEHOLDER_NAMES = {"guest"}
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens"""
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class UserSearchIndex:
+    """In-memory inverted index over user names, likes and dislikes.
+
+    Every token maps to a posting list of user ids kept in sorted order, and
+    the vocabulary itself is kept sorted so a query token can be expanded to
+    all indexed tokens sharing its prefix with a binary search.
+    """
+
+    def __init__(self):
+        self._postings = {}      # token -> sorted list of user_ids
+        self._vocabulary = []    # sorted list of indexed tokens
+        self._user_tokens = {}   # user_id -> set of tokens currently indexed
+        self._profiles = {}      # user_id -> profile snapshot returned in results
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def update(self, user_id, name="", likes=(), dislikes=()):
+        """Index or re-index a single user's profile"""
+        likes = list(likes or [])
+        dislikes = list(dislikes or [])
+        tokens = set()
+        if name and name.lower() not in PLACEHOLDER_NAMES:
+            tokens.update(tokenize(name))
+        for item in likes + dislikes:
+            tokens.update(tokenize(item))
+
+        with self._lock:
+            previous = self._user_tokens.get(user_id, set())
+            for token in previous - tokens:
+                self._remove_posting(token, user_id)
+            for token in tokens - previous:
+                self._add_posting(token, user_id)
+            self._user_tokens[user_id] = tokens
+            self._profiles[user_id] = {
+                "name": name or "",
+                "preferences": {"likes": likes, "dislikes": dislikes}
+            }
+
+    def remove(self, user_id):
+        """Drop a user from the index"""
+        with self._lock:
+            for token in self._user_tokens.pop(user_id, set()):
+                self._remove_posting(token, user_id)
+            self._profiles.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._postings = {}
+            self._vocabulary = []
+            self._user_tokens = {}
+            self._profiles = {}
+
+    def search(self, query, limit=10, offset=0):
+        """Return (total, results) for users matching every query token by prefix"""
+        query_tokens = sorted(set(tokenize(query)), key=len, reverse=True)
+        if not query_tokens:
+            return 0, []
+
+        with self._lock:
+            matches = None
+            for token in query_tokens:
+                posting = self._expand_prefix(token)
+                if matches is None:
+                    matches = posting
+                else:
+                    allowed = set(posting)
+                    matches = [user_id for user_id in matches if user_id in allowed]
+                if not matches:
+                    return 0, []
+
+            page = matches[offset:offset + limit]
+            results = [
+                {
+                    "user_id": user_id,
+                    "name": self._profiles[user_id]["name"],
+                    "preferences": self._profiles[user_id]["preferences"]
+                }
+                for user_id in page
+            ]
+            return len(matches), results
+
+    def _expand_prefix(self, prefix):
+        """Merge the posting lists of every indexed token starting with prefix"""
+        position = bisect.bisect_left(self._vocabulary, prefix)
+        postings = []
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(prefix):
+            postings.append(self._postings[self._vocabulary[position]])
+            position += 1
+
+        if not postings:
+            return []
+        if len(postings) == 1:
+            return postings[0]
+
+        merged = []
+        for user_id in heapq.merge(*postings):
+            if not merged or merged[-1] != user_id:
+                merged.append(user_id)
+        return merged
+
+    def _add_posting(self, token, user_id):
+        posting = self._postings.get(token)
+        if posting is None:
+            posting = self._postings[token] = []
+            bisect.insort(self._vocabulary, token)
+        position = bisect.bisect_left(posting, user_id)
+        if position == len(posting) or posting[position] != user_id:
+            posting.insert(position, user_id)
+
+    def _remove_posting(self, token, user_id):
+        posting = self._postings.get(token)
+        if posting is None:
+            return
+        position = bisect.bisect_left(posting, user_id)
+        if position < len(posting) and posting[position] == user_id:
+            posting.pop(position)
+        if not posting:
+            del self._postings[token]
+            position = bisect.bisect_left(self._vocabulary, token)
+            if position < len(self._vocabulary) and self._vocabulary[position] == token:
+                self._vocabulary.pop(position)
@@ -1,5 +1,17 @@
 from chatbot import EllaChatbot
+from scheduler import UserScheduler
+from singleflight import SingleFlight
+from warmup import SessionWarmer
 
 # Create a single shared instance
 chatbot = EllaChatbot()
-print("🟢 Shared chatbot instance created") 
\ No newline at end of file
+print("🟢 Shared chatbot instance created")
+
+# Serializes each user's turns while running different users in parallel
+scheduler = UserScheduler()
+
+# Collapses duplicate in-flight /chat turns (double taps, client retries)
+chat_flight = SingleFlight()
+
+# Prefetches a user's profile and connections before their first turn
+warmer = SessionWarmer(chatbot)
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+REPLAY_WINDOW_SECONDS = 30
+MAX_REPLAY_ENTRIES = 5000
+
+
+class SingleFlight:
+    """Collapses concurrent identical async calls into one.
+
+    The first caller for a key runs the work; callers arriving while it is
+    in flight await the same result. With replay=True successful results are
+    replayed for REPLAY_WINDOW_SECONDS so late client retries don't redo the
+    work; only use it for keys that identify one client request, since a user
+    may deliberately send the same text twice. If the leader is cancelled
+    (its client went away) the callers that joined it run the work again.
+    """
+
+    def __init__(self, replay_seconds=REPLAY_WINDOW_SECONDS, max_entries=MAX_REPLAY_ENTRIES):
+        self.replay_seconds = replay_seconds
+        self.max_entries = max_entries
+        self._inflight = {}
+        self._completed = OrderedDict()   # key -> (expires_at, result), oldest first
+        self.leaders = 0
+        self.joined = 0
+        self.replayed = 0
+
+    def _prune(self, now):
+        while self._completed:
+            key, (expires_at, _) = next(iter(self._completed.items()))
+            if expires_at > now and len(self._completed) <= self.max_entries:
+                break
+            del self._completed[key]
+
+    async def do(self, key, work, replay=False):
+        """Return the result of work() (a coroutine factory), shared across duplicates of key"""
+        now = time.monotonic()
+        self._prune(now)
+        if key in self._completed:
+            self.replayed += 1
+            return self._completed[key][1]
+        if key in self._inflight:
+            self.joined += 1
+            future = self._inflight[key]
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # This caller was cancelled, not the leader
+            # The leader gave up; take over (or join whoever already did)
+            return await self.do(key, work, replay)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.leaders += 1
+        try:
+            result = await work()
+        except BaseException as e:
+            # Resolve the shared future on every exit path, cancellation included
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # Mark retrieved when nobody joined
+            raise
+        finally:
+            del self._inflight[key]
+        future.set_result(result)
+        if replay:
+            self._completed[key] = (time.monotonic() + self.replay_seconds, result)
+        return result
+
+    def stats(self):
+        return {
+            "in_flight": len(self._inflight),
+            "replayable": len(self._completed),
+            "leaders": self.leaders,
+            "joined": self.joined,
+            "replayed": self.replayed
+        }
+
+
+class ThreadSingleFlight:
+    """SingleFlight for blocking calls made from worker threads (no replay window)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}   # key -> [event, result, error]
+        self.leaders = 0
+        self.joined = 0
+
+    def do(self, key, work):
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = [threading.Event(), None, None]
+                self.leaders += 1
+            else:
+                self.joined += 1
+
+        if not leader:
+            call[0].wait()
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+
+        try:
+            call[1] = work()
+        except Exception as e:
+            call[2] = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call[0].set()
+        return call[1]
@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from log import get_logger
+
+log = get_logger("summarizer")
+
+SUMMARY_EVERY_TURNS = int(os.getenv("SUMMARY_EVERY_TURNS", "10"))
+SUMMARY_MAX_MESSAGES = 60     # Journal messages folded into one refresh
+SUMMARY_MAX_TOKENS = 200
+SUMMARY_MODEL = None          # The analysis stage model from model_config
+
+SUMMARY_PROMPT = """You maintain a short running summary of a user's relationship with Aradhya, a chat companion. Update the summary with the new messages below. Keep durable facts (name, life events, plans, moods, running jokes, what they like or dislike) and drop small talk. Write at most 120 words, third person, plain sentences.
+
+Current summary: {summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+
+class ConversationSummarizer:
+    """Keeps a compact rolling summary per user, refreshed in the background.
+
+    Every SUMMARY_EVERY_TURNS turns the messages journaled since the last
+    refresh are folded into the existing summary with one analysis call.
+    Both apps journal every /chat turn; when the journal has nothing (no
+    Mongo, or the journal writes failed) the profile's hot turns are used
+    instead.
+    """
+
+    def __init__(self, profiles, complete):
+        self.profiles = profiles
+        self.complete = complete       # (model, messages, temperature, max_tokens, user_id) -> text
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.refreshed = 0
+        self.failed = 0
+
+    def on_turn(self, user_id, turns_since_summary):
+        """Schedule a refresh once enough turns have accumulated"""
+        if turns_since_summary < SUMMARY_EVERY_TURNS:
+            return
+        with self._lock:
+            if user_id in self._pending:
+                return
+            self._pending.add(user_id)
+        self._executor.submit(self._refresh, user_id)
+
+    def _journal_messages(self, user_id, since):
+        """Messages journaled after since (epoch seconds), oldest first"""
+        messages = self.profiles.db.messages.find(
+            {"user_id": user_id, "timestamp": {"$gt": datetime.utcfromtimestamp(since)}},
+            {"role": 1, "content": 1, "timestamp": 1}
+        ).sort("timestamp", -1).limit(SUMMARY_MAX_MESSAGES)
+        messages = list(messages)[::-1]
+        lines = [
+            f"{'User' if message['role'] == 'user' else 'Aradhya'}: {message['content']}"
+            for message in messages
+        ]
+        until = messages[-1]["timestamp"].replace(tzinfo=timezone.utc).timestamp() if messages else since
+        return lines, until
+
+    def _refresh(self, user_id):
+        try:
+            profile = self.profiles.get(user_id)
+            lines = []
+            if self.profiles.db is not None:
+                lines, until = self._journal_messages(user_id, profile.summary_until)
+            if not lines:
+                # Only the turns since the last refresh are new
+                turns = list(profile.recent_turns)[-profile.turns_since_summary:] if profile.turns_since_summary else []
+                lines = [f"User: {message}\nAradhya: {response}" for message, response in turns]
+                until = time.time()
+            if not lines:
+                return
+
+            prompt = SUMMARY_PROMPT.format(
+                summary=profile.summary or "(none yet)",
+                messages="\n".join(lines)
+            )
+            summary = self.complete(
+                SUMMARY_MODEL,
+                [{"role": "user", "content": prompt}],
+                0.3,
+                SUMMARY_MAX_TOKENS,
+                user_id
+            )
+            if summary:
+                self.profiles.set_summary(user_id, summary.strip(), until)
+                self.refreshed += 1
+                log.info("summary.refreshed", user_id=user_id, turns=len(lines))
+        except Exception as e:
+            self.failed += 1
+            log.error("summary.failed", user_id=user_id, error=str(e))
+        finally:
+            with self._lock:
+                self._pending.discard(user_id)
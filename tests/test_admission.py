@@ -0,0 +1,104 @@
+import pytest
+
+import admission
+from admission import AdmissionController, AdmissionRejected, TokenBucket, CRITICAL, HELPER
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(admission.time, "monotonic", fake.monotonic)
+    return fake
+
+
+def test_bucket_refills_at_its_per_minute_rate(clock):
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.now += 0.5
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.wait_time(1) == 0.0
+
+
+def test_bucket_never_refills_past_capacity(clock):
+    bucket = TokenBucket(60)
+    clock.now += 3600
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    bucket.refund(1000)
+    assert bucket.level == bucket.capacity
+
+
+def test_oversized_requests_wait_for_a_full_bucket(clock):
+    bucket = TokenBucket(60)
+    assert bucket.wait_time(600) == 0.0
+    bucket.take(600)
+    assert bucket.level == 0.0
+
+
+def test_helper_is_shed_when_the_budget_cannot_recover(clock):
+    controller = AdmissionController()
+    rpm, tpm = admission.DEFAULT_MODEL_LIMITS
+    with controller.admit("test-model", tokens=tpm, priority=CRITICAL):
+        pass
+    with pytest.raises(AdmissionRejected):
+        controller.acquire("test-model", tokens=tpm // 2, priority=HELPER)
+    with pytest.raises(AdmissionRejected):
+        controller.acquire("test-model", tokens=tpm // 2, priority=CRITICAL, deadline=1.0)
+    stats = controller.stats()["models"]["test-model"]
+    assert (stats["admitted"], stats["shed"], stats["timed_out"]) == (1, 1, 1)
+
+
+def test_settle_refunds_overestimated_tokens(clock):
+    controller = AdmissionController()
+    rpm, tpm = admission.DEFAULT_MODEL_LIMITS
+    with controller.admit("test-model", tokens=tpm, priority=CRITICAL) as ticket:
+        ticket.settle(tpm // 2)
+    ticket = controller.acquire("test-model", tokens=tpm // 2, priority=HELPER)
+    controller.release(ticket)
+    assert controller.stats()["models"]["test-model"]["admitted"] == 2
+
+
+def test_user_limits_shed_one_user_only(clock, monkeypatch):
+    monkeypatch.setattr(admission, "USER_LIMITS", (1, 100000))
+    controller = AdmissionController()
+    controller.release(controller.acquire("test-model", user_id="chatty", priority=HELPER))
+    with pytest.raises(AdmissionRejected):
+        controller.acquire("test-model", user_id="chatty", priority=HELPER)
+    controller.release(controller.acquire("test-model", user_id="quiet", priority=HELPER))
+
+
+def test_helpers_are_capped_below_the_inflight_limit(clock, monkeypatch):
+    monkeypatch.setattr(admission, "MAX_INFLIGHT_HELPERS", 1)
+    controller = AdmissionController()
+    ticket = controller.acquire("test-model", priority=HELPER)
+    with pytest.raises(AdmissionRejected):
+        controller.acquire("test-model", priority=HELPER, deadline=0)
+    controller.release(controller.acquire("test-model", priority=CRITICAL))
+    controller.release(ticket)
+
+
+def test_model_limits_are_split_across_workers(clock, monkeypatch):
+    monkeypatch.setattr(admission, "WORKER_COUNT", 4)
+    controller = AdmissionController()
+    requests, tokens = controller._buckets("gpt-3.5-turbo", None)
+    assert (requests.capacity, tokens.capacity) == (3500 / 4, 160000 / 4)
+
+
+def test_least_recently_used_users_are_evicted(clock, monkeypatch):
+    monkeypatch.setattr(admission, "MAX_TRACKED_USERS", 2)
+    controller = AdmissionController()
+    controller._buckets("test-model", "a")
+    controller._buckets("test-model", "b")
+    controller._buckets("test-model", "a")
+    controller._buckets("test-model", "c")
+    assert list(controller._user_buckets) == ["a", "c"]
@@ -0,0 +1,61 @@
+import classification_cache
+from classification_cache import MISS, ClassificationCache, cache_text, classification_key
+
+
+class FakeCollection:
+    def __init__(self):
+        self.updates = []
+
+    def update_one(self, query, update, upsert=False):
+        self.updates.append((query["_id"], update["$set"]))
+
+
+def test_stretched_and_punctuated_openers_share_a_key():
+    key = classification_key("detect_name", "m:1", "hi")
+    assert classification_key("detect_name", "m:1", "hiii") == key
+    assert classification_key("detect_name", "m:1", "Hi!!") == key
+    assert cache_text("Heyyy  THERE!!") == cache_text("hey there")
+
+
+def test_helper_and_version_separate_the_keyspace():
+    key = classification_key("detect_name", "gpt-3.5-turbo:1", "hi")
+    assert classification_key("is_name_query", "gpt-3.5-turbo:1", "hi") != key
+    assert classification_key("detect_name", "gpt-4o-mini:1", "hi") != key
+    assert classification_key("detect_name", "gpt-3.5-turbo:2", "hi") != key
+
+
+def test_hits_misses_and_cached_falsy_values():
+    cache = ClassificationCache()
+    assert cache.get("detect_name", "v", "hi") is MISS
+    cache.put("detect_name", "v", "hi", "")
+    assert cache.get("detect_name", "v", "hiiii!") == ""
+    assert cache.stats()["detect_name"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ClassificationCache(max_entries=2)
+    cache.put("h", "v", "one", 1)
+    cache.put("h", "v", "two", 2)
+    cache.get("h", "v", "one")
+    cache.put("h", "v", "three", 3)
+    assert cache.get("h", "v", "two") is MISS
+    assert cache.get("h", "v", "one") == 1
+    assert cache.stats()["entries"] == 2
+
+
+def test_hits_refresh_used_at_at_most_once_per_interval(monkeypatch):
+    collection = FakeCollection()
+    cache = ClassificationCache()
+    cache.collection = collection
+    now = [1000.0]
+    monkeypatch.setattr(classification_cache.time, "time", lambda: now[0])
+
+    cache.put("h", "v", "hi", True)
+    cache.get("h", "v", "hi")
+    now[0] += classification_cache.TOUCH_INTERVAL_SECONDS
+    cache.get("h", "v", "hi")
+    cache.get("h", "v", "hi")
+    cache.close()
+
+    writes = [set(fields) for _, fields in collection.updates]
+    assert writes == [{"helper", "version", "value", "used_at"}, {"used_at"}]
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import math
+
+import pytest
+
+import dataset_tool
+from dataset_tool import BloomFilter, chunk_ranges, new_stats, scan_chunk, scan_file
+
+
+def chat_line(number):
+    return json.dumps({"messages": [
+        {"role": "user", "content": f"message {number} " + "x" * (number % 7)},
+        {"role": "assistant", "content": f"reply {number}"}
+    ]})
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    lines = [chat_line(number) for number in range(40)]
+    lines[5] = ""
+    lines[17] = "{not json"
+    lines[31] = json.dumps({"messages": [{"role": "user", "content": "no reply"}]})
+    path = tmp_path / "data.jsonl"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+def merged(path, boundaries):
+    """Scan the file split at the given byte offsets and sum the chunks"""
+    total = new_stats()
+    offsets = [0] + sorted(boundaries) + [path.stat().st_size]
+    for start, end in zip(offsets, offsets[1:]):
+        stats = scan_chunk((str(path), start, end, 10))
+        for field in ("lines", "blank", "valid", "invalid", "tokens"):
+            total[field] += stats[field]
+        total["histogram"] = [a + b for a, b in zip(total["histogram"], stats["histogram"])]
+    return total
+
+
+def test_every_line_is_scanned_by_exactly_one_chunk(dataset):
+    whole = scan_chunk((str(dataset), 0, dataset.stat().st_size, 10))
+    assert (whole["lines"], whole["blank"], whole["valid"], whole["invalid"]) == (40, 1, 37, 2)
+
+    data = dataset.read_bytes()
+    newlines = [position + 1 for position, byte in enumerate(data) if byte == ord("\n")]
+    # Split exactly on line starts, just after them, just before them and mid-line
+    for boundary in sorted({*newlines[:10], *(n + 1 for n in newlines[:10]), *(n - 1 for n in newlines[:10]), 333}):
+        if 0 < boundary < len(data):
+            split = merged(dataset, [boundary])
+            assert split["lines"] == whole["lines"], boundary
+            assert split["valid"] == whole["valid"], boundary
+            assert split["tokens"] == whole["tokens"], boundary
+            assert split["histogram"] == whole["histogram"], boundary
+
+
+def test_many_small_chunks_match_one_pass(dataset):
+    size = dataset.stat().st_size
+    whole = scan_chunk((str(dataset), 0, size, 10))
+    split = merged(dataset, range(97, size, 97))
+    assert (split["lines"], split["valid"], split["invalid"], split["tokens"]) == \
+        (whole["lines"], whole["valid"], whole["invalid"], whole["tokens"])
+
+
+def test_error_line_numbers_are_file_relative(dataset, monkeypatch):
+    monkeypatch.setattr(dataset_tool, "MIN_CHUNK_BYTES", 256)
+    assert len(chunk_ranges(str(dataset), 4)) > 1
+    stats = scan_file(str(dataset), 1, 10)
+    assert [line for line, _ in stats["errors"]] == [18, 32]
+    assert stats["lines"] == 40
+
+
+def test_chunk_ranges_cover_the_file(dataset, monkeypatch):
+    monkeypatch.setattr(dataset_tool, "MIN_CHUNK_BYTES", 100)
+    ranges = chunk_ranges(str(dataset), 2)
+    assert ranges[0][1] == 0
+    assert ranges[-1][2] == dataset.stat().st_size
+    assert all(previous[2] == current[1] for previous, current in zip(ranges, ranges[1:]))
+    assert len(ranges) == 8
+
+
+@pytest.mark.parametrize("expected_items, error_rate", [(1000, 0.01), (100000, 0.001), (10, 0.1)])
+def test_bloom_filter_is_sized_for_the_error_rate(expected_items, error_rate):
+    bloom = BloomFilter(expected_items, error_rate)
+    optimal_bits = -expected_items * math.log(error_rate) / math.log(2) ** 2
+    assert bloom.bits == pytest.approx(optimal_bits, abs=1)
+    assert bloom.hashes == round(optimal_bits / expected_items * math.log(2))
+    assert len(bloom.array) * 8 >= bloom.bits
+
+
+def test_bloom_filter_false_positive_rate_stays_near_target():
+    bloom = BloomFilter(2000, 0.01)
+    digests = [hashlib.sha1(f"item {number}".encode()).digest() for number in range(3000)]
+    assert not bloom.add(digests[0])
+    for digest in digests[1:2000]:
+        bloom.add(digest)
+    assert all(bloom.add(digest) for digest in digests[:2000])
+
+    def contains(digest):
+        return all(bloom.array[position // 8] & (1 << position % 8) for position in bloom._positions(digest))
+
+    false_positives = sum(contains(digest) for digest in digests[2000:])
+    assert false_positives / 1000 < 0.03
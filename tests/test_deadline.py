@@ -0,0 +1,78 @@
+import threading
+import time
+from concurrent.futures import TimeoutError
+
+import pytest
+
+import deadline as deadline_module
+from deadline import Deadline, DegradationCounters, retry_delay, run_with_deadline
+from turn_context import TurnContext, current_turn
+
+
+def test_remaining_counts_down_and_never_goes_negative():
+    deadline = Deadline(0.05)
+    assert 0 < deadline.remaining() <= 0.05
+    assert not deadline.expired()
+    time.sleep(0.06)
+    assert deadline.remaining() == 0.0
+    assert deadline.expired()
+
+
+def test_slice_takes_a_fraction_of_what_is_left():
+    child = Deadline(10).slice(0.4)
+    assert child.budget == pytest.approx(4, abs=0.01)
+
+
+def test_stage_is_sized_from_p95_with_headroom():
+    parent = Deadline(10)
+    stage = parent.stage(p95_seconds=2.0)
+    assert stage.budget == pytest.approx(2.0 * deadline_module.STAGE_HEADROOM, abs=0.01)
+    assert parent.stage().budget == pytest.approx(
+        deadline_module.HELPER_DEFAULT_SECONDS * deadline_module.STAGE_HEADROOM, abs=0.01
+    )
+
+
+def test_stage_is_skipped_when_the_budget_cannot_cover_it():
+    assert Deadline(1.0).stage(p95_seconds=2.0) is None
+    assert Deadline(2.1).stage(p95_seconds=2.0).budget <= 2.1
+
+
+def test_retry_delay_backs_off_exponentially_up_to_the_cap():
+    delays = [retry_delay(attempt) for attempt in range(6)]
+    assert delays[:4] == [0.5, 1.0, 2.0, 4.0]
+    assert delays[5] == deadline_module.RETRY_MAX_SECONDS
+
+
+def test_retry_delay_respects_the_remaining_budget():
+    assert retry_delay(3, Deadline(10)) == pytest.approx(10 * deadline_module.RETRY_BUDGET_FRACTION, abs=0.01)
+    assert retry_delay(0, Deadline(0.6)) is None
+
+
+def test_run_with_deadline_returns_results_and_errors():
+    assert run_with_deadline(Deadline(1), lambda a, b=0: a + b, 1, b=2) == 3
+    with pytest.raises(ValueError):
+        run_with_deadline(Deadline(1), lambda: int("x"))
+
+
+def test_run_with_deadline_times_out():
+    release = threading.Event()
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        run_with_deadline(Deadline(0.05), release.wait, 1)
+    assert time.monotonic() - started < 0.5
+    release.set()
+
+
+def test_run_with_deadline_keeps_the_current_turn():
+    turn = TurnContext("u1", "hi")
+    with turn.activate():
+        seen = run_with_deadline(Deadline(1), current_turn.get)
+    assert seen is turn
+
+
+def test_degradation_counters():
+    counters = DegradationCounters()
+    counters.record("retrieval_skipped")
+    counters.record("retrieval_skipped")
+    counters.record("name_query_skipped")
+    assert counters.snapshot() == {"retrieval_skipped": 2, "name_query_skipped": 1}
@@ -0,0 +1,61 @@
+import json
+
+import numpy as np
+import pytest
+
+import emotion
+from emotion import EmotionHandler, load_centroids
+
+
+@pytest.fixture
+def centroids_file(tmp_path):
+    path = tmp_path / "centroids.json"
+    path.write_text(json.dumps({
+        "centroids": {"happy": [2.0, 0.0, 0.0], "sad": [0.0, 3.0, 0.0], "angry": [0.0, 0.0, 1.0]},
+        "min_similarity": 0.9
+    }))
+    return str(path)
+
+
+def test_load_centroids_normalises_rows_and_reads_the_threshold(centroids_file):
+    labels, matrix, min_similarity = load_centroids(centroids_file)
+    assert labels == ["angry", "happy", "sad"]
+    assert np.allclose(np.linalg.norm(matrix, axis=1), 1.0)
+    assert min_similarity == 0.9
+
+
+def test_missing_file_disables_centroids(tmp_path):
+    assert load_centroids(str(tmp_path / "missing.json")) == (None, None, None)
+    handler = EmotionHandler(centroids_path=None)
+    assert handler.classify_embeddings([[1.0, 0.0]]) == [None]
+
+
+def test_threshold_falls_back_to_the_default(tmp_path, monkeypatch):
+    path = tmp_path / "old.json"
+    path.write_text(json.dumps({"centroids": {"happy": [1.0, 0.0]}}))
+    assert load_centroids(str(path))[2] == emotion.DEFAULT_MIN_SIMILARITY
+    monkeypatch.setattr(emotion, "EMOTION_MIN_SIMILARITY", 0.5)
+    assert load_centroids(str(path))[2] == 0.5
+
+
+def test_nearest_centroid_and_threshold(centroids_file):
+    handler = EmotionHandler(centroids_path=centroids_file)
+    assert handler.nearest_centroids([[5.0, 0.1, 0.0]])[0][0] == "happy"
+    assert handler.classify_embeddings([[5.0, 0.1, 0.0], [1.0, 1.0, 0.0]]) == ["happy", None]
+    assert handler.classify_embeddings([[1.0, 1.0, 0.0]], min_similarity=0.7) == ["happy"]
+
+
+def test_caller_embeddings_are_not_modified(centroids_file):
+    handler = EmotionHandler(centroids_path=centroids_file)
+    embeddings = np.array([[5.0, 0.0, 0.0], [0.0, 4.0, 0.0]], dtype=np.float32)
+    original = embeddings.copy()
+    handler.classify_embeddings(embeddings)
+    handler.classify_embedding(embeddings[1])
+    assert np.array_equal(embeddings, original)
+
+
+def test_embedding_wins_and_keywords_are_the_fallback(centroids_file):
+    handler = EmotionHandler(centroids_path=centroids_file)
+    assert handler.detect_emotion("I'm so happy", embedding=[0.0, 0.0, 2.0]) == "angry"
+    assert handler.detect_emotion("I'm so happy", embedding=[1.0, 1.0, 1.0]) == "happy"
+    assert handler.detect_emotions(["so sad", "meh"], embeddings=[[1.0, 1.0, 1.0], [0.0, 1.0, 0.0]]) == ["sad", "sad"]
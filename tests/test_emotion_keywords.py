@@ -0,0 +1,37 @@
+from emotion import EmotionHandler
+
+handler = EmotionHandler(centroids_path=None)
+
+
+def test_keywords_match_on_word_boundaries_only():
+    assert handler.detect_emotion("I'm so happy today") == "happy"
+    assert handler.detect_emotion("badminton was fun") == "neutral"      # "bad" inside a word
+    assert handler.detect_emotion("the madness of mondays") == "neutral"  # "mad" inside a word
+
+
+def test_hinglish_keywords_and_phrases():
+    assert handler.detect_emotion("aaj bahut udaas hoon") == "sad"
+    assert handler.detect_emotion("mujhe bahut gussa aa raha hai") == "angry"
+    assert handler.detect_emotion("kal raat maza  aa gaya") == "happy"   # Phrase spans extra whitespace
+
+
+def test_matching_is_case_insensitive_and_weighted():
+    assert handler.emotion_scores("AMAZING but a bit tired") == {"happy": 2, "sad": 1}
+    assert handler.emotion_scores("I am depressed, but glad you called") == {"sad": 3, "happy": 1}
+
+
+def test_longest_phrase_wins_over_its_parts():
+    # "dil toot" is one sad phrase; it must not also count as anything shorter
+    assert handler.emotion_scores("mera dil toot gaya") == {"sad": 3}
+
+
+def test_no_keywords_is_neutral():
+    assert handler.detect_emotion("") == "neutral"
+    assert handler.detect_emotion(None) == "neutral"
+    assert handler.detect_emotions(["kya haal hai", "so frustrated"]) == ["neutral", "angry"]
+
+
+def test_custom_lexicon():
+    custom = EmotionHandler(lexicon={"happy": {"woohoo": 2}, "sad": {"meh": 1}}, centroids_path=None)
+    assert custom.detect_emotion("woohoo") == "happy"
+    assert custom.detect_emotion("I'm excited") == "neutral"
@@ -0,0 +1,87 @@
+import json
+import logging
+
+import log
+from log import JsonFormatter, SamplingFilter, EventLogger, new_request_id, redact
+
+
+def record(event, level=logging.INFO, **fields):
+    entry = logging.LogRecord("hoocup.test", level, __file__, 1, event, None, None)
+    entry.fields = fields
+    entry.request_id = "req-1"
+    return entry
+
+
+def test_redact_masks_emails_and_long_numbers_and_truncates():
+    assert redact("mail me at riya.s+x@gmail.com", limit=100) == "mail me at <email>"
+    assert redact("call 9876543210", limit=100) == "call <num>"
+    assert redact("call 1234", limit=100) == "call 1234"
+    assert redact("a" * 30, limit=10) == "aaaaaaaaaa…(30 chars)"
+    assert redact(None) is None
+
+
+def test_new_request_id_is_generated_or_kept():
+    assert new_request_id("abc") == "abc"
+    assert log.request_id.get() == "abc"
+    generated = new_request_id()
+    assert len(generated) == 16 and generated != "abc"
+
+
+def test_sampled_events_are_dropped_at_their_rate(monkeypatch):
+    sampling = SamplingFilter(sample_rates={"chatty": 0.25}, rate_limits={})
+    rolls = iter([0.1, 0.3, 0.9, 0.2])
+    monkeypatch.setattr(log.random, "random", lambda: next(rolls))
+    kept = [sampling.filter(record("chatty")) for _ in range(4)]
+    assert kept == [True, False, False, True]
+    assert sampling.dropped == 2
+    assert sampling.filter(record("other"))
+
+
+def test_rate_limited_events_reset_every_second(monkeypatch):
+    sampling = SamplingFilter(sample_rates={}, rate_limits={"cache_hit": 2})
+    now = [100.0]
+    monkeypatch.setattr(log.time, "time", lambda: now[0])
+    assert [sampling.filter(record("cache_hit")) for _ in range(3)] == [True, True, False]
+    now[0] += 1
+    assert sampling.filter(record("cache_hit"))
+
+
+def test_warnings_and_errors_are_never_dropped():
+    sampling = SamplingFilter(sample_rates={"chatty": 0.0}, rate_limits={"chatty": 0})
+    assert sampling.filter(record("chatty", logging.WARNING))
+    assert sampling.filter(record("chatty", logging.ERROR))
+    assert not sampling.filter(record("chatty"))
+
+
+def test_json_formatter_flattens_fields():
+    line = json.loads(JsonFormatter().format(record("turn.completed", user_id="u1", chars=12)))
+    assert line["event"] == "turn.completed"
+    assert line["level"] == "INFO"
+    assert line["request_id"] == "req-1"
+    assert (line["user_id"], line["chars"]) == ("u1", 12)
+
+
+def test_event_logger_passes_fields_and_tracebacks():
+    captured = []
+
+    class Capture(logging.Handler):
+        def emit(self, entry):
+            captured.append(entry)
+
+    logger = logging.getLogger("test_event_logger")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(Capture())
+    events = EventLogger(logger)
+
+    events.debug("hidden")
+    events.info("shown", user_id="u1")
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        events.error("failed", exc_info=True, stage="completion")
+
+    assert [entry.msg for entry in captured] == ["shown", "failed"]
+    assert captured[0].fields == {"user_id": "u1"}
+    assert captured[1].fields["stage"] == "completion"
+    assert "ValueError: boom" in captured[1].fields["exc"]
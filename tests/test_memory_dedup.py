@@ -0,0 +1,63 @@
+import numpy as np
+
+from memory_dedup import MemoryDeduplicator, normalize_text, text_hash
+
+
+def vector(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_normalize_text_strips_case_punctuation_and_stretching():
+    assert normalize_text("  Heyyy!!  How are   you?? ") == "heyy how are you"
+    assert normalize_text(None) == ""
+    assert text_hash("I LOVE pizza!!!") == text_hash("i love pizza")
+
+
+def test_exact_repeat_is_reported_as_exact():
+    dedup = MemoryDeduplicator(threshold=0.95)
+    dedup.remember("u1", "v1", "I love pizza", vector(1, 0, 0))
+    assert dedup.find_duplicate("u1", "i love PIZZA!", vector(0, 1, 0)) == ("v1", True)
+
+
+def test_near_duplicate_is_matched_by_cosine_similarity():
+    dedup = MemoryDeduplicator(threshold=0.95)
+    dedup.remember("u1", "v1", "I love pizza", vector(1, 0, 0))
+    dedup.remember("u1", "v2", "Going to Goa", vector(0, 1, 0))
+    assert dedup.find_duplicate("u1", "I hate pizza", vector(10, 0.5, 0)) == ("v1", False)
+    assert dedup.find_duplicate("u1", "Something new", vector(0, 0, 1)) is None
+    stats = dedup.stats()
+    assert (stats["writes"], stats["exact_duplicates"], stats["near_duplicates"]) == (2, 0, 1)
+
+
+def test_users_never_match_each_other():
+    dedup = MemoryDeduplicator()
+    dedup.remember("u1", "v1", "hello there", vector(1, 0))
+    assert dedup.find_duplicate("u2", "hello there", vector(1, 0)) is None
+
+
+def test_only_the_last_few_vectors_per_user_are_kept():
+    dedup = MemoryDeduplicator(per_user=2)
+    for number in range(3):
+        dedup.remember("u1", f"v{number}", f"message {number}", vector(number + 1, 1))
+    assert dedup.find_duplicate("u1", "message 0", vector(-1, 5)) is None
+    assert dedup.find_duplicate("u1", "message 2", vector(-1, 5)) == ("v2", True)
+
+
+def test_least_recently_active_users_are_dropped():
+    dedup = MemoryDeduplicator(max_users=2)
+    dedup.remember("u1", "v1", "a", vector(1, 0))
+    dedup.remember("u2", "v2", "b", vector(1, 0))
+    dedup.find_duplicate("u1", "zzz", vector(0, 1))   # u1 is now the most recent
+    dedup.remember("u3", "v3", "c", vector(1, 0))
+    assert dedup.find_duplicate("u2", "b", vector(1, 0)) is None
+    assert dedup.find_duplicate("u1", "a", vector(1, 0)) == ("v1", True)
+
+
+def test_discard_and_forget():
+    dedup = MemoryDeduplicator()
+    dedup.remember("u1", "v1", "a", vector(1, 0))
+    dedup.remember("u1", "v2", "b", vector(0, 1))
+    dedup.discard("u1", "v1")
+    assert dedup.find_duplicate("u1", "a", vector(-1, 0)) is None
+    dedup.forget("u1")
+    assert dedup.find_duplicate("u1", "b", vector(0, 1)) is None
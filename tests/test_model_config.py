@@ -0,0 +1,104 @@
+import pytest
+
+import model_config as model_config_module
+from model_config import INDEX_EMBEDDING_MODEL, LatencyRouter, ModelConfig, StageConfig
+
+
+def completion_config(slo_ms=1000):
+    return StageConfig("primary", fallback_model="fallback", temperature=1.0, max_tokens=100, p95_slo_ms=slo_ms)
+
+
+def fill(router, model, latency_seconds, samples=model_config_module.MIN_SAMPLES):
+    for _ in range(samples):
+        router.record(model, latency_seconds)
+
+
+def test_get_returns_a_copy():
+    config = ModelConfig()
+    stage = config.get("analysis")
+    stage.model = "changed"
+    assert config.get("analysis").model != "changed"
+
+
+def test_update_applies_fields_and_ignores_none():
+    config = ModelConfig()
+    config.update({"analysis": {"model": "gpt-4o-mini", "temperature": 0.5, "max_tokens": None}})
+    analysis = config.snapshot()["analysis"]
+    assert analysis["model"] == "gpt-4o-mini"
+    assert analysis["temperature"] == 0.5
+    assert analysis["max_tokens"] == 200
+
+
+@pytest.mark.parametrize("updates", [
+    {"ranking": {"model": "gpt-4o"}},
+    {"analysis": {"colour": "blue"}},
+    {"analysis": {"model": "  "}},
+    {"analysis": {"temperature": 3}},
+    {"completion": {"max_tokens": 0}},
+    {"completion": {"p95_slo_ms": -1}},
+    {"embedding": {"model": "text-embedding-3-small"}},
+])
+def test_update_rejects_invalid_settings(updates):
+    with pytest.raises(ValueError):
+        ModelConfig().update(updates)
+
+
+def test_failed_update_applies_nothing():
+    config = ModelConfig()
+    before = config.snapshot()
+    with pytest.raises(ValueError):
+        config.update({"analysis": {"model": "gpt-4o-mini"}, "completion": {"temperature": 5}})
+    assert config.snapshot() == before
+    assert config.get("embedding").model == INDEX_EMBEDDING_MODEL
+
+
+def test_p95_needs_enough_samples():
+    router = LatencyRouter()
+    fill(router, "primary", 0.1, samples=model_config_module.MIN_SAMPLES - 1)
+    assert router.p95("primary") is None
+    router.record("primary", 0.1)
+    assert router.p95("primary") == pytest.approx(100)
+
+
+def test_p95_ignores_samples_older_than_the_window(monkeypatch):
+    router = LatencyRouter()
+    now = [1000.0]
+    monkeypatch.setattr(model_config_module.time, "time", lambda: now[0])
+    fill(router, "primary", 5.0)
+    now[0] += model_config_module.LATENCY_WINDOW_SECONDS + 1
+    assert router.p95("primary") is None
+
+
+def test_routes_to_primary_while_within_slo():
+    router = LatencyRouter()
+    fill(router, "primary", 0.5)
+    assert router.route("completion", completion_config()) == "primary"
+    assert router.stats()["decisions"]["completion"] == {"primary": 1, "fallback": 0, "probe": 0}
+
+
+def test_fails_over_when_p95_breaches_slo_and_probes_the_primary():
+    router = LatencyRouter()
+    fill(router, "primary", 2.0)
+    config = completion_config()
+    models = [router.route("completion", config) for _ in range(model_config_module.PROBE_EVERY)]
+    assert models[:-1] == ["fallback"] * (model_config_module.PROBE_EVERY - 1)
+    assert models[-1] == "primary"
+    decisions = router.stats()["decisions"]["completion"]
+    assert decisions == {"primary": 0, "fallback": model_config_module.PROBE_EVERY - 1, "probe": 1}
+
+
+def test_recovers_once_the_primary_is_fast_again():
+    router = LatencyRouter()
+    fill(router, "primary", 2.0)
+    config = completion_config()
+    assert router.route("completion", config) == "fallback"
+    fill(router, "primary", 0.1, samples=model_config_module.LATENCY_WINDOW)
+    assert router.route("completion", config) == "primary"
+
+
+def test_no_failover_without_a_fallback_model():
+    router = LatencyRouter()
+    fill(router, "primary", 2.0)
+    config = completion_config()
+    config.fallback_model = None
+    assert router.route("completion", config) == "primary"
@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+
+import pytest
+
+import profiling
+from profiling import RequestProfiler
+
+
+@pytest.fixture
+def sessions():
+    started = []
+    yield started
+    for session in started:
+        session.stop()
+
+
+def start(profiler, sessions, label="req", header=None):
+    session = profiler.start(label, header)
+    if session is not None:
+        sessions.append(session)
+    return session
+
+
+def test_disabled_without_a_trigger(sessions):
+    profiler = RequestProfiler(admin_token="", sample_percent=0, latency_threshold_ms=0)
+    assert not profiler.enabled
+    assert start(profiler, sessions) is None
+
+
+def test_admin_header_forces_a_profile(sessions):
+    profiler = RequestProfiler(admin_token="secret", sample_percent=0, latency_threshold_ms=0)
+    assert start(profiler, sessions, header="wrong") is None
+    assert start(profiler, sessions, header="secret").reason == "admin"
+
+
+def test_random_sampling(monkeypatch, sessions):
+    profiler = RequestProfiler(admin_token="", sample_percent=10, latency_threshold_ms=0)
+    monkeypatch.setattr(profiling.random, "random", lambda: 0.05)
+    assert start(profiler, sessions).reason == "sampled"
+    monkeypatch.setattr(profiling.random, "random", lambda: 0.5)
+    assert start(profiler, sessions) is None
+
+
+def test_latency_trigger_samples_requests_and_keeps_only_slow_ones(monkeypatch, tmp_path, sessions):
+    profiler = RequestProfiler(directory=str(tmp_path), admin_token="", sample_percent=0,
+                               latency_threshold_ms=60000, latency_sample_percent=5)
+    monkeypatch.setattr(profiling.random, "random", lambda: 0.5)
+    assert start(profiler, sessions) is None
+    monkeypatch.setattr(profiling.random, "random", lambda: 0.01)
+    fast = start(profiler, sessions)
+    assert fast.reason == "latency"
+    assert profiler.finish(fast) is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_labels_are_safe_file_names(sessions):
+    profiler = RequestProfiler(admin_token="secret")
+    session = start(profiler, sessions, label="../../etc/passwd" + "x" * 100, header="secret")
+    label = session.label.split("_", 1)[1]
+    assert "/" not in session.label and "." not in label
+    assert len(label) == 64
+
+
+def test_finish_writes_pstats_and_speedscope_for_every_wrapped_thread(tmp_path):
+    profiler = RequestProfiler(directory=str(tmp_path), admin_token="secret")
+    session = profiler.start("req", "secret")
+
+    def work():
+        assert profiling.active_session.get() is session
+        return sum(range(10000))
+
+    wrapped = session.wrap(work)
+    worker = threading.Thread(target=wrapped)
+    worker.start()
+    worker.join()
+    assert wrapped() == sum(range(10000))
+    assert profiling.active_session.get() is None
+
+    prefix = profiler.finish(session)
+    assert profiler.written == 1
+    assert os.path.exists(f"{prefix}.pstats")
+    with open(f"{prefix}.speedscope.json", encoding="utf-8") as f:
+        speedscope = json.load(f)
+    assert speedscope["exporter"] == "hoocup-profiling"
+    assert "admin" in speedscope["name"]
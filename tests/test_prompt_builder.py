@@ -0,0 +1,56 @@
+from prompt_builder import MESSAGE_OVERHEAD_TOKENS, PromptBuilder, count_tokens
+
+PERSONA = "You are a friendly test persona."
+
+
+def section_budget(builder, message):
+    return builder.budget_tokens - builder.prefix_tokens - count_tokens(message) - 3 * MESSAGE_OVERHEAD_TOKENS
+
+
+def test_persona_is_a_fixed_first_message():
+    builder = PromptBuilder(persona=PERSONA, budget_tokens=500)
+    first, _ = builder.build("hi", [("profile", "They like chai.", False)])
+    second, _ = builder.build("something else entirely", [("profile", "They like dance.", False)])
+    assert first[0] == second[0] == {"role": "system", "content": PERSONA}
+    assert first[-1] == {"role": "user", "content": "hi"}
+
+
+def test_sections_are_packed_in_order_and_reported():
+    builder = PromptBuilder(persona=PERSONA, budget_tokens=500)
+    messages, report = builder.build("hi", [
+        ("profile", "Their name: Riya", False),
+        ("emotion", "", False),
+        ("history", "Past chats:\nUser: hello", True)
+    ])
+    assert messages[1]["content"] == "Their name: Riya\nPast chats:\nUser: hello"
+    assert report["profile"] == count_tokens("Their name: Riya")
+    assert "emotion" not in report
+    assert report["prefix"] == count_tokens(PERSONA)
+
+
+def test_fixed_sections_that_do_not_fit_are_dropped():
+    builder = PromptBuilder(persona=PERSONA, budget_tokens=60)
+    budget = section_budget(builder, "hi")
+    too_long = "x" * (budget * 4 + 40)
+    messages, report = builder.build("hi", [("memory_ref", too_long, False), ("emotion", "vibe: happy", False)])
+    assert report["memory_ref"] == 0
+    assert messages[1]["content"] == "vibe: happy"
+
+
+def test_truncatable_sections_keep_leading_lines():
+    builder = PromptBuilder(persona=PERSONA, budget_tokens=80)
+    lines = ["Past chats:"] + [f"User: message number {number}" for number in range(50)]
+    messages, report = builder.build("hi", [("history", "\n".join(lines), True)])
+    kept = messages[1]["content"].split("\n")
+    assert kept == lines[:len(kept)]
+    assert 1 < len(kept) < len(lines)
+    assert report["history"] <= section_budget(builder, "hi")
+
+
+def test_a_lone_header_is_not_sent():
+    builder = PromptBuilder(persona=PERSONA, budget_tokens=40)
+    header = "Past chats:"
+    body = "User: " + "a very long line " * 20
+    messages, report = builder.build("hi", [("history", f"{header}\n{body}", True)])
+    assert report["history"] == 0
+    assert len(messages) == 2
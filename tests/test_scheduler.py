@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from scheduler import MailboxFull, UserScheduler
+
+
+def test_one_users_turns_run_in_submission_order():
+    order = []
+
+    def turn(number):
+        time.sleep(0.005 * (5 - number))   # Later turns would finish first if they overlapped
+        order.append(number)
+        return number
+
+    async def scenario():
+        scheduler = UserScheduler(max_concurrency=4)
+        return await asyncio.gather(*[scheduler.submit("u1", turn, number) for number in range(5)])
+
+    assert asyncio.run(scenario()) == [0, 1, 2, 3, 4]
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_different_users_run_concurrently():
+    both_running = threading.Barrier(2, timeout=1)
+
+    def turn():
+        both_running.wait()   # Deadlocks (BrokenBarrierError) if users were serialized
+        return True
+
+    async def scenario():
+        scheduler = UserScheduler(max_concurrency=2)
+        return await asyncio.gather(scheduler.submit("u1", turn), scheduler.submit("u2", turn))
+
+    assert asyncio.run(scenario()) == [True, True]
+
+
+def test_full_mailbox_is_rejected():
+    release = threading.Event()
+
+    async def scenario():
+        scheduler = UserScheduler(max_concurrency=1, max_mailbox=2)
+        first = asyncio.ensure_future(scheduler.submit("u1", release.wait, 1))
+        second = asyncio.ensure_future(scheduler.submit("u1", release.wait, 1))
+        await asyncio.sleep(0.01)
+        with pytest.raises(MailboxFull):
+            await scheduler.submit("u1", release.wait, 1)
+        other_user = asyncio.ensure_future(scheduler.submit("u2", lambda: "ok"))
+        release.set()
+        await asyncio.gather(first, second)
+        return scheduler, await other_user
+
+    scheduler, other = asyncio.run(scenario())
+    assert other == "ok"
+    stats = scheduler.stats()
+    assert (stats["submitted"], stats["completed"], stats["rejected"]) == (3, 3, 1)
+    assert stats["active_users"] == 0
+
+
+def test_global_concurrency_is_bounded():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def turn():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.pop()
+
+    async def scenario():
+        scheduler = UserScheduler(max_concurrency=2)
+        await asyncio.gather(*[scheduler.submit(f"u{number}", turn) for number in range(6)])
+
+    asyncio.run(scenario())
+    assert max(peak) == 2
+
+
+def test_a_failed_turn_does_not_block_the_next():
+    def fail():
+        raise ValueError("boom")
+
+    async def scenario():
+        scheduler = UserScheduler()
+        results = await asyncio.gather(
+            scheduler.submit("u1", fail), scheduler.submit("u1", lambda: "next"), return_exceptions=True
+        )
+        return scheduler, results
+
+    scheduler, results = asyncio.run(scenario())
+    assert isinstance(results[0], ValueError)
+    assert results[1] == "next"
+    assert scheduler.stats()["failed"] == 1
@@ -0,0 +1,65 @@
+from search_index import UserSearchIndex
+
+
+def build_index():
+    index = UserSearchIndex()
+    index.update("u1", "Priya Sharma", likes=["chocolate", "chai"], dislikes=["coffee"])
+    index.update("u2", "Prakash", likes=["cricket"])
+    index.update("u3", "guest", likes=["chocolate cake"])
+    return index
+
+
+def user_ids(results):
+    return [result["user_id"] for result in results]
+
+
+def test_prefix_matches_names_and_preferences():
+    index = build_index()
+    total, results = index.search("pr")
+    assert total == 2
+    assert user_ids(results) == ["u1", "u2"]
+
+    total, results = index.search("choc")
+    assert total == 2
+    assert user_ids(results) == ["u1", "u3"]
+
+
+def test_every_query_token_must_match():
+    index = build_index()
+    total, results = index.search("pri choc")
+    assert (total, user_ids(results)) == (1, ["u1"])
+    assert index.search("prakash chocolate") == (0, [])
+
+
+def test_placeholder_names_are_not_indexed():
+    index = build_index()
+    assert index.search("guest") == (0, [])
+    assert len(index) == 3
+
+
+def test_update_replaces_stale_tokens():
+    index = build_index()
+    index.update("u2", "Rahul", likes=["football"])
+    assert user_ids(index.search("prakash")[1]) == []
+    assert user_ids(index.search("cricket")[1]) == []
+    assert user_ids(index.search("rah")[1]) == ["u2"]
+    assert index.search("foot")[1][0]["preferences"] == {"likes": ["football"], "dislikes": []}
+
+
+def test_remove_and_clear():
+    index = build_index()
+    index.remove("u1")
+    assert user_ids(index.search("choc")[1]) == ["u3"]
+    assert index._vocabulary == sorted(index._postings)
+    index.clear()
+    assert len(index) == 0
+    assert index.search("choc") == (0, [])
+
+
+def test_pagination_reports_the_full_total():
+    index = UserSearchIndex()
+    for number in range(25):
+        index.update(f"user-{number:02d}", f"Anya {number}")
+    total, page = index.search("anya", limit=10, offset=20)
+    assert total == 25
+    assert user_ids(page) == [f"user-{number:02d}" for number in range(20, 25)]
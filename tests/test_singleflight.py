@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+
+from singleflight import SingleFlight, ThreadSingleFlight
+
+
+def counting_work(calls, result="done", delay=0.01):
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return result
+    return work
+
+
+def test_concurrent_callers_join_the_leader():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+        results = await asyncio.gather(*[flight.do("key", counting_work(calls)) for _ in range(5)])
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(scenario())
+    assert results == ["done"] * 5
+    assert len(calls) == 1
+    assert (flight.leaders, flight.joined) == (1, 4)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_replay_only_when_requested():
+    async def scenario():
+        flight = SingleFlight(replay_seconds=60)
+        calls = []
+        await flight.do("text", counting_work(calls))
+        await flight.do("text", counting_work(calls))
+        await flight.do("id", counting_work(calls), replay=True)
+        replayed = await flight.do("id", counting_work(calls, result="new"), replay=True)
+        return flight, calls, replayed
+
+    flight, calls, replayed = asyncio.run(scenario())
+    assert len(calls) == 3
+    assert replayed == "done"
+    assert flight.replayed == 1
+
+
+def test_replay_window_expires():
+    async def scenario():
+        flight = SingleFlight(replay_seconds=0)
+        calls = []
+        await flight.do("id", counting_work(calls), replay=True)
+        await flight.do("id", counting_work(calls), replay=True)
+        return calls
+
+    assert len(asyncio.run(scenario())) == 2
+
+
+def test_errors_reach_every_caller_and_are_not_replayed():
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def scenario():
+        flight = SingleFlight()
+        outcomes = await asyncio.gather(
+            flight.do("key", failing, replay=True),
+            flight.do("key", failing, replay=True),
+            return_exceptions=True
+        )
+        return flight, outcomes
+
+    flight, outcomes = asyncio.run(scenario())
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+    assert flight.stats()["replayable"] == 0
+
+
+def test_joiner_takes_over_when_the_leader_is_cancelled():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+        leader = asyncio.ensure_future(flight.do("key", counting_work(calls, delay=0.05)))
+        await asyncio.sleep(0)
+        joiner = asyncio.ensure_future(flight.do("key", counting_work(calls, result="retried", delay=0.01)))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        result = await joiner
+        return flight, calls, leader, result
+
+    flight, calls, leader, result = asyncio.run(scenario())
+    assert leader.cancelled()
+    assert result == "retried"
+    assert len(calls) == 2
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelled_joiner_leaves_the_leader_running():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+        leader = asyncio.ensure_future(flight.do("key", counting_work(calls, delay=0.05)))
+        await asyncio.sleep(0)
+        joiner = asyncio.ensure_future(flight.do("key", counting_work(calls)))
+        await asyncio.sleep(0.01)
+        joiner.cancel()
+        return calls, await leader, joiner
+
+    calls, result, joiner = asyncio.run(scenario())
+    assert result == "done"
+    assert joiner.cancelled()
+    assert len(calls) == 1
+
+
+def test_thread_single_flight_runs_once_per_key():
+    flight = ThreadSingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(1)
+        return len(calls)
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", work)))
+    leader.start()
+    started.wait(1)
+    joiner = threading.Thread(target=lambda: results.append(flight.do("key", work)))
+    joiner.start()
+    waited_until = time.monotonic() + 1
+    while flight.joined == 0 and time.monotonic() < waited_until:
+        time.sleep(0.001)
+    release.set()
+    leader.join(1)
+    joiner.join(1)
+    assert results == [1, 1]
+    assert len(calls) == 1
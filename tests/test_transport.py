@@ -0,0 +1,81 @@
+import pytest
+
+pytest.importorskip("certifi")
+pytest.importorskip("httpx")
+
+import transport
+from transport import PoolStats, TimedIndex
+
+
+class FakeIndex:
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+
+    def query(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.error:
+            raise self.error
+        return {"matches": []}
+
+    def list(self, **kwargs):
+        yield ["id-1"]
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    stats = PoolStats(4)
+    monkeypatch.setattr(transport, "pinecone_stats", stats)
+    return stats
+
+
+def test_rest_calls_get_a_request_timeout(pool):
+    index = FakeIndex()
+    TimedIndex(index, "rest", timeout=2.5).query(top_k=1)
+    assert index.calls == [{"top_k": 1, "_request_timeout": 2.5}]
+
+
+def test_grpc_calls_get_a_timeout_and_explicit_values_win(pool):
+    index = FakeIndex()
+    timed = TimedIndex(index, "grpc", timeout=2.5)
+    timed.query(top_k=1)
+    timed.query(top_k=1, timeout=10)
+    assert [call["timeout"] for call in index.calls] == [2.5, 10]
+
+
+def test_other_attributes_pass_through_unwrapped(pool):
+    assert list(TimedIndex(FakeIndex(), "rest").list(namespace="u1")) == [["id-1"]]
+    assert pool.snapshot()["requests"] == 0
+
+
+def test_pool_use_and_timeouts_are_counted(pool):
+    TimedIndex(FakeIndex(), "rest").query(top_k=1)
+    with pytest.raises(TimeoutError):
+        TimedIndex(FakeIndex(TimeoutError("read timed out")), "rest").query(top_k=1)
+    with pytest.raises(ValueError):
+        TimedIndex(FakeIndex(ValueError("bad vector")), "rest").query(top_k=1)
+    snapshot = pool.snapshot()
+    assert (snapshot["requests"], snapshot["inflight"], snapshot["max_inflight"], snapshot["timeouts"]) == (3, 0, 1, 1)
+
+
+def test_pool_stats_utilisation():
+    stats = PoolStats(4)
+    stats.begin()
+    stats.begin()
+    assert stats.snapshot()["utilization"] == 0.5
+    stats.end()
+    stats.end(timed_out=True)
+    assert stats.snapshot()["inflight"] == 0
+
+
+def test_stats_report_every_service(pool):
+    report = transport.stats()
+    assert set(report) == {"openai", "pinecone", "mongo"}
+    assert report["pinecone"]["timeout_seconds"] == transport.PINECONE_TIMEOUT_SECONDS
+    assert "max_inflight" in report["pinecone"]
+
+
+def test_mongo_options_bound_the_pool():
+    options = transport.mongo_client_options()
+    assert options["maxPoolSize"] == transport.MONGO_MAX_POOL_SIZE
+    assert options["serverSelectionTimeoutMS"] == transport.MONGO_CONNECT_TIMEOUT_MS
@@ -0,0 +1,76 @@
+import contextvars
+import time
+
+import pytest
+
+from turn_context import TurnContext, current_turn, remembering
+
+
+def test_activate_sets_and_restores_the_current_turn():
+    outer = TurnContext("u1", "hi")
+    inner = TurnContext("u1", "nested")
+    assert current_turn.get() is None
+    with outer.activate():
+        with inner.activate():
+            assert current_turn.get() is inner
+        assert current_turn.get() is outer
+    assert current_turn.get() is None
+
+
+def test_current_turn_is_reset_when_the_turn_fails():
+    with pytest.raises(RuntimeError):
+        with TurnContext("u1", "hi").activate():
+            raise RuntimeError("boom")
+    assert current_turn.get() is None
+
+
+def test_copied_context_carries_the_turn_to_workers():
+    turn = TurnContext("u1", "hi")
+    with turn.activate():
+        context = contextvars.copy_context()
+    assert context.run(current_turn.get) is turn
+
+
+def test_stage_timings_accumulate_even_on_errors():
+    turn = TurnContext("u1", "hi")
+    with turn.stage("retrieval"):
+        time.sleep(0.01)
+    with pytest.raises(ValueError):
+        with turn.stage("retrieval"):
+            raise ValueError("boom")
+    assert turn.timings["retrieval"] >= 0.01
+
+
+def test_usage_and_cost_add_up_per_call():
+    turn = TurnContext("u1", "hi")
+    turn.add_usage(100, 20, 0.001)
+    turn.add_usage(50, 0, 0.0005)
+    assert turn.usage == {"prompt_tokens": 150, "completion_tokens": 20, "calls": 2}
+    assert turn.cost == pytest.approx(0.0015)
+
+
+def test_to_dict_reports_the_client_fields():
+    turn = TurnContext("u1", "hi")
+    turn.response, turn.emotion, turn.model = "hey!", "happy", "gpt-3.5-turbo"
+    report = turn.finish().to_dict()
+    assert report["response"] == "hey!"
+    assert report["emotion"] == "happy"
+    assert report["model"] == "gpt-3.5-turbo"
+    assert set(report["timings"]) == {"total"}
+    assert "user_id" not in report
+
+
+def test_defaults_are_not_shared_between_turns():
+    first, second = TurnContext("u1", "a"), TurnContext("u2", "b")
+    first.detected_preferences["likes"].append("chai")
+    first.usage["calls"] += 1
+    assert second.detected_preferences == {"likes": [], "dislikes": []}
+    assert second.usage["calls"] == 0
+
+
+def test_remembering_follows_the_current_turn():
+    assert remembering()
+    with TurnContext("u1", "hi", remember=False).activate():
+        assert not remembering()
+    with TurnContext("u1", "hi").activate():
+        assert remembering()
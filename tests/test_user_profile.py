@@ -0,0 +1,46 @@
+from user_profile import UserProfile
+
+
+def test_newer_stored_copy_wins_over_stale_fields():
+    local = UserProfile("u1", "Riya", likes=["chai"], dislikes=["rain"], version=3)
+    stored = UserProfile("u1", "Priya", likes=["chai", "dance"], dislikes=[], version=4)
+    local.merge(stored)
+    assert local.name == "Priya"
+    assert local.likes == ["chai", "dance"]
+    assert local.dislikes == []
+
+
+def test_facts_learned_since_the_last_write_are_replayed():
+    local = UserProfile("u1", "", likes=["chai"], version=3)
+    local.set_name("Anu")
+    local.add_like("momos")
+    local.add_dislike("mondays")
+    local.merge(UserProfile("u1", "", likes=["chai", "dance"], version=4))
+    assert local.name == "Anu"
+    assert local.likes == ["chai", "dance", "momos"]
+    assert local.dislikes == ["mondays"]
+
+
+def test_out_of_band_rename_beats_a_detected_name():
+    local = UserProfile("u1", "Riya", version=3)
+    local.set_name("Ri")
+    local.merge(UserProfile("u1", "Priya", version=4))
+    assert local.name == "Priya"
+
+
+def test_older_copy_is_unioned():
+    local = UserProfile("u1", "Riya", likes=["chai"], version=5)
+    local.merge(UserProfile("u1", "Old", likes=["dance"], dislikes=["rain"], version=4))
+    assert local.name == "Riya"
+    assert local.likes == ["chai", "dance"]
+    assert local.dislikes == ["rain"]
+
+
+def test_keep_learned_puts_failed_writes_ahead_of_newer_changes():
+    profile = UserProfile("u1", "Riya", version=1)
+    profile.set_name("Ri")
+    profile.add_like("chai")
+    taken, profile.learned = profile.learned, None
+    profile.add_like("momos")
+    profile.keep_learned(taken)
+    assert profile.learned == {"name_was": "Riya", "likes": ["chai", "momos"]}
@@ -0,0 +1,132 @@
+import importlib
+import sys
+import types
+
+import pytest
+
+
+class FakeModels:
+    def __init__(self):
+        self.retrieved = []
+        self.fail = False
+
+    def retrieve(self, model):
+        if self.fail:
+            raise RuntimeError("openai down")
+        self.retrieved.append(model)
+
+
+class FakeProfiles:
+    def __init__(self):
+        self.loaded = []
+        self.primed = []
+
+    def get(self, user_id):
+        self.loaded.append(user_id)
+
+    def prime_recent_turns(self, user_id):
+        self.primed.append(user_id)
+
+
+class FakeIndex:
+    def __init__(self):
+        self.namespaces = []
+        self.fail = False
+
+    def query(self, vector, top_k, namespace):
+        if self.fail:
+            raise RuntimeError("pinecone down")
+        self.namespaces.append(namespace)
+
+
+class FakeChatbot:
+    def __init__(self):
+        self.profiles = FakeProfiles()
+        self.index = FakeIndex()
+        self.embedded = []
+
+    def embed_text(self, text):
+        self.embedded.append(text)
+
+
+@pytest.fixture
+def warmup(monkeypatch):
+    # The real chatbot module needs openai and pinecone; the warmer only uses these two names
+    fake = types.ModuleType("chatbot")
+    fake.client = types.SimpleNamespace(models=FakeModels())
+    fake.user_namespace = lambda user_id: f"ns-{user_id}"
+    monkeypatch.setitem(sys.modules, "chatbot", fake)
+    monkeypatch.delitem(sys.modules, "warmup", raising=False)
+    module = importlib.import_module("warmup")
+    yield module
+    sys.modules.pop("warmup", None)
+
+
+def test_warm_loads_profile_turns_and_namespace(warmup):
+    chatbot = FakeChatbot()
+    warmer = warmup.SessionWarmer(chatbot)
+    warmer.warm("u1")
+    assert chatbot.profiles.loaded == ["u1"]
+    assert chatbot.profiles.primed == ["u1"]
+    assert chatbot.index.namespaces == ["ns-u1"]
+    stats = warmer.stats()
+    assert stats["started"] == 1
+    assert stats["completed"] == 1
+    assert stats["failed"] == 0
+
+
+def test_openai_is_warmed_once_per_process(warmup):
+    chatbot = FakeChatbot()
+    warmer = warmup.SessionWarmer(chatbot)
+    warmer.warm("u1")
+    warmer.warm("u2")
+    assert len(warmup.client.models.retrieved) == 1
+    assert chatbot.embedded == list(warmup.COMMON_OPENERS)
+
+
+def test_recently_warmed_user_is_skipped(warmup, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(warmup.time, "time", lambda: now[0])
+    chatbot = FakeChatbot()
+    warmer = warmup.SessionWarmer(chatbot)
+    warmer.warm("u1")
+    warmer.warm("u1")
+    assert warmer.stats()["skipped"] == 1
+    now[0] += warmup.WARM_TTL_SECONDS + 1
+    warmer.warm("u1")
+    assert chatbot.profiles.loaded == ["u1", "u1"]
+
+
+def test_failed_warm_up_is_counted_and_retried(warmup):
+    chatbot = FakeChatbot()
+    chatbot.index.fail = True
+    warmer = warmup.SessionWarmer(chatbot)
+    warmer.warm("u1")
+    assert warmer.stats()["failed"] == 1
+    assert warmer.stats()["completed"] == 0
+    chatbot.index.fail = False
+    warmer.warm("u1")
+    assert warmer.stats()["completed"] == 1
+
+
+def test_openai_warm_up_is_retried_after_a_failure(warmup):
+    chatbot = FakeChatbot()
+    warmup.client.models.fail = True
+    warmer = warmup.SessionWarmer(chatbot)
+    warmer.warm("u1")
+    assert warmer.stats()["failed"] == 1
+    warmup.client.models.fail = False
+    warmer.warm("u2")
+    assert warmup.client.models.retrieved == [warmup.model_config.get("embedding").model]
+
+
+def test_first_turns_count_as_warm_hits_or_cold_starts(warmup):
+    warmer = warmup.SessionWarmer(FakeChatbot())
+    warmer.warm("warm")
+    warmer.note_turn("warm")
+    warmer.note_turn("cold")
+    warmer.note_turn("warm")            # Only the first turn of each user counts
+    stats = warmer.stats()
+    assert stats["warm_hits"] == 1
+    assert stats["cold_first_turns"] == 1
+    assert stats["warm_hit_rate"] == 0.5
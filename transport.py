@@ -0,0 +1,238 @@
+import os
+import threading
+
+import certifi
+import httpx
+from pymongo import monitoring
+
+from log import get_logger
+
+try:
+    import h2  # noqa: F401  httpx only negotiates HTTP/2 when h2 is installed
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+log = get_logger("transport")
+
+# OpenAI (httpx)
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "64"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "32"))
+OPENAI_KEEPALIVE_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "3"))
+OPENAI_READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", "30"))
+
+# Pinecone: "rest" or "grpc" (grpc needs pinecone-client[grpc])
+PINECONE_TRANSPORT = os.getenv("PINECONE_TRANSPORT", "rest").lower()
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "16"))
+PINECONE_TIMEOUT_SECONDS = float(os.getenv("PINECONE_TIMEOUT_SECONDS", "5"))
+
+# MongoDB (Motor and pymongo)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", "300000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "3000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000"))
+
+
+class ConnectionStats:
+    """Counts requests against newly opened connections for one service"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+        self.http2_responses = 0
+
+    def add(self, field, amount=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            reused = max(self.requests - self.connections_opened, 0)
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "reuse_ratio": reused / self.requests if self.requests else 0.0,
+                "http2_responses": self.http2_responses
+            }
+
+
+class PoolStats:
+    """Counts in-flight and timed-out calls against a fixed-size pool"""
+
+    def __init__(self, size):
+        self._lock = threading.Lock()
+        self.size = size
+        self.requests = 0
+        self.inflight = 0
+        self.max_inflight = 0
+        self.timeouts = 0
+
+    def begin(self):
+        with self._lock:
+            self.requests += 1
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight, self.inflight)
+
+    def end(self, timed_out=False):
+        with self._lock:
+            self.inflight -= 1
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "inflight": self.inflight,
+                "max_inflight": self.max_inflight,
+                "pool_size": self.size,
+                "utilization": self.inflight / self.size if self.size else 0.0,
+                "timeouts": self.timeouts
+            }
+
+
+openai_stats = ConnectionStats()
+mongo_stats = ConnectionStats()
+pinecone_stats = PoolStats(PINECONE_POOL_THREADS)
+
+
+def _trace(event_name, info):
+    """httpcore trace hook; fires connect_tcp only when a new connection is opened"""
+    if event_name == "connection.connect_tcp.complete":
+        openai_stats.add("connections_opened")
+
+
+def _on_request(request):
+    openai_stats.add("requests")
+    request.extensions["trace"] = _trace
+
+
+def _on_response(response):
+    if response.extensions.get("http_version") == b"HTTP/2":
+        openai_stats.add("http2_responses")
+
+
+def openai_http_client():
+    """Shared keep-alive httpx client for the OpenAI SDK"""
+    return httpx.Client(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+            keepalive_expiry=OPENAI_KEEPALIVE_SECONDS
+        ),
+        timeout=httpx.Timeout(OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        event_hooks={"request": [_on_request], "response": [_on_response]}
+    )
+
+
+def openai_client(api_key=None):
+    """OpenAI SDK client over the shared keep-alive transport"""
+    import openai
+    return openai.OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"), http_client=openai_http_client())
+
+
+def pinecone_client(api_key):
+    """Pinecone client in the configured transport mode, falling back to REST"""
+    if PINECONE_TRANSPORT == "grpc":
+        try:
+            from pinecone.grpc import PineconeGRPC
+            return PineconeGRPC(api_key=api_key)
+        except ImportError:
+            log.warning("pinecone.grpc_unavailable", fallback="rest")
+    from pinecone import Pinecone
+    return Pinecone(api_key=api_key, pool_threads=PINECONE_POOL_THREADS)
+
+
+class TimedIndex:
+    """Pinecone index proxy that bounds every data-plane call and counts pool use.
+
+    The REST client takes the timeout as _request_timeout, the gRPC client as
+    timeout; callers can still pass either explicitly.
+    """
+
+    CALLS = {"query", "upsert", "fetch", "update", "delete", "list_paginated", "describe_index_stats"}
+
+    def __init__(self, index, transport, timeout=PINECONE_TIMEOUT_SECONDS):
+        self._index = index
+        self._timeout_arg = "timeout" if transport == "grpc" else "_request_timeout"
+        self._timeout = timeout
+
+    def __getattr__(self, name):
+        attribute = getattr(self._index, name)
+        if name not in self.CALLS:
+            return attribute
+
+        def call(*args, **kwargs):
+            kwargs.setdefault(self._timeout_arg, self._timeout)
+            pinecone_stats.begin()
+            timed_out = False
+            try:
+                return attribute(*args, **kwargs)
+            except Exception as e:
+                timed_out = "timeout" in type(e).__name__.lower() or "timed out" in str(e).lower()
+                raise
+            finally:
+                pinecone_stats.end(timed_out)
+        return call
+
+
+def open_index(pc, name):
+    if pinecone_transport(pc) == "grpc":
+        return TimedIndex(pc.Index(name), "grpc")
+    return TimedIndex(pc.Index(name, pool_threads=PINECONE_POOL_THREADS), "rest")
+
+
+def pinecone_transport(pc):
+    return "grpc" if type(pc).__name__ == "PineconeGRPC" else "rest"
+
+
+class _MongoPoolListener(monitoring.ConnectionPoolListener):
+    def connection_created(self, event):
+        mongo_stats.add("connections_opened")
+
+    def connection_checked_out(self, event):
+        mongo_stats.add("requests")
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event): pass
+    def connection_checked_in(self, event): pass
+
+
+_mongo_listener = _MongoPoolListener()
+
+
+def mongo_client_options():
+    """Keyword arguments for MongoClient / AsyncIOMotorClient"""
+    return {
+        "tlsCAFile": certifi.where(),
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "event_listeners": [_mongo_listener]
+    }
+
+
+def stats(pc=None):
+    return {
+        "openai": {**openai_stats.snapshot(), "http2_available": HTTP2_AVAILABLE},
+        "pinecone": {
+            "transport": pinecone_transport(pc) if pc is not None else PINECONE_TRANSPORT,
+            "pool_threads": PINECONE_POOL_THREADS,
+            "timeout_seconds": PINECONE_TIMEOUT_SECONDS,
+            **pinecone_stats.snapshot()
+        },
+        "mongo": mongo_stats.snapshot()
+    }
@@ -0,0 +1,87 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from deadline import Deadline
+from user_profile import UserProfile
+
+# The turn being served on this thread, so model calls can charge their usage to it
+current_turn = contextvars.ContextVar("current_turn", default=None)
+
+
+def remembering():
+    """False while an eval turn (remember=False) is running on this thread"""
+    turn = current_turn.get()
+    return turn is None or turn.remember
+
+
+@dataclass
+class TurnContext:
+    """Everything computed while serving one chat turn.
+
+    Created once per request and threaded through retrieval, prompt building,
+    completion and memory writes; each stage fills in its artifacts and later
+    stages read them instead of recomputing.
+    """
+
+    user_id: str
+    message: str
+    deadline: Deadline = field(default_factory=Deadline)
+    started: float = field(default_factory=time.time)
+    remember: bool = True                        # False for eval traffic: no caches, memory, profile, analytics or cost writes
+    profile: Optional[UserProfile] = None        # Snapshot taken at the start of the turn
+    embedding: Optional[List[float]] = None      # Message embedding, shared by retrieval, emotion and storage
+    emotion: str = "neutral"
+    is_name_query: Optional[bool] = None
+    detected_name: str = ""
+    detected_preferences: Dict[str, List[str]] = field(default_factory=lambda: {"likes": [], "dislikes": []})
+    memory: Dict = field(default_factory=dict)
+    section_tokens: Dict[str, int] = field(default_factory=dict)
+    response: str = ""
+    model: str = ""                              # Completion model the router picked
+    cached: bool = False
+    cost: float = 0.0
+    usage: Dict[str, int] = field(default_factory=lambda: {"prompt_tokens": 0, "completion_tokens": 0, "calls": 0})
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @contextmanager
+    def stage(self, name):
+        """Time a pipeline stage into timings (seconds)"""
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.time() - started
+
+    @contextmanager
+    def activate(self):
+        """Make this the current turn for the duration of the block"""
+        token = current_turn.set(self)
+        try:
+            yield self
+        finally:
+            current_turn.reset(token)
+
+    def add_usage(self, prompt_tokens, completion_tokens, cost):
+        self.usage["prompt_tokens"] += prompt_tokens
+        self.usage["completion_tokens"] += completion_tokens
+        self.usage["calls"] += 1
+        self.cost += cost
+
+    def finish(self):
+        self.timings["total"] = time.time() - self.started
+        return self
+
+    def to_dict(self):
+        """Fields returned to API clients"""
+        return {
+            "response": self.response,
+            "emotion": self.emotion,
+            "model": self.model,
+            "cached": self.cached,
+            "turn_cost": self.cost,
+            "usage": dict(self.usage),
+            "timings": {stage: round(seconds, 4) for stage, seconds in self.timings.items()}
+        }
@@ -0,0 +1,175 @@
+import time
+from collections import deque
+
+MAX_PREFERENCES = 50   # Per list; the oldest entries are dropped first
+MAX_NAME_LENGTH = 64
+HOT_TURNS = 3          # Most recent turns kept in memory as fallback context
+PLACEHOLDER_NAME = "Guest"
+
+
+class UserProfile:
+    """Compact per-user profile.
+
+    Likes and dislikes are dicts used as insertion-ordered sets, so dedup is
+    a hash lookup and the oldest preference is the first key to drop when a
+    list reaches MAX_PREFERENCES.
+    """
+
+    __slots__ = (
+        "user_id", "name", "_likes", "_dislikes", "version", "last_active", "checked_at",
+        "recent_turns", "summary", "summary_until", "turns_since_summary", "learned"
+    )
+
+    def __init__(self, user_id, name="", likes=(), dislikes=(), version=0, last_active=None,
+                 summary="", summary_until=0.0):
+        self.user_id = user_id
+        self.name = (name or "")[:MAX_NAME_LENGTH]
+        self._likes = {}
+        self._dislikes = {}
+        self.version = version
+        self.last_active = last_active or time.time()
+        self.checked_at = time.time()
+        self.recent_turns = deque(maxlen=HOT_TURNS)  # (message, response), process-local only
+        self.summary = summary or ""                 # Rolling conversation summary
+        self.summary_until = summary_until or 0.0    # Journal timestamp the summary covers up to
+        self.turns_since_summary = 0
+        self.learned = None                          # What this process changed since its last write
+        for item in likes:
+            self._add(self._likes, item)
+        for item in dislikes:
+            self._add(self._dislikes, item)
+
+    @classmethod
+    def from_document(cls, user_id, user):
+        """Build a profile from a users collection document"""
+        if not user:
+            return cls(user_id)
+        preferences = user.get("preferences") or {}
+        name = user.get("name", "")
+        last_active = user.get("last_active")
+        return cls(
+            user_id,
+            name="" if name == PLACEHOLDER_NAME else name,
+            likes=preferences.get("likes") or [],
+            dislikes=preferences.get("dislikes") or [],
+            version=user.get("profile_version", 0),
+            last_active=last_active.timestamp() if last_active else None,
+            summary=user.get("summary", ""),
+            summary_until=user.get("summary_until", 0.0)
+        )
+
+    @property
+    def likes(self):
+        return list(self._likes)
+
+    @property
+    def dislikes(self):
+        return list(self._dislikes)
+
+    def set_name(self, name):
+        name = (name or "")[:MAX_NAME_LENGTH]
+        if not name or name == self.name:
+            return False
+        self._learn().setdefault("name_was", self.name)
+        self.name = name
+        return True
+
+    def add_like(self, item):
+        if not self._add(self._likes, item):
+            return False
+        self._learn().setdefault("likes", []).append(item)
+        return True
+
+    def add_dislike(self, item):
+        if not self._add(self._dislikes, item):
+            return False
+        self._learn().setdefault("dislikes", []).append(item)
+        return True
+
+    def _learn(self):
+        if self.learned is None:
+            self.learned = {}
+        return self.learned
+
+    def keep_learned(self, learned):
+        """Put back changes taken for a write that did not land, ahead of newer ones"""
+        if not learned:
+            return
+        newer, self.learned = self.learned or {}, learned
+        for field in ("likes", "dislikes"):
+            if field in newer:
+                learned.setdefault(field, []).extend(newer[field])
+
+    def merge(self, other):
+        """Fold the stored copy into this one after a version conflict.
+
+        A newer stored copy wins, so renames and preference edits saved out
+        of band survive; only what this process learned since its last write
+        is replayed on top. Otherwise the two copies are unioned.
+        """
+        if other.version > self.version:
+            learned = self.learned or {}
+            if "name_was" not in learned or other.name != learned["name_was"]:
+                self.name = other.name or self.name
+            self._likes, self._dislikes = {}, {}
+            for item in list(other._likes) + learned.get("likes", []):
+                self._add(self._likes, item)
+            for item in list(other._dislikes) + learned.get("dislikes", []):
+                self._add(self._dislikes, item)
+        else:
+            self.name = self.name or other.name
+            for item in other._likes:
+                self._add(self._likes, item)
+            for item in other._dislikes:
+                self._add(self._dislikes, item)
+        if other.summary_until > self.summary_until:
+            self.summary = other.summary
+            self.summary_until = other.summary_until
+
+    def add_turn(self, message, response):
+        self.recent_turns.append((message, response))
+        self.turns_since_summary += 1
+
+    def prime_turns(self, turns):
+        """Seed hot turns loaded from the journal without counting them as new"""
+        if not self.recent_turns:
+            self.recent_turns.extend(turns)
+
+    def set_summary(self, summary, summary_until):
+        self.summary = summary
+        self.summary_until = summary_until
+        self.turns_since_summary = 0
+
+    def touch(self):
+        self.last_active = time.time()
+
+    def copy(self):
+        profile = UserProfile(
+            self.user_id, self.name, self._likes, self._dislikes, self.version, self.last_active,
+            self.summary, self.summary_until
+        )
+        profile.checked_at = self.checked_at
+        profile.recent_turns.extend(self.recent_turns)
+        profile.turns_since_summary = self.turns_since_summary
+        return profile
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "preferences": {"likes": self.likes, "dislikes": self.dislikes},
+            "summary": self.summary,
+            "last_active": self.last_active
+        }
+
+    @staticmethod
+    def _add(items, item):
+        item = item.strip() if isinstance(item, str) else item
+        if not item or item in items:
+            return False
+        items[item] = None
+        while len(items) > MAX_PREFERENCES:
+            del items[next(iter(items))]
+        return True
+
+    def __repr__(self):
+        return f"UserProfile({self.user_id!r}, name={self.name!r}, likes={self.likes}, dislikes={self.dislikes})"
@@ -0,0 +1,113 @@
+import threading
+import time
+
+from chatbot import client, user_namespace
+from model_config import model_config
+from log import get_logger
+
+log = get_logger("warmup")
+
+WARM_TTL_SECONDS = 300      # A user warmed this recently is not warmed again
+MAX_TRACKED_USERS = 100000
+# Openers most sessions start with; embedded once per process so the first turn hits the cache
+COMMON_OPENERS = ("hi", "hello", "hey", "hii", "kya chal raha hai?", "kaise ho?")
+
+
+class SessionWarmer:
+    """Prefetches what a user's first turn needs before it arrives.
+
+    Called in the background when a device registers or opens a chat: loads
+    the profile (with its rolling summary) and the last journaled turns into
+    the profile store and touches the user's Pinecone namespace. The first
+    warm-up in a process also opens the OpenAI connection pool. The next
+    turn of a warmed user counts as a warm hit; first turns of users that
+    were never warmed count as misses.
+    """
+
+    def __init__(self, chatbot):
+        self.chatbot = chatbot
+        self._warmed = {}           # user_id -> time the warm-up finished
+        self._seen = set()          # users who already had a turn in this process
+        self._lock = threading.Lock()
+        self._openai_warmed = False
+        self.started = 0
+        self.completed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.warm_hits = 0
+        self.cold_first_turns = 0
+        self.total_seconds = 0.0
+
+    def warm(self, user_id):
+        """Run a warm-up for user_id; meant for BackgroundTasks or a worker thread"""
+        with self._lock:
+            warmed_at = self._warmed.get(user_id)
+            if warmed_at and time.time() - warmed_at < WARM_TTL_SECONDS:
+                self.skipped += 1
+                return
+            self.started += 1
+            if len(self._warmed) > MAX_TRACKED_USERS:
+                cutoff = time.time() - WARM_TTL_SECONDS
+                self._warmed = {user: at for user, at in self._warmed.items() if at >= cutoff}
+        started = time.time()
+        try:
+            profiles = self.chatbot.profiles
+            profiles.get(user_id)                       # Profile + summary into the LRU
+            profiles.prime_recent_turns(user_id)        # Hot turns from the journal
+            # Opens the Pinecone connection and wakes the user's namespace
+            self.chatbot.index.query(
+                vector=[1e-6] * 1536,
+                top_k=1,
+                namespace=user_namespace(user_id)
+            )
+            self._warm_openai()
+            with self._lock:
+                self._warmed[user_id] = time.time()
+                self.completed += 1
+                self.total_seconds += time.time() - started
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            log.error("warmup.failed", user_id=user_id, error=str(e))
+
+    def _warm_openai(self):
+        """Once per process: check the models and cache the common openers"""
+        with self._lock:
+            if self._openai_warmed:
+                return
+            self._openai_warmed = True
+        try:
+            client.models.retrieve(model_config.get("embedding").model)
+            for opener in COMMON_OPENERS:
+                self.chatbot.embed_text(opener)
+        except Exception:
+            with self._lock:
+                self._openai_warmed = False   # Let the next warm-up try again
+            raise
+
+    def note_turn(self, user_id):
+        """Count the first turn of each user as a warm hit or a cold start"""
+        with self._lock:
+            if user_id in self._seen:
+                return
+            if len(self._seen) > MAX_TRACKED_USERS:
+                self._seen.clear()
+            self._seen.add(user_id)
+            if user_id in self._warmed:
+                self.warm_hits += 1
+            else:
+                self.cold_first_turns += 1
+
+    def stats(self):
+        with self._lock:
+            first_turns = self.warm_hits + self.cold_first_turns
+            return {
+                "started": self.started,
+                "completed": self.completed,
+                "skipped": self.skipped,
+                "failed": self.failed,
+                "average_seconds": self.total_seconds / self.completed if self.completed else 0.0,
+                "warm_hits": self.warm_hits,
+                "cold_first_turns": self.cold_first_turns,
+                "warm_hit_rate": self.warm_hits / first_turns if first_turns else 0.0
+            }